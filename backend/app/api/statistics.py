@@ -1,42 +1,63 @@
 """
 统计分析相关的API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 import logging
 
-from app.database import get_db
-from app.schemas.statistics import StatisticsOverview, ErrorResponse
-from app.services.stats_service import StatisticsService
+from app.database import get_read_db
+from app.schemas.statistics import (
+    StatisticsOverview,
+    DimensionDistributionItem,
+    TimeSeriesResponse,
+    ErrorResponse
+)
+from app.services.stats_cache import stats_cache
+from app.services.stats_service import StatisticsService, ROLLUP_GRANULARITIES, utc_now
 
 logger = logging.getLogger(__name__)
 
 # 创建路由器
 router = APIRouter()
 
+# 未指定起始时间时各粒度的默认时间窗口
+DEFAULT_TIMESERIES_WINDOWS = {
+    "minute": timedelta(hours=1),
+    "hour": timedelta(days=1),
+    "day": timedelta(days=30)
+}
+
 
 @router.get(
     "/overview",
     response_model=StatisticsOverview,
     responses={
         200: {"description": "查询成功"},
+        304: {"description": "统计结果未变化"},
         404: {"description": "任务不存在"},
         500: {"model": ErrorResponse, "description": "服务器内部错误"}
     },
     summary="获取统计概览",
-    description="获取标签统计分析数据，包括标签分布、分类统计等"
+    description="获取标签统计分析数据，包括标签分布、分类统计等。响应带ETag，"
+                "携带If-None-Match且数据未变化时返回304"
 )
 async def get_statistics_overview(
+    request: Request,
+    response: Response,
     task_id: int = Query(None, description="任务ID，不指定则统计所有任务"),
-    db: Session = Depends(get_db)
-) -> Dict[str, Any]:
+    db: AsyncSession = Depends(get_read_db)
+) -> Any:
     """
     获取统计概览接口
 
     Args:
+        request: 请求对象（读取If-None-Match）
+        response: 响应对象（写入ETag）
         task_id: 可选的任务ID
-        db: 数据库会话
+        db: 异步只读数据库会话
 
     Returns:
         统计概览字典
@@ -45,18 +66,11 @@ async def get_statistics_overview(
         HTTPException: 任务不存在时抛出
     """
     try:
-        # 如果指定了task_id，验证任务是否存在
-        if task_id:
-            from app.models.task import TestTask
-            task = db.query(TestTask).filter(TestTask.id == task_id).first()
-            if not task:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"任务不存在: {task_id}"
-                )
-
-        # 获取统计数据
-        statistics = StatisticsService.get_statistics_overview(db, task_id)
+        # 获取统计数据（优先使用缓存）
+        statistics = await _cached_statistics(
+            "overview", task_id, request, response, db,
+            StatisticsService.get_statistics_overview
+        )
 
         logger.info(f"统计查询成功，task_id={task_id}")
 
@@ -71,3 +85,194 @@ async def get_statistics_overview(
             status_code=500,
             detail=f"统计查询失败: {str(e)}"
         )
+
+
+@router.get(
+    "/dimensions",
+    response_model=List[DimensionDistributionItem],
+    responses={
+        200: {"description": "查询成功"},
+        304: {"description": "统计结果未变化"},
+        404: {"description": "任务不存在"},
+        500: {"model": ErrorResponse, "description": "服务器内部错误"}
+    },
+    summary="获取维度分布",
+    description="按\"维度:值\"标签统计各维度的取值分布，支持ETag/If-None-Match"
+)
+async def get_dimension_distribution(
+    request: Request,
+    response: Response,
+    task_id: int = Query(None, description="任务ID，不指定则统计所有任务"),
+    db: AsyncSession = Depends(get_read_db)
+) -> Any:
+    """
+    获取维度分布接口
+
+    Args:
+        request: 请求对象（读取If-None-Match）
+        response: 响应对象（写入ETag）
+        task_id: 可选的任务ID
+        db: 异步只读数据库会话
+
+    Returns:
+        维度分布列表
+
+    Raises:
+        HTTPException: 任务不存在时抛出
+    """
+    try:
+        distribution = await _cached_statistics(
+            "dimensions", task_id, request, response, db,
+            StatisticsService.get_dimension_distribution
+        )
+
+        logger.info(f"维度分布查询成功，task_id={task_id}")
+
+        return distribution
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"维度分布查询失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"维度分布查询失败: {str(e)}"
+        )
+
+
+@router.get(
+    "/timeseries",
+    response_model=TimeSeriesResponse,
+    # 未指定标签时数据点不含tag_occurrences
+    response_model_exclude_unset=True,
+    responses={
+        200: {"description": "查询成功"},
+        400: {"model": ErrorResponse, "description": "参数错误"},
+        500: {"model": ErrorResponse, "description": "服务器内部错误"}
+    },
+    summary="获取时间序列统计",
+    description="按分钟/小时/天返回评论数、标签数、平均置信度和平均处理时间的趋势，"
+                "可指定标签查看其出现次数趋势。数据来自写入时维护的时间分桶汇总"
+)
+async def get_timeseries(
+    granularity: str = Query("hour", description="时间粒度: minute/hour/day"),
+    start: Optional[datetime] = Query(None, description="起始时间（含，ISO格式，未带时区按UTC），默认按粒度取最近一段时间"),
+    end: Optional[datetime] = Query(None, description="结束时间（不含，ISO格式，未带时区按UTC），默认当前时间"),
+    tag: Optional[str] = Query(None, description="可选的标签"),
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    """
+    获取时间序列统计接口
+
+    Args:
+        granularity: 时间粒度
+        start: 起始时间
+        end: 结束时间
+        tag: 可选的标签
+        db: 异步只读数据库会话
+
+    Returns:
+        时间序列字典
+
+    Raises:
+        HTTPException: 参数错误时抛出
+    """
+    try:
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"不支持的时间粒度: {granularity}，可选: {', '.join(ROLLUP_GRANULARITIES)}")
+
+        end = end or utc_now()
+        start = start or end - DEFAULT_TIMESERIES_WINDOWS[granularity]
+
+        timeseries = await StatisticsService.get_timeseries(db, start, end, granularity, tag)
+
+        logger.info(f"时间序列查询成功，granularity={granularity}, 数据点={len(timeseries['points'])}")
+
+        return timeseries
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+
+    except Exception as e:
+        logger.error(f"时间序列查询失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"时间序列查询失败: {str(e)}"
+        )
+
+
+async def _cached_statistics(
+    kind: str,
+    task_id: Optional[int],
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    compute: Callable[[AsyncSession, Optional[int]], Awaitable[Any]]
+) -> Any:
+    """
+    读取统计结果，数据未变化时返回304或缓存结果
+
+    Args:
+        kind: 统计类型，用于缓存键和ETag
+        task_id: 可选的任务ID
+        request: 请求对象
+        response: 响应对象
+        db: 异步只读数据库会话
+        compute: 缓存未命中时的统计函数
+
+    Returns:
+        统计结果，或304响应
+
+    Raises:
+        HTTPException: 任务不存在时抛出
+    """
+    # 如果指定了task_id，先验证任务是否存在（已缓存的任务必然存在），再比较ETag，
+    # 避免不存在的任务因版本号相同返回304
+    cached = stats_cache.get(kind, task_id)
+    if cached is None and task_id:
+        from app.models.task import TestTask
+        task = await db.scalar(select(TestTask.id).where(TestTask.id == task_id))
+        if not task:
+            raise HTTPException(
+                status_code=404,
+                detail=f"任务不存在: {task_id}"
+            )
+
+    etag = stats_cache.etag(kind, task_id)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    if cached is not None:
+        return cached
+
+    # 先取版本再查询，查询期间发生的写入会使本次结果不被后续请求命中
+    version = stats_cache.version(task_id)
+    result = await compute(db, task_id)
+    stats_cache.set(kind, task_id, version, result)
+    return result
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断If-None-Match是否匹配当前ETag（忽略弱校验前缀）
+
+    Args:
+        if_none_match: 请求头的值
+        etag: 当前ETag
+
+    Returns:
+        是否匹配
+    """
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return any(
+        value == "*" or value.removeprefix("W/") == etag
+        for value in candidates
+    )
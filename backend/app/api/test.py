@@ -1,22 +1,35 @@
 """
 测试相关的API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Dict, Any, Optional
+import json
 import logging
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas.test import (
     SingleTestRequest,
     SingleTestResponse,
     ErrorResponse,
     BatchUploadResponse,
-    BatchProgressResponse
+    BatchProgressResponse,
+    TaskRecordPage,
+    UploadSessionCreateRequest,
+    UploadSessionResponse
 )
 from app.services.test_service import TestService
 from app.services.batch_test_service import BatchTestService
-from app.services.dify_client import DifyClientError
+from app.services.batch_queue import batch_queue
+from app.services.batch_ingest_service import BatchIngestService
+from app.services.upload_session_service import (
+    UploadSessionService,
+    UploadSessionNotFoundError,
+    UploadOffsetMismatchError
+)
+from app.services.export_service import ExportService
+from app.services.dify_client import DifyClientError, DifyCircuitOpenError
 
 logger = logging.getLogger(__name__)
 
@@ -30,21 +43,22 @@ router = APIRouter()
     responses={
         200: {"description": "测试成功"},
         400: {"model": ErrorResponse, "description": "请求参数错误"},
-        500: {"model": ErrorResponse, "description": "服务器内部错误"}
+        500: {"model": ErrorResponse, "description": "服务器内部错误"},
+        503: {"model": ErrorResponse, "description": "Dify服务熔断中"}
     },
     summary="单条评论测试",
     description="对单条用户评论进行标签提取和分析"
 )
 async def test_single_comment(
     request: SingleTestRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     单条评论测试接口
 
     Args:
         request: 包含评论内容的请求体
-        db: 数据库会话
+        db: 异步数据库会话
 
     Returns:
         包含任务ID和标签结果的响应
@@ -54,24 +68,22 @@ async def test_single_comment(
     """
     try:
         # 验证评论内容
-        comment = request.comment.strip()
-        if not comment:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="评论内容不能为空"
-            )
-
-        if len(comment) > 5000:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="评论内容长度不能超过5000个字符"
-            )
+        comment = _validate_comment(request.comment)
 
         # 调用测试服务
         result = await TestService.create_single_test(db, comment)
 
         return result
 
+    except DifyCircuitOpenError as e:
+        # Dify熔断中，快速失败
+        logger.warning(f"Dify熔断中: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
+
     except DifyClientError as e:
         # Dify API调用错误
         logger.error(f"Dify API错误: {str(e)}")
@@ -97,6 +109,84 @@ async def test_single_comment(
         )
 
 
+@router.post(
+    "/single/stream",
+    responses={
+        200: {"description": "SSE事件流", "content": {"text/event-stream": {}}},
+        400: {"model": ErrorResponse, "description": "请求参数错误"}
+    },
+    summary="单条评论流式测试",
+    description="以Dify流式模式处理单条评论，通过server-sent events逐步返回工作流事件和最终结果"
+)
+async def test_single_comment_stream(
+    request: SingleTestRequest
+) -> StreamingResponse:
+    """
+    单条评论流式测试接口
+
+    事件依次为: task（任务ID）、Dify工作流事件、result（与/single响应结构一致）或error
+
+    Args:
+        request: 包含评论内容的请求体
+
+    Returns:
+        text/event-stream流式响应
+    """
+    comment = _validate_comment(request.comment)
+
+    return StreamingResponse(
+        _format_sse(TestService.create_single_test_stream(comment)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+def _validate_comment(raw_comment: str) -> str:
+    """
+    校验并清理评论内容
+
+    Args:
+        raw_comment: 原始评论
+
+    Returns:
+        去除首尾空白后的评论
+
+    Raises:
+        HTTPException: 评论为空或超长时抛出
+    """
+    comment = raw_comment.strip()
+    if not comment:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="评论内容不能为空"
+        )
+
+    if len(comment) > 5000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="评论内容长度不能超过5000个字符"
+        )
+
+    return comment
+
+
+async def _format_sse(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    将事件字典格式化为SSE文本
+
+    Args:
+        events: 事件异步迭代器
+
+    Yields:
+        SSE格式的文本块
+    """
+    async for event in events:
+        yield f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
 @router.get(
     "/task/{task_id}",
     responses={
@@ -104,18 +194,24 @@ async def test_single_comment(
         404: {"description": "任务不存在"}
     },
     summary="获取任务详情",
-    description="根据任务ID获取测试任务详情和结果"
+    description="根据任务ID获取测试任务元数据。记录请通过/task/{task_id}/records分页"
+                "或/task/{task_id}/records/stream流式读取；include_records=true仅适合记录较少的任务"
 )
 async def get_task_detail(
     task_id: int,
-    db: Session = Depends(get_db)
+    include_records: bool = Query(
+        False,
+        description="是否附带全部记录，默认不附带，请改用/task/{task_id}/records分页读取"
+    ),
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     获取任务详情接口
 
     Args:
         task_id: 任务ID
-        db: 数据库会话
+        include_records: 是否附带全部记录
+        db: 异步只读数据库会话
 
     Returns:
         任务详情字典
@@ -124,7 +220,7 @@ async def get_task_detail(
         HTTPException: 任务不存在时抛出
     """
     try:
-        result = TestService.get_task(db, task_id)
+        result = await TestService.get_task(db, task_id, include_records=include_records)
         return result
 
     except ValueError as e:
@@ -141,6 +237,168 @@ async def get_task_detail(
         )
 
 
+@router.get(
+    "/task/{task_id}/records",
+    response_model=TaskRecordPage,
+    responses={
+        200: {"description": "获取成功"},
+        404: {"description": "任务不存在"}
+    },
+    summary="分页获取任务记录",
+    description="按记录ID游标分页获取任务记录，将上一页返回的next_cursor作为cursor传入获取下一页"
+)
+async def get_task_records(
+    task_id: int,
+    cursor: Optional[int] = Query(None, ge=0, description="上一页返回的next_cursor，为空时从第一条开始"),
+    limit: int = Query(100, ge=1, le=1000, description="每页条数"),
+    db: AsyncSession = Depends(get_read_db)
+) -> Dict[str, Any]:
+    """
+    分页获取任务记录接口
+
+    Args:
+        task_id: 任务ID
+        cursor: 分页游标
+        limit: 每页条数
+        db: 异步只读数据库会话
+
+    Returns:
+        分页结果字典
+
+    Raises:
+        HTTPException: 任务不存在时抛出
+    """
+    try:
+        return await TestService.get_task_records_page(db, task_id, cursor, limit)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    except Exception as e:
+        logger.error(f"获取任务记录失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取任务记录失败: {str(e)}"
+        )
+
+
+@router.get(
+    "/task/{task_id}/records/stream",
+    responses={
+        200: {"description": "NDJSON记录流", "content": {"application/x-ndjson": {}}},
+        404: {"description": "任务不存在"}
+    },
+    summary="流式获取任务记录",
+    description="以NDJSON格式（每行一条记录）按记录ID顺序流式返回任务的全部记录"
+)
+async def stream_task_records(
+    task_id: int,
+    db: AsyncSession = Depends(get_read_db)
+) -> StreamingResponse:
+    """
+    流式获取任务记录接口
+
+    Args:
+        task_id: 任务ID
+        db: 异步只读数据库会话（仅用于校验任务存在）
+
+    Returns:
+        application/x-ndjson流式响应
+
+    Raises:
+        HTTPException: 任务不存在时抛出
+    """
+    try:
+        await TestService.get_task(db, task_id, include_records=False)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    return StreamingResponse(
+        _format_ndjson(TestService.iter_task_records(task_id)),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.get(
+    "/task/{task_id}/export",
+    responses={
+        200: {
+            "description": "导出文件",
+            "content": {"text/csv": {}, "application/vnd.apache.parquet": {}}
+        },
+        400: {"model": ErrorResponse, "description": "导出格式不支持或缺少依赖"},
+        404: {"description": "任务不存在"}
+    },
+    summary="导出任务记录",
+    description="将任务的全部记录（评论、标签、置信度、处理时间）导出为CSV或Parquet，"
+                "分块读取数据库并流式写入响应"
+)
+async def export_task_records(
+    task_id: int,
+    format: str = Query("csv", description="导出格式: csv/parquet（Parquet需要安装pyarrow）"),
+    db: AsyncSession = Depends(get_read_db)
+) -> StreamingResponse:
+    """
+    导出任务记录接口
+
+    Args:
+        task_id: 任务ID
+        format: 导出格式
+        db: 异步只读数据库会话（仅用于校验任务存在）
+
+    Returns:
+        文件下载的流式响应
+
+    Raises:
+        HTTPException: 格式不支持或任务不存在时抛出
+    """
+    try:
+        ExportService.check_format(format)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    try:
+        await TestService.get_task(db, task_id, include_records=False)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    logger.info(f"开始导出任务记录，task_id={task_id}, format={format}")
+
+    return StreamingResponse(
+        ExportService.export(task_id, format),
+        media_type=ExportService.media_type(format),
+        headers={
+            "Content-Disposition": f'attachment; filename="{ExportService.filename(task_id, format)}"'
+        }
+    )
+
+
+async def _format_ndjson(records: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    将记录字典格式化为NDJSON文本
+
+    Args:
+        records: 记录异步迭代器
+
+    Yields:
+        每行一条记录的JSON文本
+    """
+    async for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
 @router.post(
     "/batch/upload",
     response_model=BatchUploadResponse,
@@ -150,59 +408,37 @@ async def get_task_detail(
         500: {"model": ErrorResponse, "description": "服务器内部错误"}
     },
     summary="批量测试上传",
-    description="上传CSV文件进行批量评论测试"
+    description=(
+        "上传文件进行批量评论测试，支持CSV、JSONL、Excel（.xlsx）、Parquet及其gzip/zip压缩文件；"
+        "文件边接收边写入磁盘并分块导入，评论数不设上限"
+    )
 )
 async def upload_batch_test(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(..., description="CSV文件"),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(..., description="CSV/JSONL/XLSX/Parquet文件，可为.gz或.zip压缩"),
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     批量测试上传接口
 
     Args:
-        background_tasks: FastAPI后台任务
-        file: 上传的CSV文件
-        db: 数据库会话
+        file: 上传的批量文件
+        db: 异步数据库会话
 
     Returns:
         包含任务ID的响应
     """
     try:
-        # 读取文件内容
-        file_content = await file.read()
-        filename = file.filename
-
-        # 解析CSV文件
+        # 上传文件写入暂存目录，按块读取评论列：第一块入队后即开始处理，其余评论在后台继续导入
         try:
-            comments, file_info = BatchTestService.parse_csv_file(
-                file_content,
-                filename
-            )
+            path = await BatchIngestService.spool_upload(file)
+            result = await BatchIngestService.start_ingest(db, path)
         except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(e)
             )
 
-        # 创建批量任务
-        task_id = await BatchTestService.create_batch_task(db, comments)
-
-        # 启动后台任务处理
-        background_tasks.add_task(
-            process_batch_comments,
-            task_id,
-            comments
-        )
-
-        logger.info(f"批量任务创建成功，task_id={task_id}, 评论数={len(comments)}")
-
-        return {
-            "task_id": task_id,
-            "status": "processing",
-            "total_count": len(comments),
-            "message": f"批量任务已创建，正在处理{len(comments)}条评论"
-        }
+        return _batch_upload_response(result)
 
     except HTTPException:
         raise
@@ -214,6 +450,245 @@ async def upload_batch_test(
         )
 
 
+def _batch_upload_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    唤醒队列worker并生成批量上传响应
+
+    Args:
+        result: 导入服务返回的任务信息（task_id, total_count, ingesting）
+
+    Returns:
+        批量上传响应字典
+    """
+    task_id = result["task_id"]
+    total_count = result["total_count"]
+
+    # 唤醒队列worker处理
+    batch_queue.notify()
+
+    logger.info(
+        f"批量任务创建成功，task_id={task_id}, 已导入评论数={total_count}, "
+        f"导入中={result['ingesting']}"
+    )
+
+    message = f"批量任务已创建，正在处理{total_count}条评论"
+    if result["ingesting"]:
+        message = f"批量任务已创建，已导入{total_count}条评论，其余评论正在继续导入"
+
+    return {
+        "task_id": task_id,
+        "status": "processing",
+        "total_count": total_count,
+        "ingesting": result["ingesting"],
+        "message": message
+    }
+
+
+@router.post(
+    "/batch/uploads",
+    response_model=UploadSessionResponse,
+    responses={
+        200: {"description": "创建成功"},
+        400: {"model": ErrorResponse, "description": "文件格式不支持或超过大小限制"},
+        500: {"model": ErrorResponse, "description": "服务器内部错误"}
+    },
+    summary="创建分块上传会话",
+    description="大文件分块断点续传：创建会话后按偏移量逐块上传，断线后查询偏移量继续，全部上传后完成上传"
+)
+async def create_upload_session(
+    request: UploadSessionCreateRequest,
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    创建分块上传会话接口
+
+    Args:
+        request: 文件名、总大小和可选的整文件SHA-256
+        db: 异步数据库会话
+
+    Returns:
+        上传会话信息
+    """
+    try:
+        return await UploadSessionService.create_session(
+            db,
+            request.filename,
+            request.total_size,
+            request.sha256
+        )
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    except Exception as e:
+        logger.error(f"创建上传会话失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建上传会话失败: {str(e)}"
+        )
+
+
+@router.get(
+    "/batch/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    responses={
+        200: {"description": "查询成功"},
+        404: {"model": ErrorResponse, "description": "上传会话不存在或已过期"}
+    },
+    summary="查询分块上传偏移量",
+    description="查询已接收的字节数，断线后从返回的offset继续上传"
+)
+async def get_upload_session(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    查询分块上传会话接口
+
+    Args:
+        upload_id: 上传ID
+        db: 异步数据库会话
+
+    Returns:
+        上传会话信息
+    """
+    try:
+        return await UploadSessionService.get_session(db, upload_id)
+
+    except UploadSessionNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+
+@router.put(
+    "/batch/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    responses={
+        200: {"description": "分块写入成功"},
+        400: {"model": ErrorResponse, "description": "分块过大、超出文件大小或校验失败"},
+        404: {"model": ErrorResponse, "description": "上传会话不存在或已过期"},
+        409: {"model": ErrorResponse, "description": "偏移量与已接收字节数不一致"},
+        500: {"model": ErrorResponse, "description": "服务器内部错误"}
+    },
+    summary="上传分块",
+    description="请求体为分块的原始字节，offset必须等于已接收的字节数，X-Chunk-SHA256为分块内容的SHA-256"
+)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="分块在文件中的起始偏移量"),
+    chunk_sha256: str = Header(
+        ...,
+        alias="X-Chunk-SHA256",
+        pattern=r"^[0-9a-fA-F]{64}$",
+        description="分块内容的SHA-256（十六进制）"
+    ),
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    上传分块接口，请求体边接收边写入暂存文件
+
+    Args:
+        upload_id: 上传ID
+        request: 请求对象，读取原始请求体
+        offset: 分块起始偏移量
+        chunk_sha256: 分块内容的SHA-256
+        db: 异步数据库会话
+
+    Returns:
+        写入后的上传会话信息
+    """
+    try:
+        return await UploadSessionService.write_chunk(
+            db,
+            upload_id,
+            offset,
+            chunk_sha256,
+            request.stream()
+        )
+
+    except UploadSessionNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    except UploadOffsetMismatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Upload-Offset": str(e.expected_offset)}
+        )
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    except Exception as e:
+        logger.error(f"分块上传失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"分块上传失败: {str(e)}"
+        )
+
+
+@router.post(
+    "/batch/uploads/{upload_id}/complete",
+    response_model=BatchUploadResponse,
+    responses={
+        200: {"description": "上传完成，批量任务已创建"},
+        400: {"model": ErrorResponse, "description": "文件未上传完整、校验失败或格式错误"},
+        404: {"model": ErrorResponse, "description": "上传会话不存在或已过期"},
+        500: {"model": ErrorResponse, "description": "服务器内部错误"}
+    },
+    summary="完成分块上传",
+    description="校验文件大小和SHA-256后创建批量任务，暂存文件直接交给分块导入流程；整文件SHA-256校验失败时已接收字节数归零，需从0字节重新上传；重复调用返回已创建的任务"
+)
+async def complete_upload(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    完成分块上传接口
+
+    Args:
+        upload_id: 上传ID
+        db: 异步数据库会话
+
+    Returns:
+        包含任务ID的响应
+    """
+    try:
+        result = await UploadSessionService.complete(db, upload_id)
+        return _batch_upload_response(result)
+
+    except UploadSessionNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    except Exception as e:
+        logger.error(f"完成分块上传失败: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"完成分块上传失败: {str(e)}"
+        )
+
+
 @router.get(
     "/batch/progress/{task_id}",
     response_model=BatchProgressResponse,
@@ -226,14 +701,14 @@ async def upload_batch_test(
 )
 async def get_batch_progress(
     task_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     批量进度查询接口
 
     Args:
         task_id: 任务ID
-        db: 数据库会话
+        db: 异步只读数据库会话
 
     Returns:
         进度信息字典
@@ -242,7 +717,7 @@ async def get_batch_progress(
         HTTPException: 任务不存在时抛出
     """
     try:
-        progress = BatchTestService.get_batch_progress(db, task_id)
+        progress = await BatchTestService.get_batch_progress(db, task_id)
         return progress
 
     except ValueError as e:
@@ -258,20 +733,3 @@ async def get_batch_progress(
             detail=f"查询进度失败: {str(e)}"
         )
 
-
-# 后台任务处理函数
-async def process_batch_comments(task_id: int, comments: list[str]):
-    """
-    后台任务：处理批量评论
-
-    Args:
-        task_id: 任务ID
-        comments: 评论列表
-    """
-    from app.database import SessionLocal
-
-    db = SessionLocal()
-    try:
-        await BatchTestService.process_batch_task(db, task_id, comments)
-    finally:
-        db.close()
@@ -2,7 +2,7 @@
 配置管理模块
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -15,16 +15,72 @@ class Settings(BaseSettings):
 
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./user_profile_agent.db"
+    ASYNC_DATABASE_URL: Optional[str] = None  # 异步驱动连接URL，不设置时由DATABASE_URL推导（SQLite使用aiosqlite）
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL模式下读写互不阻塞
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL模式下NORMAL即可保证一致性
+    SQLITE_CACHE_SIZE: int = -64000  # 页缓存，负数表示KB（约64MB）
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 内存映射读取大小（字节）
+    SQLITE_BUSY_TIMEOUT: int = 5000  # 锁等待超时（毫秒）
+    SQLITE_SEPARATE_READ_ENGINE: bool = True  # 统计和进度查询使用独立的只读连接池
+    SQLITE_READ_POOL_SIZE: int = 5  # 只读连接池大小
 
     # Dify API配置
     DIFY_API_KEY: str = "app-33QFU9RLluraZy9P92lDGjHc"
     DIFY_BASE_URL: str = "https://api.dify.ai/v1"
+    DIFY_TIMEOUT: float = 30.0  # 单次请求超时（秒）
+    DIFY_MAX_CONNECTIONS: int = 20  # 连接池最大连接数
+    DIFY_MAX_KEEPALIVE_CONNECTIONS: int = 10  # 连接池保持的空闲长连接数
+    DIFY_KEEPALIVE_EXPIRY: float = 30.0  # 空闲长连接过期时间（秒）
+    DIFY_HTTP2: bool = False  # 是否启用HTTP/2，需要安装httpx[http2]
+    DIFY_MAX_RETRIES: int = 3  # 最大尝试次数
+    DIFY_RETRY_BASE_DELAY: float = 0.5  # 指数退避基准时间（秒）
+    DIFY_RETRY_MAX_DELAY: float = 30.0  # 单次重试最长等待（秒）
+    DIFY_RATE_LIMIT: float = 10.0  # 全局每秒请求数，<=0表示不限流
+    DIFY_RATE_BURST: int = 10  # 限流器允许的突发请求数
+    DIFY_CIRCUIT_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断，<=0表示禁用
+    DIFY_CIRCUIT_RECOVERY_TIMEOUT: float = 30.0  # 熔断后多久开始试探（秒）
+    DIFY_CIRCUIT_HALF_OPEN_MAX_CALLS: int = 1  # 半开状态允许的试探请求数
+
+    # 标签结果缓存配置
+    TAG_CACHE_ENABLED: bool = True
+    TAG_CACHE_MEMORY_SIZE: int = 10000  # 内存LRU容量
+    TAG_CACHE_DB_PATH: str = "./tag_cache.db"  # 持久化缓存文件，为空则只使用内存
+    TAG_CACHE_TTL: int = 7 * 24 * 3600  # 缓存有效期（秒）
+    TAG_CACHE_MAX_ENTRIES: int = 200000  # 持久化缓存最大条目数
+
+    # 统计分析配置
+    CATEGORY_RULES_FILE: Optional[str] = None  # 标签分类词典JSON文件，不设置时使用内置词典
+    STATS_CACHE_ENABLED: bool = True  # 缓存统计查询结果，记录写入后自动失效
+    STATS_CACHE_MAX_ENTRIES: int = 1000  # 最多缓存的统计结果数
+
+    # 批量处理配置
+    BATCH_CONCURRENCY: int = 5  # 批量任务并发调用Dify的worker数，1表示顺序执行
+    BATCH_QUEUE_WORKERS: int = 1  # 同时处理的批量任务数
+    BATCH_QUEUE_LEASE_SECONDS: float = 60.0  # 任务租约时长（秒），worker定期续约
+    BATCH_QUEUE_POLL_INTERVAL: float = 5.0  # 队列空闲时的轮询间隔（秒）
+    BATCH_FLUSH_ROWS: int = 50  # 批量写入记录的条数阈值
+    BATCH_FLUSH_INTERVAL_MS: int = 1000  # 批量写入记录的时间阈值（毫秒）
+    BATCH_FLUSH_MAX_RETRIES: int = 5  # 数据库被锁定时批量写入的最大重试次数，用尽后任务失败
+    BATCH_FLUSH_RETRY_BASE_DELAY: float = 0.5  # 批量写入重试的指数退避基准时间（秒）
+    BATCH_FLUSH_RETRY_MAX_DELAY: float = 8.0  # 批量写入单次重试最长等待（秒）
+    BATCH_CIRCUIT_MAX_WAIT: float = 600.0  # 熔断时单条评论最长暂停等待（秒），超过后记为处理失败
+    BATCH_INGEST_CHUNK_ROWS: int = 5000  # 流式导入时每次解析的文件行数
+    BATCH_INGEST_POLL_INTERVAL: float = 0.5  # 处理追上导入进度时等待新输入项的间隔（秒）
+    BATCH_DEDUP_ENABLED: bool = True  # 任务内重复评论只调用一次Dify，结果复用到每条记录
+    BATCH_DEDUP_SIMHASH_DISTANCE: int = 3  # 近似重复的SimHash汉明距离阈值（64位），0表示只合并归一化后相同的评论；调大可能合并只差一个否定词的评论
+    BATCH_DEDUP_MIN_LENGTH: int = 10  # 归一化后至少多少字的评论才做近似匹配，短评论只做精确去重
+    BATCH_DEDUP_MAX_CLUSTERS: int = 100000  # 每个任务最多登记的去重簇数，超出后新评论不参与去重
 
     # CORS配置
     CORS_ORIGINS: List[str] = ["http://localhost:5173"]
 
     # 文件上传配置
-    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_UPLOAD_SIZE: int = 1024 * 1024 * 1024  # 批量上传文件大小上限（1GB），边接收边写入磁盘
+    UPLOAD_DIR: str = "./uploads"  # 上传文件暂存目录，导入完成后删除
+    MAX_RESUMABLE_UPLOAD_SIZE: int = 10 * 1024 * 1024 * 1024  # 分块上传的文件大小上限（10GB）
+    UPLOAD_CHUNK_MAX_SIZE: int = 16 * 1024 * 1024  # 分块上传单个分块的大小上限（16MB）
+    UPLOAD_SESSION_TTL: int = 24 * 3600  # 分块上传会话无新分块写入后的保留时间（秒）
+    UPLOAD_SESSION_CLEANUP_INTERVAL: int = 3600  # 清理过期分块上传会话的间隔（秒）
 
     class Config:
         env_file = ".env"
@@ -1,39 +1,162 @@
 """
 数据库连接模块
 """
-from sqlalchemy import create_engine
+import os
+from typing import AsyncIterator
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
 
-# 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # SQLite特有配置
-)
 
-# 创建会话工厂
+def _sqlite_file_path(database_url: str):
+    """
+    获取SQLite数据库文件路径
+
+    Returns:
+        文件绝对路径，非SQLite或内存数据库返回None
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        return None
+    if not url.database or url.database == ":memory:" or url.database.startswith("file:"):
+        return None
+    return os.path.abspath(url.database)
+
+
+def _set_sqlite_pragmas(dbapi_connection, read_only: bool):
+    """
+    为新建的SQLite连接设置PRAGMA
+
+    Args:
+        dbapi_connection: DBAPI连接
+        read_only: 是否为只读连接
+    """
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # journal_mode持久化在数据库文件中，只需由写连接设置
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    else:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+    cursor.close()
+
+
+def _async_database_url(database_url: str) -> str:
+    """
+    获取异步驱动的连接URL
+
+    优先使用配置ASYNC_DATABASE_URL，否则SQLite改用aiosqlite驱动，其他数据库原样返回。
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.get_driver_name() != "aiosqlite":
+        return url.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    return database_url
+
+
+def _create_engine():
+    """
+    创建同步引擎（仅供init_db.py等脚本和数据库迁移使用）
+    """
+    is_sqlite = make_url(settings.DATABASE_URL).get_backend_name() == "sqlite"
+    connect_args = {"check_same_thread": False} if is_sqlite else {}  # SQLite特有配置
+
+    sync_engine = create_engine(settings.DATABASE_URL, connect_args=connect_args)
+    if is_sqlite:
+        event.listen(sync_engine, "connect", lambda conn, _: _set_sqlite_pragmas(conn, read_only=False))
+    return sync_engine
+
+
+def _create_async_engines():
+    """
+    创建异步读写引擎和异步只读引擎
+
+    SQLite文件数据库时只读引擎以mode=ro打开独立连接池，WAL模式下读取不会等待批量写入；
+    其他数据库或内存数据库时只读引擎与写引擎相同。
+    """
+    async_url = _async_database_url(settings.DATABASE_URL)
+    if make_url(async_url).get_backend_name() != "sqlite":
+        write_engine = create_async_engine(async_url)
+        return write_engine, write_engine
+
+    file_path = _sqlite_file_path(settings.DATABASE_URL)
+    if file_path is None:
+        # 内存数据库只能共享同一个连接
+        write_engine = create_async_engine(async_url)
+        event.listen(write_engine.sync_engine, "connect", lambda conn, _: _set_sqlite_pragmas(conn, read_only=False))
+        return write_engine, write_engine
+
+    # aiosqlite默认不复用连接，显式使用连接池避免每次请求重新打开文件和设置PRAGMA
+    write_engine = create_async_engine(async_url, poolclass=AsyncAdaptedQueuePool)
+    event.listen(write_engine.sync_engine, "connect", lambda conn, _: _set_sqlite_pragmas(conn, read_only=False))
+    if not settings.SQLITE_SEPARATE_READ_ENGINE:
+        return write_engine, write_engine
+
+    read_only_engine = create_async_engine(
+        f"sqlite+aiosqlite:///file:{file_path}?mode=ro&uri=true",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.SQLITE_READ_POOL_SIZE
+    )
+    event.listen(read_only_engine.sync_engine, "connect", lambda conn, _: _set_sqlite_pragmas(conn, read_only=True))
+    return write_engine, read_only_engine
+
+
+# 同步引擎（脚本、迁移）
+engine = _create_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎（接口、批量任务）和只读引擎（统计、进度查询）
+async_engine, async_read_engine = _create_async_engines()
+
+# 异步会话提交后不过期对象，避免访问属性时触发隐式IO
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 # 创建基类
 Base = declarative_base()
 
 
-def get_db():
+async def get_db() -> AsyncIterator[AsyncSession]:
     """
-    获取数据库会话
+    获取异步数据库会话
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    """
+    获取异步只读数据库会话（用于看板统计、进度轮询等只读查询）
+    """
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def close_db():
+    """
+    释放异步连接池（应用关闭时调用）
+    """
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
 
 
 def init_db():
     """
-    初始化数据库，创建所有表
+    初始化数据库，创建所有表并执行未应用的迁移
     """
-    from app.models import task, record, statistic  # noqa: F401
+    from app.models import task, record, statistic, job, upload  # noqa: F401
+    from app.migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
     print("✅ 数据库初始化成功！已创建所有表。")
+    if applied:
+        print(f"✅ 已应用数据库迁移: {applied}")
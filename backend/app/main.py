@@ -4,7 +4,13 @@ FastAPI应用主入口
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.database import init_db
+from app.database import init_db, close_db
+from app.services.dify_client import dify_client
+from app.services.batch_queue import batch_queue
+from app.services.batch_ingest_service import BatchIngestService
+from app.services.upload_session_service import UploadSessionService
+from app.services.record_writer import BufferedRecordWriter
+from app.services.stats_cache import stats_cache
 
 
 # 创建FastAPI应用
@@ -32,9 +38,37 @@ async def startup_event():
     """
     # 初始化数据库
     init_db()
+    # 打开Dify长连接池
+    await dify_client.start()
+    # 回收过期租约并启动批量任务队列
+    await batch_queue.recover_stale_leases()
+    await batch_queue.start()
+    # 继续导入上次未完成的批量上传文件
+    await BatchIngestService.resume_pending()
+    # 清理过期的分块上传会话并启动定期清理
+    await UploadSessionService.start()
     print(f"{settings.APP_NAME} v{settings.APP_VERSION} 启动成功！")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    应用关闭事件
+    """
+    # 停止过期上传会话的定期清理
+    await UploadSessionService.stop()
+    # 停止后台文件导入，重启后从已导入的行继续
+    await BatchIngestService.stop()
+    # 停止队列worker，进行中的任务放回队列
+    await batch_queue.stop()
+    # 写入批量任务缓冲中的剩余记录
+    await BufferedRecordWriter.close_all()
+    # 关闭Dify长连接池
+    await dify_client.close()
+    # 释放数据库连接池
+    await close_db()
+
+
 @app.get("/")
 async def root():
     """
@@ -51,7 +85,11 @@ async def health_check():
     """
     健康检查接口
     """
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "dify": dify_client.stats(),
+        "stats_cache": stats_cache.stats()
+    }
 
 
 # 注册路由
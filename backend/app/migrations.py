@@ -0,0 +1,197 @@
+"""
+数据库版本迁移
+create_all只会创建缺失的表，不会修改已有表；对已有数据库的索引、数据回填等变更
+以带版本号的迁移登记在MIGRATIONS中，启动时按版本顺序执行未应用的迁移
+"""
+import logging
+import re
+from typing import Callable, Dict, List, NamedTuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    """迁移定义"""
+    version: int
+    description: str
+    upgrade: Callable[[Session], None]
+
+
+def _add_test_record_indexes(db: Session):
+    """为test_records添加按任务和时间查询的索引"""
+    db.execute(text("CREATE INDEX IF NOT EXISTS ix_test_records_task_id ON test_records (task_id)"))
+    db.execute(text("CREATE INDEX IF NOT EXISTS ix_test_records_created_at ON test_records (created_at)"))
+    db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_test_records_task_id_created_at ON test_records (task_id, created_at)"
+    ))
+
+
+def _backfill_statistics(db: Session):
+    """回填升级前记录的record_tags和统计汇总表"""
+    from app.services.stats_service import StatisticsService
+    StatisticsService.ensure_aggregates(db)
+
+
+def _backfill_rollups(db: Session):
+    """根据已有记录回填时间分桶汇总"""
+    from app.services.stats_service import StatisticsService
+    StatisticsService.rebuild_rollups(db)
+
+
+def _add_column_if_missing(db: Session, table: str, column: str, ddl: str):
+    """为已有表添加列（create_all新建的表已包含该列时跳过）"""
+    existing = {col["name"] for col in inspect(db.connection()).get_columns(table)}
+    if column not in existing:
+        db.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _add_batch_job_ingest_columns(db: Session):
+    """batch_jobs添加流式导入状态列"""
+    _add_column_if_missing(db, "batch_jobs", "ingest_status", "VARCHAR(20) NOT NULL DEFAULT 'complete'")
+    _add_column_if_missing(db, "batch_jobs", "ingest_error", "TEXT")
+    _add_column_if_missing(db, "batch_jobs", "source_path", "VARCHAR(500)")
+    _add_column_if_missing(db, "batch_jobs", "ingested_rows", "INTEGER NOT NULL DEFAULT 0")
+
+
+# 迁移列表，只能追加，不能修改已发布的版本
+MIGRATIONS: List[Migration] = [
+    Migration(1, "test_records添加task_id、created_at及组合索引", _add_test_record_indexes),
+    Migration(2, "回填record_tags和统计汇总表", _backfill_statistics),
+    Migration(3, "回填按分钟/小时/天的时间分桶汇总", _backfill_rollups),
+    Migration(4, "batch_jobs添加流式导入状态列", _add_batch_job_ingest_columns),
+]
+
+
+def get_schema_version(db: Session) -> int:
+    """
+    获取当前数据库已应用的最高迁移版本
+
+    Args:
+        db: 数据库会话
+
+    Returns:
+        版本号，未应用任何迁移时为0
+    """
+    return db.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """
+    执行所有未应用的迁移
+
+    Args:
+        engine: 数据库引擎
+
+    Returns:
+        本次应用的迁移版本列表
+    """
+    db = Session(bind=engine)
+    applied = []
+    try:
+        db.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description TEXT NOT NULL, "
+            "applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        db.commit()
+
+        current = get_schema_version(db)
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if migration.version <= current:
+                continue
+
+            logger.info(f"执行数据库迁移 v{migration.version}: {migration.description}")
+            migration.upgrade(db)
+            db.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": migration.version, "description": migration.description}
+            )
+            db.commit()
+            applied.append(migration.version)
+
+        return applied
+
+    except Exception:
+        db.rollback()
+        raise
+
+    finally:
+        db.close()
+
+
+# 需要保持索引命中的按任务查询，键为说明，值为(SQL, 参数)
+PER_TASK_QUERIES: Dict[str, tuple] = {
+    "任务记录列表": (
+        "SELECT * FROM test_records WHERE task_id = :task_id ORDER BY id",
+        {"task_id": 1}
+    ),
+    "任务记录按时间范围": (
+        "SELECT * FROM test_records WHERE task_id = :task_id "
+        "AND created_at >= :start ORDER BY created_at",
+        {"task_id": 1, "start": "2024-01-01"}
+    ),
+    "任务记录分页": (
+        "SELECT * FROM test_records WHERE task_id = :task_id AND id > :cursor ORDER BY id LIMIT 100",
+        {"task_id": 1, "cursor": 0}
+    ),
+    "任务记录计数": (
+        "SELECT COUNT(*) FROM test_records WHERE task_id = :task_id",
+        {"task_id": 1}
+    ),
+    "任务标签分组": (
+        "SELECT tag, COUNT(*) FROM record_tags WHERE task_id = :task_id GROUP BY tag",
+        {"task_id": 1}
+    ),
+    "队列未完成输入项": (
+        "SELECT id, seq, comment_text FROM batch_job_items "
+        "WHERE task_id = :task_id AND status = 'pending' AND seq > :seq ORDER BY seq LIMIT 500",
+        {"task_id": 1, "seq": -1}
+    ),
+}
+
+
+def explain_query_plan(db: Session, sql: str, params: dict) -> List[str]:
+    """
+    获取SQLite查询计划
+
+    Args:
+        db: 数据库会话
+        sql: 查询语句
+        params: 查询参数
+
+    Returns:
+        查询计划描述列表
+    """
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(engine: Engine) -> Dict[str, dict]:
+    """
+    检查按任务过滤的查询是否走索引（出现不带索引的"SCAN 表"即视为全表扫描）
+
+    Args:
+        engine: 数据库引擎
+
+    Returns:
+        {查询说明: {"plan": [...], "uses_index": bool}}，非SQLite数据库返回空字典
+    """
+    if engine.dialect.name != "sqlite":
+        return {}
+
+    full_scan = re.compile(r"^SCAN (TABLE )?\w+$")
+    results = {}
+    db = Session(bind=engine)
+    try:
+        for name, (sql, params) in PER_TASK_QUERIES.items():
+            plan = explain_query_plan(db, sql, params)
+            results[name] = {
+                "plan": plan,
+                "uses_index": not any(full_scan.match(step.strip()) for step in plan)
+            }
+    finally:
+        db.close()
+    return results
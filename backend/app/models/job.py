@@ -0,0 +1,44 @@
+"""
+批量任务队列模型
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class BatchJob(Base):
+    """批量任务队列表"""
+    __tablename__ = "batch_jobs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    task_id = Column(Integer, ForeignKey("test_tasks.id"), nullable=False, unique=True)
+    status = Column(String(20), nullable=False, default="queued")  # 'queued', 'running', 'completed', 'failed'
+    lease_owner = Column(String(100), nullable=True)  # 持有租约的worker标识
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # 租约过期时间
+    attempts = Column(Integer, nullable=False, default=0)  # 被领取次数
+    ingest_status = Column(String(20), nullable=False, default="complete", server_default="complete")  # 'ingesting', 'complete', 'failed'
+    ingest_error = Column(Text, nullable=True)  # 文件读取失败原因
+    source_path = Column(String(500), nullable=True)  # 流式导入中的上传文件路径
+    ingested_rows = Column(Integer, nullable=False, default=0, server_default="0")  # 已读取的文件数据行数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_batch_jobs_status_lease", "status", "lease_expires_at"),
+    )
+
+
+class BatchJobItem(Base):
+    """批量任务输入项表"""
+    __tablename__ = "batch_job_items"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    task_id = Column(Integer, ForeignKey("test_tasks.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 输入顺序
+    comment_text = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # 'pending', 'done'
+
+    __table_args__ = (
+        UniqueConstraint("task_id", "seq", name="uq_batch_job_items_task_seq"),
+        Index("ix_batch_job_items_task_status_seq", "task_id", "status", "seq"),
+    )
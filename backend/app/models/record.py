@@ -1,7 +1,7 @@
 """
 测试记录模型
 """
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -11,9 +11,32 @@ class TestRecord(Base):
     __tablename__ = "test_records"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    task_id = Column(Integer, ForeignKey("test_tasks.id"), nullable=False)
+    task_id = Column(Integer, ForeignKey("test_tasks.id"), nullable=False, index=True)
     comment_text = Column(Text, nullable=False)
     tags_json = Column(Text, nullable=False)  # JSON格式存储标签
     confidence = Column(Float, nullable=True)  # 置信度
     processing_time = Column(Float, nullable=True)  # 处理耗时(毫秒)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        Index("ix_test_records_task_id_created_at", "task_id", "created_at"),
+    )
+
+
+class RecordTag(Base):
+    """记录标签关联表（每条记录的每个标签一行）"""
+    __tablename__ = "record_tags"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    record_id = Column(Integer, ForeignKey("test_records.id"), nullable=False, index=True)
+    task_id = Column(Integer, nullable=False)
+    tag = Column(String(100), nullable=False)
+    dimension = Column(String(50), nullable=True)  # 组合标签"维度:值"中的维度
+    value = Column(String(50), nullable=True)  # 组合标签"维度:值"中的值
+
+    __table_args__ = (
+        Index("ix_record_tags_task_tag", "task_id", "tag"),
+        Index("ix_record_tags_tag", "tag"),
+        Index("ix_record_tags_task_dimension_value", "task_id", "dimension", "value"),
+        Index("ix_record_tags_dimension_value", "dimension", "value"),
+    )
@@ -1,13 +1,13 @@
 """
 标签统计模型
 """
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from app.database import Base
 
 
 class TagStatistic(Base):
-    """标签统计表"""
+    """标签统计表（全局每个标签的出现次数）"""
     __tablename__ = "tag_statistics"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -15,3 +15,67 @@ class TagStatistic(Base):
     tag_category = Column(String(50), nullable=True)  # 标签分类(如: '需求', '情感', '场景'等)
     occurrence_count = Column(Integer, nullable=False, default=0)
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class TaskTagStatistic(Base):
+    """任务标签统计表（每个任务内每个标签的出现次数）"""
+    __tablename__ = "task_tag_statistics"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    task_id = Column(Integer, nullable=False)
+    tag_name = Column(String(100), nullable=False)
+    occurrence_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("task_id", "tag_name", name="uq_task_tag_statistics_task_tag"),
+    )
+
+
+class TaskStatistic(Base):
+    """任务汇总统计表（task_id为0表示全局汇总）"""
+    __tablename__ = "task_statistics"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    task_id = Column(Integer, nullable=False, unique=True)
+    comment_count = Column(Integer, nullable=False, default=0)
+    tag_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    confidence_count = Column(Integer, nullable=False, default=0)
+    processing_time_sum = Column(Float, nullable=False, default=0.0)
+    processing_time_count = Column(Integer, nullable=False, default=0)
+    last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StatisticRollup(Base):
+    """按时间分桶的汇总统计表（granularity为minute/hour/day，bucket_start为UTC时间）"""
+    __tablename__ = "statistic_rollups"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    comment_count = Column(Integer, nullable=False, default=0)
+    tag_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    confidence_count = Column(Integer, nullable=False, default=0)
+    processing_time_sum = Column(Float, nullable=False, default=0.0)
+    processing_time_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", name="uq_statistic_rollups_granularity_bucket"),
+    )
+
+
+class TagRollup(Base):
+    """按时间分桶的标签出现次数表"""
+    __tablename__ = "tag_rollups"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    tag_name = Column(String(100), nullable=False)
+    occurrence_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "tag_name", name="uq_tag_rollups_granularity_bucket_tag"),
+        Index("ix_tag_rollups_granularity_tag_bucket", "granularity", "tag_name", "bucket_start"),
+    )
@@ -0,0 +1,27 @@
+"""
+分块上传会话模型
+"""
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class UploadSession(Base):
+    """分块上传会话表"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # 上传ID
+    filename = Column(String(255), nullable=False)  # 原始文件名
+    total_size = Column(BigInteger, nullable=False)  # 文件总字节数
+    sha256 = Column(String(64), nullable=True)  # 整个文件的SHA-256，完成上传时校验
+    received_size = Column(BigInteger, nullable=False, default=0)  # 已校验写入的字节数
+    path = Column(String(500), nullable=False)  # 暂存文件路径
+    status = Column(String(20), nullable=False, default="uploading")  # 'uploading', 'completed'
+    task_id = Column(Integer, ForeignKey("test_tasks.id"), nullable=True)  # 完成上传后创建的任务
+    expires_at = Column(DateTime(timezone=True), nullable=False)  # 过期时间，每次写入分块后顺延
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_upload_sessions_expires_at", "expires_at"),
+    )
@@ -1,7 +1,7 @@
 """
 统计分析相关的Pydantic schemas
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -25,13 +25,47 @@ class StatisticsOverview(BaseModel):
     total_tags: int = Field(..., description="总标签数")
     unique_tags: int = Field(..., description="唯一标签数")
     avg_confidence: float = Field(..., description="平均置信度")
-    avg_processing_time: float = Field(..., description="平均处理时间（秒）")
+    avg_processing_time: float = Field(..., description="平均处理时间（秒），不含缓存命中和去重复用的记录")
     top_tags: List[TagDistributionItem] = Field(..., description="热门标签Top 10")
     category_distribution: List[CategoryDistributionItem] = Field(
         ..., description="分类分布"
     )
 
 
+class DimensionValueItem(BaseModel):
+    """维度取值分布项"""
+    value: str = Field(..., description="取值（如正面/负面）")
+    count: int = Field(..., description="出现次数")
+    percentage: float = Field(..., description="在该维度内的占比（百分比）")
+
+
+class DimensionDistributionItem(BaseModel):
+    """维度分布项"""
+    dimension: str = Field(..., description="维度名称")
+    count: int = Field(..., description="出现次数")
+    values: List[DimensionValueItem] = Field(..., description="取值分布")
+
+
+class TimeSeriesPoint(BaseModel):
+    """时间序列数据点"""
+    bucket_start: str = Field(..., description="时间桶起点（UTC，ISO格式）")
+    comment_count: int = Field(..., description="评论数")
+    tag_count: int = Field(..., description="标签数")
+    avg_confidence: float = Field(..., description="平均置信度")
+    avg_processing_time: float = Field(..., description="平均处理时间，不含缓存命中和去重复用的记录")
+    tag_occurrences: Optional[int] = Field(None, description="指定标签的出现次数（仅在指定tag时返回，否则不含该字段）")
+
+
+class TimeSeriesResponse(BaseModel):
+    """时间序列统计"""
+    granularity: str = Field(..., description="时间粒度: minute/hour/day")
+    start: str = Field(..., description="起始时间（UTC，含）")
+    end: str = Field(..., description="结束时间（UTC，不含）")
+    tag: Optional[str] = Field(None, description="指定的标签")
+    points: List[TimeSeriesPoint] = Field(..., description="按时间升序的数据点，无数据的时间桶计为0")
+    top_tags: List[TagDistributionItem] = Field(..., description="时间范围内的热门标签Top 10")
+
+
 class ErrorResponse(BaseModel):
     """错误响应"""
     detail: str = Field(..., description="错误详情")
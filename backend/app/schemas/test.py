@@ -24,7 +24,8 @@ class TagResult(BaseModel):
     """标签结果"""
     tags: List[str] = Field(description="提取的标签列表")
     confidence: float = Field(default=0.0, description="置信度")
-    processing_time: float = Field(description="处理时间（毫秒）")
+    processing_time: Optional[float] = Field(None, description="处理时间（毫秒），命中缓存时为空")
+    cached: bool = Field(default=False, description="是否命中标签缓存")
 
 
 class SingleTestResponse(BaseModel):
@@ -95,7 +96,8 @@ class BatchUploadResponse(BaseModel):
     """批量上传响应"""
     task_id: int = Field(description="任务ID")
     status: str = Field(description="任务状态")
-    total_count: int = Field(description="总评论数")
+    total_count: int = Field(description="总评论数（导入中时为已导入的评论数）")
+    ingesting: bool = Field(default=False, description="是否仍在导入文件中的其余评论")
     message: str = Field(description="提示信息")
 
     class Config:
@@ -109,6 +111,36 @@ class BatchUploadResponse(BaseModel):
         }
 
 
+class UploadSessionCreateRequest(BaseModel):
+    """创建分块上传会话请求"""
+    filename: str = Field(..., min_length=1, max_length=255, description="原始文件名，按扩展名选择读取器")
+    total_size: int = Field(..., gt=0, description="文件总字节数")
+    sha256: Optional[str] = Field(
+        None,
+        pattern=r"^[0-9a-fA-F]{64}$",
+        description="整个文件的SHA-256（十六进制），提供时完成上传前校验"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "filename": "comments.jsonl.gz",
+                "total_size": 104857600
+            }
+        }
+
+
+class UploadSessionResponse(BaseModel):
+    """分块上传会话响应"""
+    upload_id: str = Field(description="上传ID")
+    filename: str = Field(description="原始文件名")
+    total_size: int = Field(description="文件总字节数")
+    offset: int = Field(description="已接收的字节数，下一个分块从该偏移量开始")
+    status: str = Field(description="会话状态（uploading/completed）")
+    chunk_size: int = Field(description="单个分块的大小上限（字节）")
+    task_id: Optional[int] = Field(None, description="完成上传后创建的任务ID")
+
+
 class BatchProgressResponse(BaseModel):
     """批量进度响应"""
     task_id: int
@@ -116,7 +148,46 @@ class BatchProgressResponse(BaseModel):
     total_count: int
     processed_count: int
     progress: float = Field(description="进度百分比（0-100）")
+    ingesting: bool = Field(default=False, description="是否仍在导入文件中的其余评论，导入中时total_count会继续增长")
     error_message: Optional[str] = None
 
     class Config:
         from_attributes = True
+
+
+# Task record pagination schemas
+class TaskRecordItem(BaseModel):
+    """任务记录项"""
+    id: int = Field(description="记录ID")
+    comment_text: str = Field(description="评论内容")
+    tags: List[str] = Field(description="标签列表")
+    confidence: Optional[float] = Field(None, description="置信度")
+    processing_time: Optional[float] = Field(None, description="处理时间（毫秒）")
+    created_at: Optional[str] = Field(None, description="创建时间")
+
+
+class TaskRecordPage(BaseModel):
+    """任务记录分页响应"""
+    task_id: int = Field(description="任务ID")
+    records: List[TaskRecordItem] = Field(description="本页记录，按记录ID升序")
+    next_cursor: Optional[int] = Field(None, description="下一页游标，没有更多记录时为空")
+    has_more: bool = Field(description="是否还有更多记录")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "task_id": 10,
+                "records": [
+                    {
+                        "id": 101,
+                        "comment_text": "动力很足",
+                        "tags": ["动力性能:正面"],
+                        "confidence": 0.0,
+                        "processing_time": 4500.0,
+                        "created_at": "2024-01-01T08:00:00"
+                    }
+                ],
+                "next_cursor": 101,
+                "has_more": True
+            }
+        }
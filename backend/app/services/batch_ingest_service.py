@@ -0,0 +1,294 @@
+"""
+批量文件流式导入服务
+上传文件边接收边写入磁盘，再按块解析评论列并陆续追加到批量任务队列
+"""
+import asyncio
+import itertools
+import logging
+import os
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import aiofiles
+from fastapi import UploadFile
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.job import BatchJob
+from app.models.task import TestTask
+from app.services.batch_queue import BatchJobQueue
+from app.services.batch_test_service import BatchTestService
+from app.utils.batch_readers import match_extension, open_reader
+
+logger = logging.getLogger(__name__)
+
+
+class BatchIngestService:
+    """
+    批量文件流式导入服务
+
+    - 上传文件按块写入UPLOAD_DIR，不在内存中保留完整文件
+    - 按扩展名选择读取器（CSV、JSONL、Excel、Parquet及其压缩文件），
+      只解析评论列，每次读取BATCH_INGEST_CHUNK_ROWS行
+    - 第一块评论随任务一起入队后即开始处理，其余块由后台协程逐块追加，
+      每块一个事务：写入输入项、累加total_count和已读取行数
+    - 应用重启后从已读取行数处继续导入，导入结束后删除暂存文件
+    """
+
+    # 上传文件读取块大小
+    SPOOL_CHUNK_SIZE = 1024 * 1024
+
+    # 进行中的后台导入协程，task_id -> Task
+    _active: Dict[int, asyncio.Task] = {}
+
+    @staticmethod
+    async def spool_upload(upload: UploadFile) -> str:
+        """
+        把上传文件写入暂存目录
+
+        Args:
+            upload: 上传文件
+
+        Returns:
+            暂存文件路径
+
+        Raises:
+            ValueError: 文件格式不支持或超过大小限制时抛出
+        """
+        # 暂存文件保留原扩展名，重启后据此选择读取器
+        extension = match_extension(upload.filename)
+
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}{extension}")
+
+        size = 0
+        try:
+            async with aiofiles.open(path, "wb") as f:
+                while True:
+                    chunk = await upload.read(BatchIngestService.SPOOL_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > settings.MAX_UPLOAD_SIZE:
+                        raise ValueError(
+                            f"文件大小超过限制（{settings.MAX_UPLOAD_SIZE / 1024 / 1024:.0f}MB）"
+                        )
+                    await f.write(chunk)
+        except BaseException:
+            BatchIngestService._remove_file(path)
+            raise
+
+        logger.info(f"上传文件已暂存，filename={upload.filename}, 大小={size}, path={path}")
+        return path
+
+    @staticmethod
+    async def start_ingest(db: AsyncSession, path: str) -> Dict[str, Any]:
+        """
+        读取暂存文件的第一块评论并创建批量任务，其余评论在后台继续导入
+
+        Args:
+            db: 异步数据库会话
+            path: 暂存文件路径
+
+        Returns:
+            任务信息字典（task_id, total_count, ingesting）
+
+        Raises:
+            ValueError: 文件格式错误或没有有效评论时抛出
+        """
+        try:
+            reader = await asyncio.to_thread(open_reader, path)
+            comment_col = await asyncio.to_thread(reader.open_comment_column)
+            chunks = reader.iter_comment_chunks(comment_col, settings.BATCH_INGEST_CHUNK_ROWS)
+
+            # 读到第一块有效评论为止，整个文件都没有有效评论时直接拒绝
+            comments: List[str] = []
+            rows = 0
+            ingesting = True
+            while not comments:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    ingesting = False
+                    break
+                rows += chunk[0]
+                comments = chunk[1]
+            if not comments:
+                raise ValueError("文件中没有有效的评论数据")
+
+            # 预读下一块，第一块已读完整个文件时不再启动后台导入
+            if ingesting:
+                lookahead = await asyncio.to_thread(next, chunks, None)
+                if lookahead is None:
+                    ingesting = False
+                else:
+                    chunks = itertools.chain([lookahead], chunks)
+
+            task_id = await BatchTestService.create_batch_task(
+                db,
+                comments,
+                ingest_status="ingesting" if ingesting else "complete",
+                source_path=path if ingesting else None,
+                ingested_rows=rows
+            )
+        except BaseException:
+            BatchIngestService._remove_file(path)
+            raise
+
+        if ingesting:
+            BatchIngestService._spawn(task_id, path, chunks)
+        else:
+            BatchIngestService._remove_file(path)
+
+        return {
+            "task_id": task_id,
+            "total_count": len(comments),
+            "ingesting": ingesting
+        }
+
+    @staticmethod
+    async def resume_pending() -> int:
+        """
+        继续导入上次未完成的文件（应用启动时调用）
+
+        Returns:
+            继续导入的任务数
+        """
+        from app.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            jobs = (await db.execute(
+                select(BatchJob.task_id, BatchJob.source_path, BatchJob.ingested_rows)
+                .where(BatchJob.ingest_status == "ingesting")
+            )).all()
+
+        resumed = 0
+        for task_id, path, ingested_rows in jobs:
+            if task_id in BatchIngestService._active:
+                continue
+            try:
+                if not path or not os.path.exists(path):
+                    raise ValueError("上传文件已丢失")
+                reader = await asyncio.to_thread(open_reader, path)
+                comment_col = await asyncio.to_thread(reader.open_comment_column)
+            except ValueError as e:
+                await BatchIngestService._finish(task_id, path, str(e))
+                continue
+
+            chunks = reader.iter_comment_chunks(
+                comment_col,
+                settings.BATCH_INGEST_CHUNK_ROWS,
+                skip_rows=ingested_rows
+            )
+            BatchIngestService._spawn(task_id, path, chunks)
+            resumed += 1
+            logger.info(f"继续导入批量文件，task_id={task_id}, 已读取行数={ingested_rows}")
+
+        return resumed
+
+    @staticmethod
+    async def stop():
+        """
+        停止后台导入（应用关闭时调用），已提交的块在重启后不会重复导入
+        """
+        tasks = list(BatchIngestService._active.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        BatchIngestService._active.clear()
+
+    @staticmethod
+    def _spawn(task_id: int, path: str, chunks: Iterator[Tuple[int, List[str]]]):
+        """启动后台导入协程"""
+        task = asyncio.ensure_future(BatchIngestService._ingest_rest(task_id, path, chunks))
+        BatchIngestService._active[task_id] = task
+        task.add_done_callback(lambda _: BatchIngestService._active.pop(task_id, None))
+
+    @staticmethod
+    async def _ingest_rest(task_id: int, path: str, chunks: Iterator[Tuple[int, List[str]]]):
+        """
+        逐块追加剩余评论
+
+        Args:
+            task_id: 任务ID
+            path: 暂存文件路径
+            chunks: 评论块迭代器
+        """
+        from app.database import AsyncSessionLocal
+
+        error: Optional[str] = None
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                rows, comments = chunk
+                async with AsyncSessionLocal() as db:
+                    # 输入顺序从已入队的评论数继续
+                    start_seq = await db.scalar(
+                        select(TestTask.total_count).where(TestTask.id == task_id)
+                    )
+                    if comments:
+                        await db.run_sync(BatchJobQueue.append_items, task_id, comments, start_seq)
+                        await db.execute(
+                            update(TestTask)
+                            .where(TestTask.id == task_id)
+                            .values(total_count=TestTask.total_count + len(comments))
+                        )
+                    await db.execute(
+                        update(BatchJob)
+                        .where(BatchJob.task_id == task_id)
+                        .values(ingested_rows=BatchJob.ingested_rows + rows)
+                    )
+                    await db.commit()
+                logger.debug(f"追加{len(comments)}条评论，task_id={task_id}")
+        except ValueError as e:
+            error = str(e)
+        except asyncio.CancelledError:
+            logger.warning(f"批量文件导入中断，task_id={task_id}")
+            raise
+        except Exception as e:
+            logger.error(f"批量文件导入失败，task_id={task_id}, error={str(e)}", exc_info=True)
+            error = f"文件导入失败: {str(e)}"
+
+        await BatchIngestService._finish(task_id, path, error)
+
+    @staticmethod
+    async def _finish(task_id: int, path: Optional[str], error: Optional[str]):
+        """
+        记录导入结果并删除暂存文件
+
+        Args:
+            task_id: 任务ID
+            path: 暂存文件路径
+            error: 失败原因，None表示导入完成
+        """
+        from app.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(BatchJob)
+                .where(BatchJob.task_id == task_id)
+                .values(
+                    ingest_status="failed" if error else "complete",
+                    ingest_error=error,
+                    source_path=None
+                )
+            )
+            await db.commit()
+
+        if path:
+            BatchIngestService._remove_file(path)
+
+        if error:
+            logger.error(f"批量文件导入失败，task_id={task_id}, error={error}")
+        else:
+            logger.info(f"批量文件导入完成，task_id={task_id}")
+
+    @staticmethod
+    def _remove_file(path: str):
+        """删除暂存文件"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除暂存文件失败: {path}, error={str(e)}")
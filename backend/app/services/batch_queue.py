@@ -0,0 +1,364 @@
+"""
+持久化批量任务队列
+任务输入和每条评论的处理状态保存在数据库中，worker通过租约领取任务，
+进程重启后从第一个未完成的输入项继续处理
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.job import BatchJob, BatchJobItem
+from app.models.task import TestTask
+
+logger = logging.getLogger(__name__)
+
+
+class BatchJobQueue:
+    """批量任务队列"""
+
+    # 批量插入输入项的分块大小
+    INSERT_CHUNK_SIZE = 1000
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        lease_seconds: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ):
+        """
+        初始化队列
+
+        Args:
+            workers: 同时处理的任务数，默认读取配置BATCH_QUEUE_WORKERS
+            lease_seconds: 租约时长（秒），默认读取配置BATCH_QUEUE_LEASE_SECONDS
+            poll_interval: 空闲时轮询间隔（秒），默认读取配置BATCH_QUEUE_POLL_INTERVAL
+        """
+        self.workers = max(1, workers or settings.BATCH_QUEUE_WORKERS)
+        self.lease_seconds = lease_seconds or settings.BATCH_QUEUE_LEASE_SECONDS
+        self.poll_interval = poll_interval or settings.BATCH_QUEUE_POLL_INTERVAL
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    @staticmethod
+    def enqueue(
+        db: Session,
+        task_id: int,
+        comments: List[str],
+        ingest_status: str = "complete",
+        source_path: Optional[str] = None,
+        ingested_rows: int = 0
+    ):
+        """
+        登记任务及其输入项（不提交事务）
+
+        异步会话通过AsyncSession.run_sync调用。
+
+        Args:
+            db: 数据库会话
+            task_id: 任务ID
+            comments: 评论列表
+            ingest_status: 导入状态，流式导入时为"ingesting"，后续输入项通过append_items追加
+            source_path: 流式导入中的上传文件路径
+            ingested_rows: 已读取的文件数据行数
+        """
+        db.add(BatchJob(
+            task_id=task_id,
+            status="queued",
+            ingest_status=ingest_status,
+            source_path=source_path,
+            ingested_rows=ingested_rows
+        ))
+        BatchJobQueue.append_items(db, task_id, comments, start_seq=0)
+
+    @staticmethod
+    def append_items(db: Session, task_id: int, comments: List[str], start_seq: int):
+        """
+        追加输入项（不提交事务）
+
+        Args:
+            db: 数据库会话
+            task_id: 任务ID
+            comments: 评论列表
+            start_seq: 第一条评论的输入顺序
+        """
+        for start in range(0, len(comments), BatchJobQueue.INSERT_CHUNK_SIZE):
+            chunk = comments[start:start + BatchJobQueue.INSERT_CHUNK_SIZE]
+            db.execute(
+                insert(BatchJobItem),
+                [
+                    {"task_id": task_id, "seq": start_seq + start + offset, "comment_text": comment}
+                    for offset, comment in enumerate(chunk)
+                ]
+            )
+
+    @staticmethod
+    async def get_ingest_status(db: AsyncSession, task_id: int) -> Tuple[str, Optional[str]]:
+        """
+        获取任务的导入状态
+
+        Args:
+            db: 异步数据库会话
+            task_id: 任务ID
+
+        Returns:
+            (导入状态, 失败原因)
+        """
+        row = (await db.execute(
+            select(BatchJob.ingest_status, BatchJob.ingest_error).where(BatchJob.task_id == task_id)
+        )).first()
+        return (row.ingest_status, row.ingest_error) if row else ("complete", None)
+
+    @staticmethod
+    async def iter_pending_items(
+        db: AsyncSession,
+        task_id: int,
+        after_seq: int = -1,
+        page_size: int = 500
+    ) -> AsyncIterator[Tuple[int, int, str]]:
+        """
+        按输入顺序分页遍历未完成的输入项
+
+        Args:
+            db: 异步数据库会话
+            task_id: 任务ID
+            after_seq: 从该输入顺序之后开始
+            page_size: 每页条数
+
+        Yields:
+            (item_id, seq, comment_text)
+        """
+        last_seq = after_seq
+        while True:
+            rows = (await db.execute(
+                select(BatchJobItem.id, BatchJobItem.seq, BatchJobItem.comment_text)
+                .where(
+                    BatchJobItem.task_id == task_id,
+                    BatchJobItem.status == "pending",
+                    BatchJobItem.seq > last_seq
+                )
+                .order_by(BatchJobItem.seq)
+                .limit(page_size)
+            )).all()
+            if not rows:
+                return
+            for row in rows:
+                yield row.id, row.seq, row.comment_text
+            last_seq = rows[-1].seq
+
+    @staticmethod
+    async def count_done_items(db: AsyncSession, task_id: int) -> int:
+        """
+        统计已完成的输入项数量
+
+        Args:
+            db: 异步数据库会话
+            task_id: 任务ID
+
+        Returns:
+            已完成数量
+        """
+        return await db.scalar(
+            select(func.count(BatchJobItem.id))
+            .where(BatchJobItem.task_id == task_id, BatchJobItem.status == "done")
+        )
+
+    def notify(self):
+        """
+        通知worker有新任务入队
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """
+        启动worker
+        """
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.ensure_future(self._run_worker(index))
+            for index in range(self.workers)
+        ]
+        logger.info(f"批量任务队列已启动，worker={self.worker_id}, 并行任务数={self.workers}")
+
+    async def stop(self):
+        """
+        停止worker，进行中的任务释放租约，重启后继续处理
+        """
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("批量任务队列已停止")
+
+    async def recover_stale_leases(self) -> int:
+        """
+        回收租约已过期的运行中任务（启动时调用）
+
+        Returns:
+            回收的任务数
+        """
+        async with AsyncSessionLocal() as db:
+            recovered = (await db.execute(
+                update(BatchJob)
+                .where(
+                    BatchJob.status == "running",
+                    or_(BatchJob.lease_expires_at.is_(None), BatchJob.lease_expires_at < datetime.now())
+                )
+                .values(status="queued", lease_owner=None, lease_expires_at=None)
+            )).rowcount
+            await db.commit()
+            if recovered:
+                logger.warning(f"回收{recovered}个租约过期的批量任务")
+            return recovered
+
+    def _claimable(self, now: datetime):
+        """可领取条件：排队中，或运行中但租约已过期"""
+        return or_(
+            BatchJob.status == "queued",
+            and_(BatchJob.status == "running", BatchJob.lease_expires_at < now)
+        )
+
+    async def _claim_next(self, db: AsyncSession) -> Optional[int]:
+        """
+        领取下一个任务
+
+        Returns:
+            任务ID，没有可领取的任务时返回None
+        """
+        now = datetime.now()
+        candidate = (await db.execute(
+            select(BatchJob.id, BatchJob.task_id)
+            .where(self._claimable(now))
+            .order_by(BatchJob.id)
+            .limit(1)
+        )).first()
+        if candidate is None:
+            return None
+
+        # 条件更新保证同一任务只被一个worker领取
+        claimed = (await db.execute(
+            update(BatchJob)
+            .where(BatchJob.id == candidate.id, self._claimable(now))
+            .values(
+                status="running",
+                lease_owner=self.worker_id,
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                attempts=BatchJob.attempts + 1
+            )
+        )).rowcount
+        await db.commit()
+        return candidate.task_id if claimed else None
+
+    async def _renew_lease(self, task_id: int) -> bool:
+        """续约，返回是否仍持有租约"""
+        async with AsyncSessionLocal() as db:
+            renewed = (await db.execute(
+                update(BatchJob)
+                .where(BatchJob.task_id == task_id, BatchJob.lease_owner == self.worker_id)
+                .values(lease_expires_at=datetime.now() + timedelta(seconds=self.lease_seconds))
+            )).rowcount
+            await db.commit()
+            return renewed == 1
+
+    async def _finish(self, db: AsyncSession, task_id: int, status: Optional[str]):
+        """
+        结束任务并释放租约
+
+        Args:
+            db: 异步数据库会话
+            task_id: 任务ID
+            status: 最终状态，None表示放回队列
+        """
+        await db.execute(
+            update(BatchJob)
+            .where(BatchJob.task_id == task_id, BatchJob.lease_owner == self.worker_id)
+            .values(status=status or "queued", lease_owner=None, lease_expires_at=None)
+        )
+        await db.commit()
+
+    async def _run_worker(self, index: int):
+        """worker主循环"""
+        while not self._stopping:
+            try:
+                async with AsyncSessionLocal() as db:
+                    task_id = await self._claim_next(db)
+            except Exception as e:
+                logger.error(f"领取批量任务失败: {str(e)}", exc_info=True)
+                task_id = None
+
+            if task_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            logger.info(f"worker#{index}领取批量任务，task_id={task_id}")
+            await self._process_job(task_id)
+
+    async def _process_job(self, task_id: int):
+        """处理一个已领取的任务，期间定期续约"""
+        from app.services.batch_test_service import BatchTestService
+
+        db = AsyncSessionLocal()
+        lease_lost = asyncio.Event()
+        job = asyncio.ensure_future(
+            BatchTestService.process_batch_task(db, task_id, lease_lost=lease_lost)
+        )
+        heartbeat = asyncio.ensure_future(self._heartbeat(task_id, job, lease_lost))
+        try:
+            await asyncio.shield(job)
+            task_status = await db.scalar(select(TestTask.status).where(TestTask.id == task_id))
+            final_status = "completed" if task_status == "completed" else "failed"
+            await self._finish(db, task_id, final_status)
+
+        except asyncio.CancelledError:
+            if self._stopping:
+                # 应用关闭：等待任务写入缓冲后放回队列
+                job.cancel()
+                await asyncio.gather(job, return_exceptions=True)
+                await db.rollback()
+                await self._finish(db, task_id, None)
+                logger.info(f"批量任务已放回队列，重启后继续，task_id={task_id}")
+                raise
+            logger.warning(f"批量任务租约丢失，停止处理，task_id={task_id}")
+
+        except Exception as e:
+            logger.error(f"批量任务执行异常，task_id={task_id}, error={str(e)}", exc_info=True)
+            await db.rollback()
+            await self._finish(db, task_id, "failed")
+
+        finally:
+            heartbeat.cancel()
+            await db.close()
+
+    async def _heartbeat(self, task_id: int, job: asyncio.Future, lease_lost: asyncio.Event):
+        """定期续约，租约被其他worker接管时标记租约丢失并取消本地处理"""
+        while not job.done():
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self._renew_lease(task_id):
+                    lease_lost.set()
+                    job.cancel()
+                    return
+            except Exception as e:
+                logger.error(f"批量任务续约失败，task_id={task_id}, error={str(e)}")
+
+
+# 创建全局实例
+batch_queue = BatchJobQueue()
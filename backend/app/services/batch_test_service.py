@@ -4,12 +4,15 @@
 import asyncio
 import json
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
-from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Tuple, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
 from app.models.task import TestTask
-from app.models.record import TestRecord
-from app.services.dify_client import dify_client, DifyClientError
-from app.utils.csv_parser import CSVParser
+from app.services.batch_queue import BatchJobQueue
+from app.services.record_writer import BufferedRecordWriter
+from app.services.dify_client import dify_client, DifyClientError, DifyCircuitOpenError
+from app.utils.dedup import CommentDeduplicator
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,15 +23,23 @@ class BatchTestService:
 
     @staticmethod
     async def create_batch_task(
-        db: Session,
-        comments: List[str]
+        db: AsyncSession,
+        comments: List[str],
+        ingest_status: str = "complete",
+        source_path: Optional[str] = None,
+        ingested_rows: int = 0
     ) -> int:
         """
-        创建批量测试任务
+        创建批量测试任务，任务及全部输入项写入持久化队列
+
+        流式导入时comments只是文件的第一部分，其余评论由导入服务陆续追加。
 
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             comments: 评论列表
+            ingest_status: 导入状态，"ingesting"表示还有评论待追加
+            source_path: 流式导入中的上传文件路径
+            ingested_rows: 已读取的文件数据行数
 
         Returns:
             任务ID
@@ -41,7 +52,18 @@ class BatchTestService:
             processed_count=0
         )
         db.add(task)
-        db.commit()
+        await db.flush()  # 获取task_id
+
+        # 输入项与任务在同一事务中入队
+        await db.run_sync(
+            BatchJobQueue.enqueue,
+            task.id,
+            comments,
+            ingest_status,
+            source_path,
+            ingested_rows
+        )
+        await db.commit()
 
         logger.info(f"批量任务创建成功，task_id={task.id}, 总数={len(comments)}")
 
@@ -49,101 +71,255 @@ class BatchTestService:
 
     @staticmethod
     async def process_batch_task(
-        db: Session,
+        db: AsyncSession,
         task_id: int,
-        comments: List[str]
+        concurrency: Optional[int] = None,
+        lease_lost: Optional[asyncio.Event] = None
     ):
         """
-        处理批量任务（后台任务）
+        处理批量任务（由队列worker调用）
+
+        从持久化队列中按输入顺序读取未完成的评论，以固定数量的worker并发调用Dify，
+        结果按输入顺序经写缓冲批量落库，并在同一事务中将输入项标记为已完成。
+        中断后再次调用会从第一个未完成的输入项继续。
+
+        启用去重时，完全相同或近似重复的评论归入同一簇，每簇只由代表评论调用一次Dify，
+        结果复用到簇内每条评论的记录。去重索引只在本次处理中有效，中断继续后重新建立。
 
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             task_id: 任务ID
-            comments: 评论列表
+            concurrency: 并发数，默认读取配置BATCH_CONCURRENCY
+            lease_lost: 租约丢失时由队列设置，此后被取消不再写入缓冲中的记录
         """
-        task = db.query(TestTask).filter(TestTask.id == task_id).first()
+        task = await db.get(TestTask, task_id)
         if not task:
             logger.error(f"任务不存在: {task_id}")
             return
 
+        concurrency = max(1, concurrency or settings.BATCH_CONCURRENCY)
+        total = task.total_count
+
+        # 记录先写入缓冲，按条数/时间批量落库并合并进度更新
+        writer = BufferedRecordWriter(db, task_id)
+
         try:
-            # 更新任务状态为处理中
+            # 更新任务状态为处理中，进度以已完成的输入项为准
             task.status = "processing"
-            db.commit()
+            task.processed_count = await BatchJobQueue.count_done_items(db, task_id)
+            await db.commit()
 
-            logger.info(f"开始处理批量任务，task_id={task_id}, 评论数={len(comments)}")
+            logger.info(
+                f"开始处理批量任务，task_id={task_id}, 评论数={total}, "
+                f"已完成={task.processed_count}, 并发数={concurrency}"
+            )
 
-            # 处理每条评论
-            for idx, comment in enumerate(comments):
-                try:
-                    logger.info(f"处理第{idx + 1}/{len(comments)}条评论，task_id={task_id}")
+            writer.start()
 
-                    # 调用Dify API
-                    dify_result = await dify_client.get_comment_tags(comment)
+            # 已完成但尚未写入缓冲的结果，按读取顺序存放
+            results: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+            # 重复评论归入同一簇，簇ID -> 代表评论的打标任务
+            dedup = None
+            if settings.BATCH_DEDUP_ENABLED:
+                dedup = CommentDeduplicator(
+                    max_distance=settings.BATCH_DEDUP_SIMHASH_DISTANCE,
+                    min_length=settings.BATCH_DEDUP_MIN_LENGTH,
+                    max_clusters=settings.BATCH_DEDUP_MAX_CLUSTERS
+                )
+            clusters: Dict[int, asyncio.Task] = {}
+            # 流式导入的任务边导入边处理，读完已有输入项后等待新的输入项
+            pending = None
+            last_seq = -1
+            ingest_done = False
+            next_to_read = 0
+            next_to_save = 0
+
+            async def next_item():
+                """读取下一个输入项，与写缓冲共用会话锁"""
+                nonlocal pending, last_seq, ingest_done, next_to_read
+                while True:
+                    async with writer.lock:
+                        if pending is None:
+                            # 先确认导入状态再读取：导入已结束时本轮读完即为全部输入项
+                            ingest_status, ingest_error = await BatchJobQueue.get_ingest_status(db, task_id)
+                            if ingest_status == "failed":
+                                raise ValueError(f"文件读取失败: {ingest_error}")
+                            ingest_done = ingest_status == "complete"
+                            pending = BatchJobQueue.iter_pending_items(db, task_id, after_seq=last_seq)
+                        try:
+                            item_id, seq, comment = await pending.__anext__()
+                        except StopAsyncIteration:
+                            pending = None
+                            if ingest_done:
+                                return None
+                        else:
+                            last_seq = seq
+                            position = next_to_read
+                            next_to_read += 1
+                            return position, (item_id, seq, comment)
+                    await asyncio.sleep(settings.BATCH_INGEST_POLL_INTERVAL)
 
-                    # 保存结果
-                    record = TestRecord(
-                        task_id=task.id,
-                        comment_text=comment,
-                        tags_json=json.dumps(dify_result['tags'], ensure_ascii=False),
-                        confidence=dify_result.get('confidence', 0.0),
-                        processing_time=dify_result.get('processing_time', 0.0)
-                    )
-                    db.add(record)
-
-                    # 更新进度
-                    task.processed_count += 1
-                    db.commit()
-
-                    logger.info(f"第{idx + 1}条评论处理成功，task_id={task_id}")
-
-                except DifyClientError as e:
-                    logger.error(f"第{idx + 1}条评论处理失败: {str(e)}")
-                    # 保存失败记录
-                    record = TestRecord(
-                        task_id=task.id,
-                        comment_text=comment,
-                        tags_json=json.dumps(['处理失败'], ensure_ascii=False),
-                        confidence=0.0,
-                        processing_time=0.0
-                    )
-                    db.add(record)
-                    task.processed_count += 1
-                    db.commit()
+            async def worker():
+                nonlocal next_to_save
+                while True:
+                    claimed = await next_item()
+                    if claimed is None:
+                        return
+                    position, (item_id, seq, comment) = claimed
+                    cluster = dedup.assign(comment) if dedup is not None else None
+                    if cluster is None:
+                        row = await BatchTestService._tag_comment(task_id, seq, total, comment)
+                    else:
+                        # 簇内第一条评论调用Dify，其余评论等待并复用其结果；
+                        # 复用的结果没有调用耗时，processing_time记为None，不计入延迟统计
+                        tagging = clusters.get(cluster)
+                        if tagging is None:
+                            tagging = asyncio.ensure_future(
+                                BatchTestService._tag_comment(task_id, seq, total, comment)
+                            )
+                            clusters[cluster] = tagging
+                            row = await asyncio.shield(tagging)
+                        else:
+                            row = {
+                                **await asyncio.shield(tagging),
+                                "comment_text": comment,
+                                "processing_time": None
+                            }
+                    results[position] = (item_id, row)
+
+                    # 只写入已完成的连续前缀，保证记录顺序与输入一致
+                    while next_to_save in results:
+                        item_id, row = results.pop(next_to_save)
+                        next_to_save += 1
+                        await writer.add(row, item_id=item_id)
+
+            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for w in workers:
+                    w.cancel()
+                for tagging in clusters.values():
+                    tagging.cancel()
+                raise
+
+            if dedup is not None:
+                logger.info(f"批量任务去重统计，task_id={task_id}, {dedup.stats()}")
+
+            # 写入剩余记录
+            await writer.close()
 
             # 更新任务状态为完成
             task.status = "completed"
             task.completed_at = datetime.now()
-            db.commit()
+            await db.commit()
 
             logger.info(f"批量任务处理完成，task_id={task_id}")
 
+        except asyncio.CancelledError:
+            await db.rollback()
+            if lease_lost is not None and lease_lost.is_set():
+                # 租约已被其他worker接管，对方会从第一个未完成的输入项重新处理，缓冲中的记录直接丢弃
+                writer.discard()
+                logger.warning(f"批量任务租约丢失，丢弃未写入的记录，task_id={task_id}")
+            else:
+                # 应用关闭：保存已完成的结果，剩余输入项留待继续
+                await writer.close()
+                logger.warning(f"批量任务处理中断，task_id={task_id}")
+            raise
+
         except Exception as e:
             logger.error(f"批量任务处理失败，task_id={task_id}, error={str(e)}")
 
+            await db.rollback()
+
+            # 已完成的结果仍然落库
+            try:
+                await writer.close()
+            except Exception as flush_error:
+                logger.error(f"写入剩余记录失败，task_id={task_id}, error={str(flush_error)}")
+                await db.rollback()
+
             # 更新任务状态为失败
+            await db.refresh(task)
             task.status = "failed"
             task.error_message = str(e)
-            db.commit()
+            await db.commit()
+
+    @staticmethod
+    async def _tag_comment(
+        task_id: int,
+        idx: int,
+        total: int,
+        comment: str
+    ) -> Dict[str, Any]:
+        """
+        调用Dify处理单条评论，返回待保存的记录字段
+
+        Args:
+            task_id: 任务ID
+            idx: 评论下标
+            total: 评论总数
+            comment: 评论内容
+
+        Returns:
+            TestRecord字段字典，调用失败时标记为"处理失败"
+        """
+        try:
+            logger.info(f"处理第{idx + 1}/{total}条评论，task_id={task_id}")
+
+            # 调用Dify API，熔断期间暂停等待而不是逐条耗尽超时
+            waited = 0.0
+            while True:
+                try:
+                    dify_result = await dify_client.get_comment_tags(comment)
+                    break
+                except DifyCircuitOpenError as e:
+                    if waited >= settings.BATCH_CIRCUIT_MAX_WAIT:
+                        raise
+                    pause = max(e.retry_after, 1.0)
+                    logger.warning(f"Dify熔断中，第{idx + 1}条评论暂停{pause:.0f}秒，task_id={task_id}")
+                    await asyncio.sleep(pause)
+                    waited += pause
+
+            logger.info(f"第{idx + 1}条评论处理成功，task_id={task_id}")
+
+            return {
+                "comment_text": comment,
+                "tags_json": json.dumps(dify_result['tags'], ensure_ascii=False),
+                "confidence": dify_result.get('confidence', 0.0),
+                "processing_time": dify_result.get('processing_time', 0.0)
+            }
+
+        except DifyClientError as e:
+            logger.error(f"第{idx + 1}条评论处理失败: {str(e)}")
+            # 保存失败记录
+            return {
+                "comment_text": comment,
+                "tags_json": json.dumps(['处理失败'], ensure_ascii=False),
+                "confidence": 0.0,
+                "processing_time": 0.0
+            }
 
     @staticmethod
-    def get_batch_progress(
-        db: Session,
+    async def get_batch_progress(
+        db: AsyncSession,
         task_id: int
     ) -> Dict[str, Any]:
         """
         获取批量任务进度
 
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             task_id: 任务ID
 
         Returns:
             进度信息字典
         """
-        task = db.query(TestTask).filter(TestTask.id == task_id).first()
+        task = await db.scalar(select(TestTask).where(TestTask.id == task_id))
         if not task:
             raise ValueError(f"任务不存在: {task_id}")
+        ingest_status, _ = await BatchJobQueue.get_ingest_status(db, task_id)
 
         # 计算进度
         progress = 0.0
@@ -156,19 +332,6 @@ class BatchTestService:
             "total_count": task.total_count,
             "processed_count": task.processed_count,
             "progress": round(progress, 2),
+            "ingesting": ingest_status == "ingesting",
             "error_message": task.error_message
         }
-
-    @staticmethod
-    def parse_csv_file(file_content: bytes, filename: str) -> Tuple[List[str], Dict]:
-        """
-        解析CSV文件
-
-        Args:
-            file_content: 文件内容
-            filename: 文件名
-
-        Returns:
-            (评论列表, 文件信息)
-        """
-        return CSVParser.parse_csv_file(file_content, filename)
@@ -2,11 +2,21 @@
 Dify API客户端
 用于调用Dify工作流API
 """
+import asyncio
+import hashlib
 import httpx
 import json
 import logging
-from typing import Dict, Any, List, Optional
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Any, List, Optional
 from app.config import settings
+from app.services.tag_cache import TagCache, tag_cache
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.rate_limiter import TokenBucket
+from app.utils.singleflight import SingleFlight
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -21,27 +31,126 @@ class DifyClientError(Exception):
         super().__init__(self.message)
 
 
+class DifyCircuitOpenError(DifyClientError):
+    """Dify熔断器打开，请求被快速拒绝"""
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Dify服务暂不可用（熔断中），请{retry_after:.0f}秒后重试", status_code=503)
+
+
+# 进程内共享的Dify调用限流器
+dify_rate_limiter = TokenBucket(
+    rate=settings.DIFY_RATE_LIMIT,
+    capacity=settings.DIFY_RATE_BURST
+)
+
+# 进程内共享的Dify熔断器
+dify_circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.DIFY_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=settings.DIFY_CIRCUIT_RECOVERY_TIMEOUT,
+    half_open_max_calls=settings.DIFY_CIRCUIT_HALF_OPEN_MAX_CALLS,
+    name="Dify"
+)
+
+
 class DifyClient:
     """
     Dify API客户端类
     用于调用Dify Cloud API的工作流
     """
 
-    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+    # 可重试的HTTP状态码
+    RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        cache: Optional[TagCache] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None
+    ):
         """
         初始化Dify客户端
 
         Args:
             api_key: Dify API密钥，默认从配置读取
             base_url: Dify API基础URL，默认从配置读取
+            cache: 标签结果缓存，默认使用全局缓存
+            rate_limiter: 限流器，默认使用进程内共享的限流器
+            circuit_breaker: 熔断器，默认使用进程内共享的熔断器
         """
         self.api_key = api_key or settings.DIFY_API_KEY
         self.base_url = base_url or settings.DIFY_BASE_URL
-        self.timeout = 30.0  # 默认超时30秒
-        self.max_retries = 3  # 最大重试次数
+        self.cache = cache or tag_cache
+        self.rate_limiter = rate_limiter or dify_rate_limiter
+        self.circuit_breaker = circuit_breaker or dify_circuit_breaker
+
+        # 工作流标识，作为缓存键的命名空间（不直接保存API Key明文）
+        self.workflow_identity = hashlib.sha256(
+            f"{self.base_url}\0{self.api_key}".encode("utf-8")
+        ).hexdigest()[:16]
+
+        # 相同评论的并发请求合并为一次工作流调用
+        self._inflight = SingleFlight()
+        self.timeout = settings.DIFY_TIMEOUT  # 默认超时30秒
+        self.max_retries = settings.DIFY_MAX_RETRIES  # 最大重试次数
+
+        # 长连接池，由应用startup/shutdown钩子负责打开和关闭
+        self._client: Optional[httpx.AsyncClient] = None
 
         logger.info(f"Dify客户端初始化: base_url={self.base_url}")
 
+    async def start(self):
+        """
+        打开共享的HTTP连接池
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_http_client()
+            logger.info("Dify HTTP连接池已打开")
+
+    async def close(self):
+        """
+        关闭共享的HTTP连接池
+        """
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Dify HTTP连接池已关闭")
+        self._client = None
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        获取共享的HTTP客户端，未启动时（如脚本中直接调用）按需创建
+
+        Returns:
+            httpx.AsyncClient实例
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_http_client()
+        return self._client
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        """
+        按配置创建带连接池和keep-alive的HTTP客户端
+
+        Returns:
+            httpx.AsyncClient实例
+        """
+        http2 = settings.DIFY_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("未安装h2依赖，已回退到HTTP/1.1，如需HTTP/2请安装httpx[http2]")
+                http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.DIFY_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.DIFY_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.DIFY_KEEPALIVE_EXPIRY
+        )
+        return httpx.AsyncClient(timeout=self.timeout, limits=limits, http2=http2)
+
     async def get_comment_tags(
         self,
         comment: str,
@@ -60,14 +169,93 @@ class DifyClient:
                 "tags": List[str],           # 提取的标签列表
                 "confidence": float,          # 置信度（如果Dify返回）
                 "raw_response": Dict,        # Dify原始响应
-                "processing_time": float     # 处理时间（毫秒）
+                "processing_time": float,    # 处理时间（毫秒），缓存命中时为None
+                "cached": bool               # 是否命中缓存（仅命中时存在）
             }
 
         Raises:
             DifyClientError: API调用失败时抛出
         """
-        import time
+        start_time = time.time()
+
+        # 优先查询缓存
+        cache_key = self.cache.make_key(comment, self.workflow_identity)
+        cached = await self.cache.get(cache_key)
+        # 缓存命中不代表Dify延迟，耗时记为None并标记cached，不计入延迟统计
+        if cached is not None:
+            lookup_time = (time.time() - start_time) * 1000
+            logger.info(f"标签缓存命中，耗时: {lookup_time:.2f}ms")
+            return {**cached, "processing_time": None, "cached": True}
+
+        # 同一用户相同归一化评论的并发调用共享同一次请求的结果或异常；
+        # user会传给Dify工作流，不同用户的请求不合并
+        result = await self._inflight.do(
+            f"{cache_key}\0{user}",
+            lambda: self._fetch_and_cache(comment, user, cache_key)
+        )
+        return dict(result)
+
+    async def _fetch_and_cache(
+        self,
+        comment: str,
+        user: str,
+        cache_key: str
+    ) -> Dict[str, Any]:
+        """
+        请求Dify并写入缓存
+
+        Args:
+            comment: 用户评论文本
+            user: 用户标识
+            cache_key: 缓存键
+
+        Returns:
+            解析后的结果字典
+        """
+        result = await self._request_comment_tags(comment, user)
+
+        # 只缓存成功解析的结果
+        await self.cache.set(cache_key, {
+            "tags": result["tags"],
+            "confidence": result["confidence"],
+            "raw_response": result["raw_response"]
+        })
+
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取客户端运行统计（缓存命中、请求合并、限流、熔断）
+
+        Returns:
+            统计字典
+        """
+        return {
+            "tag_cache": self.cache.stats(),
+            "inflight": self._inflight.stats(),
+            "rate_limiter": self.rate_limiter.stats(),
+            "circuit_breaker": self.circuit_breaker.stats()
+        }
+
+    async def _request_comment_tags(
+        self,
+        comment: str,
+        user: str
+    ) -> Dict[str, Any]:
+        """
+        请求Dify工作流（带重试），不经过缓存
+
+        Args:
+            comment: 用户评论文本
+            user: 用户标识
 
+        Returns:
+            解析后的结果字典
+
+        Raises:
+            DifyCircuitOpenError: 熔断器打开时抛出
+            DifyClientError: API调用失败时抛出
+        """
         url = f"{self.base_url}/workflows/run"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -84,55 +272,286 @@ class DifyClient:
 
         # 记录开始时间
         start_time = time.time()
+        last_error: Optional[DifyClientError] = None
 
         # 带重试的API调用
         for attempt in range(self.max_retries):
+            retry_after = None
+
+            # 熔断期间快速失败，不再等待超时
+            if not self.circuit_breaker.allow_request():
+                raise DifyCircuitOpenError(self.circuit_breaker.retry_after())
+
+            # 所有单条和批量调用共享同一个限流器
+            await self.rate_limiter.acquire()
+
             try:
                 logger.info(f"调用Dify API (尝试 {attempt + 1}/{self.max_retries})")
                 logger.debug(f"URL: {url}")
                 logger.debug(f"Payload: {json.dumps(payload, ensure_ascii=False)}")
 
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        url,
-                        json=payload,
-                        headers=headers
-                    )
+                client = self._get_http_client()
+                response = await client.post(
+                    url,
+                    json=payload,
+                    headers=headers
+                )
 
-                    # 计算处理时间
-                    processing_time = (time.time() - start_time) * 1000
+            except httpx.TimeoutException as e:
+                logger.warning(f"请求超时 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
+                last_error = DifyClientError(f"Dify API请求超时: {str(e)}")
+                self.circuit_breaker.record_failure()
 
-                    # 检查HTTP状态码
-                    if response.status_code != 200:
-                        error_msg = f"Dify API返回错误状态码: {response.status_code}"
-                        logger.error(f"{error_msg}, 响应: {response.text}")
-                        raise DifyClientError(
-                            error_msg,
-                            status_code=response.status_code
-                        )
+            except httpx.HTTPError as e:
+                logger.warning(f"HTTP错误 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
+                last_error = DifyClientError(f"Dify API调用失败: {str(e)}")
+                self.circuit_breaker.record_failure()
+
+            else:
+                # 计算处理时间
+                processing_time = (time.time() - start_time) * 1000
+
+                # 只有5xx视为上游故障；429和其他4xx说明服务可用
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
 
+                if response.status_code == 200:
                     # 解析响应
-                    result = response.json()
+                    try:
+                        result = response.json()
+                    except json.JSONDecodeError as e:
+                        logger.error(f"JSON解析失败: {str(e)}")
+                        logger.error(f"响应内容: {response.text}")
+                        raise DifyClientError(f"Dify API响应格式错误: {str(e)}")
+
                     logger.info(f"Dify API调用成功，耗时: {processing_time:.2f}ms")
                     logger.debug(f"响应: {json.dumps(result, ensure_ascii=False)}")
 
                     # 解析并返回结果
                     return self._parse_dify_response(result, processing_time)
 
-            except httpx.TimeoutException as e:
-                logger.warning(f"请求超时 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
-                if attempt == self.max_retries - 1:
-                    raise DifyClientError(f"Dify API请求超时: {str(e)}")
+                # 检查HTTP状态码
+                error_msg = f"Dify API返回错误状态码: {response.status_code}"
+                logger.error(f"{error_msg}, 响应: {response.text}")
+                last_error = DifyClientError(
+                    error_msg,
+                    status_code=response.status_code
+                )
+
+                # 客户端错误（如鉴权失败、参数错误）重试无意义
+                if response.status_code not in self.RETRYABLE_STATUS_CODES:
+                    raise last_error
+
+                if response.status_code in (429, 503):
+                    retry_after = self._parse_retry_after(response)
+                    if retry_after is not None and retry_after > settings.DIFY_RETRY_MAX_DELAY:
+                        logger.error(f"Retry-After={retry_after:.0f}秒超过最大等待时间，放弃重试")
+                        raise last_error
+                    if response.status_code == 429:
+                        # 上游限流时暂停共享限流器，避免其他调用方继续撞墙
+                        self.rate_limiter.pause(retry_after or self._backoff_delay(attempt))
+
+            if attempt < self.max_retries - 1:
+                delay = retry_after if retry_after is not None else self._backoff_delay(attempt)
+                logger.warning(f"{delay:.2f}秒后重试")
+                await asyncio.sleep(delay)
+
+        raise last_error
+
+    async def stream_comment_tags(
+        self,
+        comment: str,
+        user: str = "test_system_user"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        以流式模式调用Dify工作流，逐个产出事件
 
-            except httpx.HTTPError as e:
-                logger.warning(f"HTTP错误 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
-                if attempt == self.max_retries - 1:
-                    raise DifyClientError(f"Dify API调用失败: {str(e)}")
+        上游的workflow_started、node_started、node_finished、text_chunk等事件原样转发；
+        最后产出{"event": "result", "result": ...}，result与get_comment_tags返回格式一致。
+        缓存命中时只产出result事件。流式请求无法中途重试，只做单次尝试。
+
+        Args:
+            comment: 用户评论文本
+            user: 用户标识，默认为"test_system_user"
+
+        Yields:
+            事件字典
+
+        Raises:
+            DifyCircuitOpenError: 熔断器打开时抛出
+            DifyClientError: API调用失败时抛出
+        """
+        start_time = time.time()
+
+        cache_key = self.cache.make_key(comment, self.workflow_identity)
+        cached = await self.cache.get(cache_key)
+        # 缓存命中不代表Dify延迟，耗时记为None并标记cached，不计入延迟统计
+        if cached is not None:
+            lookup_time = (time.time() - start_time) * 1000
+            logger.info(f"标签缓存命中，耗时: {lookup_time:.2f}ms")
+            yield {
+                "event": "result",
+                "result": {**cached, "processing_time": None, "cached": True}
+            }
+            return
+
+        if not self.circuit_breaker.allow_request():
+            raise DifyCircuitOpenError(self.circuit_breaker.retry_after())
+
+        await self.rate_limiter.acquire()
+
+        url = f"{self.base_url}/workflows/run"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "inputs": {
+                "pinglun": comment
+            },
+            "response_mode": "streaming",
+            "user": user
+        }
+
+        finished_event = None
+        try:
+            logger.info("调用Dify API (流式)")
+            client = self._get_http_client()
+            async with client.stream("POST", url, json=payload, headers=headers) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    error_msg = f"Dify API返回错误状态码: {response.status_code}"
+                    logger.error(f"{error_msg}, 响应: {response.text}")
+                    if response.status_code >= 500:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                    raise DifyClientError(error_msg, status_code=response.status_code)
+
+                self.circuit_breaker.record_success()
+
+                async for event in self._iter_sse_events(response):
+                    event_type = event.get("event")
+                    if event_type == "ping":
+                        continue
+                    if event_type == "error":
+                        raise DifyClientError(
+                            f"Dify工作流执行失败: {event.get('message', '未知错误')}",
+                            status_code=event.get("status")
+                        )
+                    if event_type == "workflow_finished":
+                        finished_event = event
+                    yield event
 
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON解析失败: {str(e)}")
-                logger.error(f"响应内容: {response.text}")
-                raise DifyClientError(f"Dify API响应格式错误: {str(e)}")
+        except httpx.TimeoutException as e:
+            self.circuit_breaker.record_failure()
+            raise DifyClientError(f"Dify API请求超时: {str(e)}")
+
+        except httpx.HTTPError as e:
+            self.circuit_breaker.record_failure()
+            raise DifyClientError(f"Dify API调用失败: {str(e)}")
+
+        if finished_event is None:
+            raise DifyClientError("Dify流式响应未返回workflow_finished事件")
+
+        processing_time = (time.time() - start_time) * 1000
+        logger.info(f"Dify API流式调用完成，耗时: {processing_time:.2f}ms")
+
+        # 还原为阻塞模式的响应结构，复用同一套解析逻辑
+        result = self._parse_dify_response(
+            {
+                "task_id": finished_event.get("task_id"),
+                "workflow_run_id": finished_event.get("workflow_run_id"),
+                "data": finished_event.get("data", {})
+            },
+            processing_time
+        )
+
+        await self.cache.set(cache_key, {
+            "tags": result["tags"],
+            "confidence": result["confidence"],
+            "raw_response": result["raw_response"]
+        })
+
+        yield {"event": "result", "result": result}
+
+    @staticmethod
+    async def _iter_sse_events(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+        """
+        解析server-sent events流
+
+        Args:
+            response: 流式HTTP响应
+
+        Yields:
+            每个事件data字段解析后的字典
+        """
+        data_lines: List[str] = []
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                data_lines.append(line[5:].lstrip())
+                continue
+            if line.strip() or not data_lines:
+                # 忽略event:/id:/注释行
+                continue
+
+            raw = "\n".join(data_lines)
+            data_lines = []
+            try:
+                yield json.loads(raw)
+            except json.JSONDecodeError:
+                logger.warning(f"无法解析的SSE事件: {raw}")
+
+        if data_lines:
+            try:
+                yield json.loads("\n".join(data_lines))
+            except json.JSONDecodeError:
+                logger.warning(f"无法解析的SSE事件: {data_lines}")
+
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        """
+        计算指数退避时间（full jitter）
+
+        Args:
+            attempt: 已失败的尝试序号（从0开始）
+
+        Returns:
+            等待秒数
+        """
+        ceiling = min(
+            settings.DIFY_RETRY_MAX_DELAY,
+            settings.DIFY_RETRY_BASE_DELAY * (2 ** attempt)
+        )
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    def _parse_retry_after(response: httpx.Response) -> Optional[float]:
+        """
+        解析Retry-After响应头（秒数或HTTP日期）
+
+        Args:
+            response: HTTP响应
+
+        Returns:
+            等待秒数，无法解析时返回None
+        """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
 
     def _parse_dify_response(
         self,
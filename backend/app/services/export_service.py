@@ -0,0 +1,238 @@
+"""
+任务结果导出服务
+按记录ID分块读取任务记录，边读边写入响应，内存占用与导出行数无关
+"""
+import csv
+import io
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+from sqlalchemy import select
+from app.models.record import TestRecord
+from app.utils.tags import parse_tags
+
+logger = logging.getLogger(__name__)
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    只写的内存输出流
+
+    ParquetWriter写入的字节先暂存在这里，每写完一个row group由调用方取走发送，
+    因此任意时刻只保留一个row group的数据。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        """取走已写入的字节"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportService:
+    """导出服务类"""
+
+    # 支持的导出格式: (Content-Type, 文件扩展名)
+    FORMATS: Dict[str, tuple] = {
+        "csv": ("text/csv; charset=utf-8", "csv"),
+        "parquet": ("application/vnd.apache.parquet", "parquet")
+    }
+
+    # 导出列
+    COLUMNS = ["id", "comment_text", "tags", "confidence", "processing_time", "created_at"]
+
+    @staticmethod
+    def check_format(export_format: str):
+        """
+        校验导出格式及其依赖
+
+        Args:
+            export_format: 导出格式
+
+        Raises:
+            ValueError: 格式不支持或缺少依赖时抛出
+        """
+        if export_format not in ExportService.FORMATS:
+            raise ValueError(
+                f"不支持的导出格式: {export_format}，可选: {', '.join(ExportService.FORMATS)}"
+            )
+        if export_format == "parquet":
+            ExportService._import_pyarrow()
+
+    @staticmethod
+    def media_type(export_format: str) -> str:
+        """导出格式的Content-Type"""
+        return ExportService.FORMATS[export_format][0]
+
+    @staticmethod
+    def filename(task_id: int, export_format: str) -> str:
+        """导出文件名"""
+        return f"task_{task_id}_records.{ExportService.FORMATS[export_format][1]}"
+
+    @staticmethod
+    def export(task_id: int, export_format: str, chunk_size: int = 1000) -> AsyncIterator[Any]:
+        """
+        导出任务记录
+
+        Args:
+            task_id: 任务ID
+            export_format: 导出格式，csv或parquet
+            chunk_size: 每次读取的记录数（Parquet中即每个row group的行数）
+
+        Returns:
+            响应内容的异步迭代器
+        """
+        if export_format == "parquet":
+            return ExportService.iter_parquet(task_id, chunk_size)
+        return ExportService.iter_csv(task_id, chunk_size)
+
+    @staticmethod
+    async def iter_csv(task_id: int, chunk_size: int = 1000) -> AsyncIterator[str]:
+        """
+        以CSV格式逐块产出任务记录
+
+        首块带UTF-8 BOM，便于Excel正确识别中文；tags列为JSON数组字符串。
+
+        Args:
+            task_id: 任务ID
+            chunk_size: 每次读取的记录数
+
+        Yields:
+            CSV文本块
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write("\ufeff")
+        writer.writerow(ExportService.COLUMNS)
+
+        async for records in ExportService._iter_record_chunks(task_id, chunk_size):
+            for record in records:
+                writer.writerow([
+                    record.id,
+                    record.comment_text,
+                    record.tags_json,
+                    record.confidence,
+                    record.processing_time,
+                    record.created_at.isoformat() if record.created_at else ""
+                ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        # 没有记录时也输出表头
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    async def iter_parquet(task_id: int, chunk_size: int = 1000) -> AsyncIterator[bytes]:
+        """
+        以Parquet格式逐个row group产出任务记录
+
+        Args:
+            task_id: 任务ID
+            chunk_size: 每个row group的行数
+
+        Yields:
+            Parquet文件字节块
+        """
+        pa, pq = ExportService._import_pyarrow()
+        schema = pa.schema([
+            ("id", pa.int64()),
+            ("comment_text", pa.string()),
+            ("tags", pa.list_(pa.string())),
+            ("confidence", pa.float64()),
+            ("processing_time", pa.float64()),
+            ("created_at", pa.timestamp("us"))
+        ])
+
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        try:
+            async for records in ExportService._iter_record_chunks(task_id, chunk_size):
+                table = pa.table({
+                    "id": [record.id for record in records],
+                    "comment_text": [record.comment_text for record in records],
+                    "tags": [parse_tags(record.tags_json) for record in records],
+                    "confidence": [record.confidence for record in records],
+                    "processing_time": [record.processing_time for record in records],
+                    "created_at": [record.created_at for record in records]
+                }, schema=schema)
+                writer.write_table(table)
+                yield sink.drain()
+        finally:
+            # 写入文件尾（元数据），中途断开时同样释放writer
+            writer.close()
+        yield sink.drain()
+
+    @staticmethod
+    async def _iter_record_chunks(task_id: int, chunk_size: int) -> AsyncIterator[List[Any]]:
+        """
+        按记录ID游标分块读取任务记录（只读取导出列，不加载ORM对象）
+
+        生成器在响应发送期间运行，因此自行管理只读数据库会话。
+
+        Args:
+            task_id: 任务ID
+            chunk_size: 每次读取的记录数
+
+        Yields:
+            记录行列表
+        """
+        from app.database import AsyncReadSessionLocal
+
+        cursor: Optional[int] = None
+        total = 0
+        async with AsyncReadSessionLocal() as db:
+            while True:
+                query = (
+                    select(
+                        TestRecord.id,
+                        TestRecord.comment_text,
+                        TestRecord.tags_json,
+                        TestRecord.confidence,
+                        TestRecord.processing_time,
+                        TestRecord.created_at
+                    )
+                    .where(TestRecord.task_id == task_id)
+                )
+                if cursor is not None:
+                    query = query.where(TestRecord.id > cursor)
+                records = (await db.execute(query.order_by(TestRecord.id).limit(chunk_size))).all()
+                if not records:
+                    break
+                total += len(records)
+                yield records
+                cursor = records[-1].id
+
+        logger.info(f"任务记录导出完成，task_id={task_id}, 行数={total}")
+
+    @staticmethod
+    def _import_pyarrow():
+        """
+        导入pyarrow（可选依赖）
+
+        Raises:
+            ValueError: 未安装pyarrow时抛出
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("导出Parquet需要安装pyarrow: pip install pyarrow")
+        return pyarrow, pyarrow.parquet
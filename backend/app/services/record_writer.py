@@ -0,0 +1,274 @@
+"""
+测试记录写入服务
+批量插入TestRecord，并合并任务进度更新
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy import insert, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.job import BatchJobItem
+from app.models.record import TestRecord, RecordTag
+from app.models.task import TestTask
+from app.services.stats_cache import stats_cache
+from app.services.stats_service import StatisticsService, utc_now
+from app.utils.tags import parse_tags, split_tag
+
+logger = logging.getLogger(__name__)
+
+
+class RecordWriter:
+    """测试记录写入"""
+
+    @staticmethod
+    def insert_records(
+        db: Session,
+        task_id: int,
+        rows: List[Dict[str, Any]]
+    ):
+        """
+        批量插入测试记录、标签关联并累加统计汇总（不提交事务）
+
+        同步实现供脚本直接调用，异步会话通过AsyncSession.run_sync调用。
+
+        Args:
+            db: 数据库会话
+            task_id: 任务ID
+            rows: 记录字段字典列表（comment_text, tags_json, confidence, processing_time，
+                可选created_at，缺省为当前UTC时间）
+        """
+        if not rows:
+            return
+
+        # 显式写入创建时间，时间分桶汇总与记录使用同一时间
+        now = utc_now()
+        rows = [{"created_at": now, **row} for row in rows]
+        record_ids = db.execute(
+            insert(TestRecord).returning(TestRecord.id, sort_by_parameter_order=True),
+            [{"task_id": task_id, **row} for row in rows]
+        ).scalars().all()
+
+        # 标签只解析一次，同时用于关联表和统计汇总
+        row_tags = [parse_tags(row["tags_json"]) for row in rows]
+        RecordWriter.insert_record_tags(db, task_id, record_ids, row_tags)
+
+        # 统计汇总与记录在同一事务中更新
+        StatisticsService.apply_records(db, task_id, rows, row_tags)
+
+        # 事务提交后统计结果缓存失效
+        stats_cache.mark_dirty(db, task_id)
+
+    @staticmethod
+    def insert_record_tags(
+        db: Session,
+        task_id: int,
+        record_ids: List[int],
+        row_tags: List[List[str]]
+    ):
+        """
+        写入记录标签关联（不提交事务）
+
+        Args:
+            db: 数据库会话
+            task_id: 任务ID
+            record_ids: 记录ID列表
+            row_tags: 与记录ID一一对应的标签列表
+        """
+        tag_rows = []
+        for record_id, tags in zip(record_ids, row_tags):
+            for tag in tags:
+                dimension, value = split_tag(tag)
+                tag_rows.append({
+                    "record_id": record_id,
+                    "task_id": task_id,
+                    "tag": tag,
+                    "dimension": dimension,
+                    "value": value
+                })
+        if tag_rows:
+            db.execute(insert(RecordTag), tag_rows)
+
+
+class BufferedRecordWriter:
+    """
+    批量任务的写缓冲
+
+    记录先进入内存缓冲，满flush_rows条或距上次写入超过flush_interval_ms时
+    一次性批量插入，并在同一事务中累加任务的processed_count、将对应输入项标记为已完成。
+    数据库被其他连接锁住时记录保留在缓冲中，按指数退避重试BATCH_FLUSH_MAX_RETRIES次。
+    任务结束、失败或应用关闭时必须调用close()/flush()把剩余记录写入。
+
+    AsyncSession不能被并发使用，与写缓冲共用会话的调用方需持有lock。
+    """
+
+    # 活跃的写缓冲，应用关闭时统一刷盘
+    _active: Set["BufferedRecordWriter"] = set()
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        task_id: int,
+        flush_rows: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None
+    ):
+        """
+        初始化写缓冲
+
+        Args:
+            db: 异步数据库会话
+            task_id: 任务ID
+            flush_rows: 缓冲多少条后写入，默认读取配置BATCH_FLUSH_ROWS
+            flush_interval_ms: 最长缓冲时间（毫秒），默认读取配置BATCH_FLUSH_INTERVAL_MS
+        """
+        self.db = db
+        self.task_id = task_id
+        self.flush_rows = max(1, flush_rows or settings.BATCH_FLUSH_ROWS)
+        self.flush_interval = (flush_interval_ms or settings.BATCH_FLUSH_INTERVAL_MS) / 1000
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._item_ids: List[int] = []
+        self._last_flush = time.monotonic()
+        self._timer: Optional[asyncio.Task] = None
+        self.flushed_count = 0
+
+        # 会话锁，刷盘和调用方的其他会话操作互斥
+        self.lock = asyncio.Lock()
+
+    def start(self):
+        """
+        启动定时刷盘并登记为活跃写缓冲
+        """
+        BufferedRecordWriter._active.add(self)
+        if self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_periodically())
+
+    async def add(self, row: Dict[str, Any], item_id: Optional[int] = None):
+        """
+        追加一条记录，达到阈值时写入
+
+        Args:
+            row: 记录字段字典
+            item_id: 对应的队列输入项ID
+        """
+        self._buffer.append(row)
+        if item_id is not None:
+            self._item_ids.append(item_id)
+        if (
+            len(self._buffer) >= self.flush_rows
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        """
+        把缓冲中的记录批量写入并提交
+        """
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        rows, item_ids = self._buffer, self._item_ids
+        self._buffer, self._item_ids = [], []
+        async with self.lock:
+            try:
+                attempt = 0
+                while True:
+                    try:
+                        await self._write(rows, item_ids)
+                        break
+                    except OperationalError as e:
+                        if not self._is_locked_error(e) or attempt >= settings.BATCH_FLUSH_MAX_RETRIES:
+                            raise
+                    delay = min(
+                        settings.BATCH_FLUSH_RETRY_BASE_DELAY * 2 ** attempt,
+                        settings.BATCH_FLUSH_RETRY_MAX_DELAY
+                    )
+                    attempt += 1
+                    logger.warning(
+                        f"数据库被锁定，{delay:.1f}秒后第{attempt}次重试写入，task_id={self.task_id}"
+                    )
+                    await asyncio.sleep(delay)
+            except BaseException:
+                self._restore(rows, item_ids)
+                raise
+
+        self.flushed_count += len(rows)
+        logger.debug(f"批量写入{len(rows)}条记录，task_id={self.task_id}")
+
+    async def _write(self, rows: List[Dict[str, Any]], item_ids: List[int]):
+        """在同一事务中写入记录、标记输入项并累加进度"""
+        try:
+            await self.db.run_sync(RecordWriter.insert_records, self.task_id, rows)
+            if item_ids:
+                await self.db.execute(
+                    update(BatchJobItem)
+                    .where(BatchJobItem.id.in_(item_ids))
+                    .values(status="done")
+                )
+            await self.db.execute(
+                update(TestTask)
+                .where(TestTask.id == self.task_id)
+                .values(processed_count=TestTask.processed_count + len(rows))
+            )
+            await self.db.commit()
+        except BaseException:
+            await self.db.rollback()
+            raise
+
+    def _restore(self, rows: List[Dict[str, Any]], item_ids: List[int]):
+        """写入失败时放回缓冲，由调用方决定重试或放弃"""
+        self._buffer = rows + self._buffer
+        self._item_ids = item_ids + self._item_ids
+
+    @staticmethod
+    def _is_locked_error(error: OperationalError) -> bool:
+        """是否为可重试的数据库锁冲突（SQLITE_BUSY/SQLITE_LOCKED）"""
+        message = str(error.orig).lower()
+        return "locked" in message or "busy" in message
+
+    async def close(self):
+        """
+        停止定时刷盘并写入剩余记录
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        BufferedRecordWriter._active.discard(self)
+        await self.flush()
+
+    async def _flush_periodically(self):
+        """按时间间隔刷盘，避免低速处理时记录长时间停留在内存"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"定时写入记录失败，task_id={self.task_id}, error={str(e)}")
+
+    def discard(self):
+        """
+        停止定时刷盘并丢弃缓冲中的记录（租约丢失时调用，对应输入项仍为未完成）
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        BufferedRecordWriter._active.discard(self)
+        if self._buffer:
+            logger.warning(f"丢弃{len(self._buffer)}条未写入的记录，task_id={self.task_id}")
+        self._buffer, self._item_ids = [], []
+
+    @classmethod
+    async def close_all(cls):
+        """
+        写入所有活跃写缓冲的剩余记录（应用关闭时调用）
+        """
+        for writer in list(cls._active):
+            try:
+                await writer.close()
+            except Exception as e:
+                logger.error(f"关闭写缓冲失败，task_id={writer.task_id}, error={str(e)}")
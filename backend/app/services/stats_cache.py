@@ -0,0 +1,181 @@
+"""
+统计结果缓存
+按任务（及全局视图）缓存统计查询结果，记录写入提交后通过版本号失效
+"""
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 会话info中登记待失效任务的键
+_DIRTY_KEY = "stats_cache_dirty"
+# 登记全部失效时使用的标记
+_ALL_SCOPES = "*"
+
+
+class StatisticsCache:
+    """
+    统计结果缓存
+
+    - 每个任务维护一个版本号，全局视图另有一个版本号，任何写入都会推进全局版本
+    - 写入方在事务中登记受影响的任务，事务提交后才推进版本，避免缓存未提交的数据
+    - 缓存键包含版本号，版本推进后旧结果自然失效；ETag由启动标识和版本号组成，
+      进程重启后客户端持有的ETag全部失效
+
+    版本号保存在进程内存中，只感知本进程的写入（接口与批量任务运行在同一进程）。
+    """
+
+    def __init__(self, max_entries: int = 1000, enabled: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多缓存的结果数
+            enabled: 是否启用
+        """
+        self.max_entries = max(1, max_entries)
+        self.enabled = enabled
+        self.boot_id = uuid.uuid4().hex[:8]
+
+        self._epoch = 0
+        self._global_version = 0
+        self._task_versions: Dict[int, int] = {}
+        self._entries: "OrderedDict[Tuple[str, int, str], Any]" = OrderedDict()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0
+        }
+
+    def version(self, task_id: Optional[int]) -> str:
+        """
+        获取统计范围的当前版本
+
+        Args:
+            task_id: 任务ID，None表示全局视图
+
+        Returns:
+            版本字符串
+        """
+        scope_version = self._global_version if not task_id else self._task_versions.get(task_id, 0)
+        return f"{self._epoch}.{scope_version}"
+
+    def etag(self, kind: str, task_id: Optional[int]) -> str:
+        """
+        生成统计范围的当前ETag
+
+        Args:
+            kind: 统计类型，如overview、dimensions
+            task_id: 任务ID，None表示全局视图
+
+        Returns:
+            ETag（含引号）
+        """
+        return f'"{self.boot_id}-{kind}-{task_id or 0}-{self.version(task_id)}"'
+
+    def get(self, kind: str, task_id: Optional[int]) -> Optional[Any]:
+        """
+        读取当前版本的缓存结果
+
+        Args:
+            kind: 统计类型
+            task_id: 任务ID，None表示全局视图
+
+        Returns:
+            缓存结果，未命中返回None
+        """
+        if not self.enabled:
+            return None
+        key = (kind, task_id or 0, self.version(task_id))
+        value = self._entries.get(key)
+        if value is None:
+            self._counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._counters["hits"] += 1
+        return value
+
+    def set(self, kind: str, task_id: Optional[int], version: str, value: Any):
+        """
+        写入缓存结果
+
+        Args:
+            kind: 统计类型
+            task_id: 任务ID，None表示全局视图
+            version: 计算开始前读取的版本，计算期间发生写入时结果不会被当前版本命中
+            value: 统计结果
+        """
+        if not self.enabled:
+            return
+        self._entries[(kind, task_id or 0, version)] = value
+        self._entries.move_to_end((kind, task_id or 0, version))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def mark_dirty(self, db: Session, task_id: Optional[int] = None):
+        """
+        登记本事务影响的任务，事务提交后失效
+
+        Args:
+            db: 数据库会话
+            task_id: 任务ID，None表示全部统计失效
+        """
+        db.info.setdefault(_DIRTY_KEY, set()).add(task_id if task_id else _ALL_SCOPES)
+
+    def invalidate(self, scopes: Iterable[Any]):
+        """
+        推进版本号使缓存失效
+
+        Args:
+            scopes: 任务ID集合，包含"*"时全部失效
+        """
+        scopes = set(scopes)
+        if not scopes:
+            return
+        if _ALL_SCOPES in scopes:
+            self._epoch += 1
+            self._entries.clear()
+        for task_id in scopes - {_ALL_SCOPES}:
+            self._task_versions[task_id] = self._task_versions.get(task_id, 0) + 1
+        self._global_version += 1
+        self._counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            统计字典
+        """
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "global_version": self.version(None),
+            **self._counters
+        }
+
+
+# 创建全局实例
+stats_cache = StatisticsCache(
+    max_entries=settings.STATS_CACHE_MAX_ENTRIES,
+    enabled=settings.STATS_CACHE_ENABLED
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    """事务提交后推进登记任务的版本"""
+    dirty: Optional[Set[Any]] = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        stats_cache.invalidate(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    """事务回滚后丢弃登记"""
+    session.info.pop(_DIRTY_KEY, None)
@@ -1,44 +1,114 @@
 """
 统计分析业务逻辑服务
 """
-import json
-from typing import Dict, List, Any
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models.task import TestTask
-from app.models.record import TestRecord
+from sqlalchemy import delete, func, insert, select, update
+from app.config import settings
+from app.models.record import TestRecord, RecordTag
+from app.models.statistic import (
+    TagStatistic, TaskTagStatistic, TaskStatistic, StatisticRollup, TagRollup
+)
+from app.services.stats_cache import stats_cache
+from app.utils.category_classifier import CategoryClassifier, load_category_rules
+from app.utils.tags import parse_tags, split_tag
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 全局汇总在task_statistics中使用的task_id
+GLOBAL_SCOPE = 0
+
+# 时间分桶粒度及桶宽
+ROLLUP_GRANULARITIES: Dict[str, timedelta] = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1)
+}
+
+# 单次时间序列查询最多返回的数据点
+MAX_TIMESERIES_POINTS = 1500
+
+
+def utc_now() -> datetime:
+    """
+    当前UTC时间（不带时区，与SQLite的CURRENT_TIMESTAMP一致）
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(moment: datetime) -> datetime:
+    """
+    转换为不带时区的UTC时间，不带时区的时间视为UTC
+    """
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """
+    计算时间所在时间桶的起点
+
+    Args:
+        moment: 时间（UTC）
+        granularity: 粒度，minute/hour/day
+
+    Returns:
+        时间桶起点
+    """
+    moment = moment.replace(second=0, microsecond=0)
+    if granularity in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
 
 class StatisticsService:
     """统计分析服务类"""
 
+    # 默认分类词典，按顺序匹配，"其他"兜底；可通过配置CATEGORY_RULES_FILE替换
+    CATEGORY_RULES = {
+        "正面情感": ["正面", "积极", "好评", "满意", "喜欢"],
+        "负面情感": ["负面", "消极", "差评", "不满意", "不喜欢"],
+        "产品性能": ["动力", "油耗", "操控", "舒适", "配置", "性能"],
+        "外观设计": ["外观", "内饰", "颜值", "设计", "造型"],
+        "空间尺寸": ["空间", "尺寸", "大小", "乘坐", "储物"],
+        "价格性价比": ["价格", "性价比", "贵", "便宜", "实惠"],
+        "服务售后": ["售后", "服务", "保养", "维修", "质保"],
+        "品牌口碑": ["品牌", "口碑", "形象", "知名度"],
+        "其他": []
+    }
+
+    # 由分类词典编译的分类器，见get_category_classifier
+    _classifier: Optional[CategoryClassifier] = None
+
     @staticmethod
-    def get_statistics_overview(
-        db: Session,
+    async def get_statistics_overview(
+        db: AsyncSession,
         task_id: int = None
     ) -> Dict[str, Any]:
         """
         获取统计概览
 
+        从写入时维护的汇总表读取，开销只与不同标签的数量有关，与评论总数无关。
+
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             task_id: 任务ID，如果指定则只统计该任务
 
         Returns:
             统计概览字典
         """
-        # 构建查询条件
-        query = db.query(TestRecord)
-        if task_id:
-            query = query.filter(TestRecord.task_id == task_id)
-
-        # 获取所有记录
-        records = query.all()
+        summary = await db.scalar(
+            select(TaskStatistic).where(TaskStatistic.task_id == (task_id or GLOBAL_SCOPE))
+        )
 
-        if not records:
+        if summary is None or summary.comment_count == 0:
             return {
                 "total_comments": 0,
                 "total_tags": 0,
@@ -49,37 +119,33 @@ class StatisticsService:
                 "category_distribution": []
             }
 
+        # 读取每个标签的出现次数
+        if task_id:
+            query = (
+                select(TaskTagStatistic.tag_name, TaskTagStatistic.occurrence_count)
+                .where(TaskTagStatistic.task_id == task_id, TaskTagStatistic.occurrence_count > 0)
+            )
+        else:
+            query = (
+                select(TagStatistic.tag_name, func.sum(TagStatistic.occurrence_count))
+                .group_by(TagStatistic.tag_name)
+                .having(func.sum(TagStatistic.occurrence_count) > 0)
+            )
+        rows = (await db.execute(query)).all()
+        tag_counts = {tag: count for tag, count in rows}
+
         # 基础统计
-        total_comments = len(records)
-        total_tags = 0
-        all_tags = []
-        confidences = []
-        processing_times = []
-
-        for record in records:
-            # 解析标签
-            try:
-                tags = json.loads(record.tags_json) if isinstance(record.tags_json, str) else record.tags_json
-                if isinstance(tags, list):
-                    total_tags += len(tags)
-                    all_tags.extend(tags)
-            except Exception as e:
-                logger.error(f"解析标签失败: {e}")
-
-            # 收集置信度和处理时间
-            if record.confidence is not None:
-                confidences.append(record.confidence)
-            if record.processing_time is not None:
-                processing_times.append(record.processing_time)
+        total_comments = summary.comment_count
+        total_tags = summary.tag_count
 
         # 计算平均值
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
-        avg_processing_time = sum(processing_times) / len(processing_times) if processing_times else 0.0
-
-        # 统计标签分布
-        tag_counts = {}
-        for tag in all_tags:
-            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        avg_confidence = (
+            summary.confidence_sum / summary.confidence_count if summary.confidence_count else 0.0
+        )
+        avg_processing_time = (
+            summary.processing_time_sum / summary.processing_time_count
+            if summary.processing_time_count else 0.0
+        )
 
         # 获取Top 10标签
         sorted_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:10]
@@ -93,7 +159,7 @@ class StatisticsService:
         ]
 
         # 统计分类分布
-        category_distribution = StatisticsService._analyze_categories(all_tags, total_comments)
+        category_distribution = StatisticsService._analyze_categories(tag_counts)
 
         return {
             "total_comments": total_comments,
@@ -106,49 +172,547 @@ class StatisticsService:
         }
 
     @staticmethod
-    def _analyze_categories(tags: List[str], total_comments: int) -> List[Dict[str, Any]]:
+    def apply_records(
+        db: Session,
+        task_id: int,
+        rows: List[Dict[str, Any]],
+        row_tags: List[List[str]]
+    ):
         """
-        分析标签分类
+        将新写入的记录累加到汇总表（不提交事务，与记录插入处于同一事务）
+
+        Args:
+            db: 数据库会话
+            task_id: 任务ID
+            rows: 记录字段字典列表（confidence, processing_time）
+            row_tags: 与rows一一对应的已解析标签列表
+        """
+        if not rows:
+            return
+
+        tag_counter: Counter = Counter()
+        totals = StatisticsService._empty_totals(len(rows))
+
+        for row, tags in zip(rows, row_tags):
+            StatisticsService._add_to_totals(totals, row, tags)
+            tag_counter.update(tags)
+
+        # 任务汇总和全局汇总
+        for scope in (task_id, GLOBAL_SCOPE):
+            updated = db.execute(
+                update(TaskStatistic)
+                .where(TaskStatistic.task_id == scope)
+                .values({
+                    getattr(TaskStatistic, name): getattr(TaskStatistic, name) + value
+                    for name, value in totals.items()
+                })
+            ).rowcount
+            if not updated:
+                db.execute(insert(TaskStatistic).values(task_id=scope, **totals))
+
+        for tag, count in tag_counter.items():
+            # 全局标签计数（历史数据中同名标签可能有多行，只累加最早的一行）
+            first_id = (
+                select(func.min(TagStatistic.id))
+                .where(TagStatistic.tag_name == tag)
+                .scalar_subquery()
+            )
+            updated = db.execute(
+                update(TagStatistic)
+                .where(TagStatistic.id == first_id)
+                .values(occurrence_count=TagStatistic.occurrence_count + count)
+            ).rowcount
+            if not updated:
+                db.execute(insert(TagStatistic).values(
+                    tag_name=tag,
+                    tag_category=StatisticsService._categorize_tag(tag),
+                    occurrence_count=count
+                ))
+
+            # 任务内标签计数
+            updated = db.execute(
+                update(TaskTagStatistic)
+                .where(TaskTagStatistic.task_id == task_id, TaskTagStatistic.tag_name == tag)
+                .values(occurrence_count=TaskTagStatistic.occurrence_count + count)
+            ).rowcount
+            if not updated:
+                db.execute(insert(TaskTagStatistic).values(
+                    task_id=task_id,
+                    tag_name=tag,
+                    occurrence_count=count
+                ))
+
+        # 时间分桶汇总
+        StatisticsService.apply_rollups(db, rows, row_tags)
+
+    @staticmethod
+    def apply_rollups(
+        db: Session,
+        rows: List[Dict[str, Any]],
+        row_tags: List[List[str]]
+    ):
+        """
+        将记录累加到各粒度的时间分桶汇总（不提交事务）
 
         Args:
-            tags: 所有标签列表
-            total_comments: 总评论数
+            db: 数据库会话
+            rows: 记录字段字典列表（created_at, confidence, processing_time），
+                created_at为UTC时间，缺省时按当前时间计
+            row_tags: 与rows一一对应的已解析标签列表
+        """
+        bucket_totals: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+        bucket_tags: Counter = Counter()
+        now = utc_now()
+
+        for row, tags in zip(rows, row_tags):
+            created_at = to_utc(row.get("created_at") or now)
+            for granularity in ROLLUP_GRANULARITIES:
+                bucket = bucket_start(created_at, granularity)
+                totals = bucket_totals.setdefault((granularity, bucket), StatisticsService._empty_totals(0))
+                StatisticsService._add_to_totals(totals, row, tags, count_comment=True)
+                for tag in tags:
+                    bucket_tags[(granularity, bucket, tag)] += 1
+
+        for (granularity, bucket), totals in bucket_totals.items():
+            updated = db.execute(
+                update(StatisticRollup)
+                .where(StatisticRollup.granularity == granularity, StatisticRollup.bucket_start == bucket)
+                .values({
+                    getattr(StatisticRollup, name): getattr(StatisticRollup, name) + value
+                    for name, value in totals.items()
+                })
+            ).rowcount
+            if not updated:
+                db.execute(insert(StatisticRollup).values(
+                    granularity=granularity, bucket_start=bucket, **totals
+                ))
+
+        for (granularity, bucket, tag), count in bucket_tags.items():
+            updated = db.execute(
+                update(TagRollup)
+                .where(
+                    TagRollup.granularity == granularity,
+                    TagRollup.bucket_start == bucket,
+                    TagRollup.tag_name == tag
+                )
+                .values(occurrence_count=TagRollup.occurrence_count + count)
+            ).rowcount
+            if not updated:
+                db.execute(insert(TagRollup).values(
+                    granularity=granularity, bucket_start=bucket, tag_name=tag, occurrence_count=count
+                ))
+
+    @staticmethod
+    def _empty_totals(comment_count: int = 0) -> Dict[str, Any]:
+        """汇总字段初始值"""
+        return {
+            "comment_count": comment_count,
+            "tag_count": 0,
+            "confidence_sum": 0.0,
+            "confidence_count": 0,
+            "processing_time_sum": 0.0,
+            "processing_time_count": 0
+        }
+
+    @staticmethod
+    def _add_to_totals(
+        totals: Dict[str, Any],
+        row: Dict[str, Any],
+        tags: List[str],
+        count_comment: bool = False
+    ):
+        """把一条记录累加到汇总字段"""
+        if count_comment:
+            totals["comment_count"] += 1
+        totals["tag_count"] += len(tags)
+
+        # 累加置信度和处理时间
+        if row.get("confidence") is not None:
+            totals["confidence_sum"] += row["confidence"]
+            totals["confidence_count"] += 1
+        if row.get("processing_time") is not None:
+            totals["processing_time_sum"] += row["processing_time"]
+            totals["processing_time_count"] += 1
+
+    @staticmethod
+    async def get_timeseries(
+        db: AsyncSession,
+        start: datetime,
+        end: datetime,
+        granularity: str,
+        tag: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        获取时间序列统计（读取时间分桶汇总，不扫描记录表）
+
+        Args:
+            db: 异步数据库会话
+            start: 起始时间（含），按粒度向下取整
+            end: 结束时间（不含）
+            granularity: 粒度，minute/hour/day
+            tag: 可选的标签，指定时返回该标签在每个时间桶的出现次数
 
         Returns:
-            分类分布列表
+            时间序列字典
+
+        Raises:
+            ValueError: 粒度不支持、时间范围无效或数据点过多时抛出
         """
-        # 定义分类规则
-        categories = {
-            "正面情感": ["正面", "积极", "好评", "满意", "喜欢"],
-            "负面情感": ["负面", "消极", "差评", "不满意", "不喜欢"],
-            "产品性能": ["动力", "油耗", "操控", "舒适", "配置", "性能"],
-            "外观设计": ["外观", "内饰", "颜值", "设计", "造型"],
-            "空间尺寸": ["空间", "尺寸", "大小", "乘坐", "储物"],
-            "价格性价比": ["价格", "性价比", "贵", "便宜", "实惠"],
-            "服务售后": ["售后", "服务", "保养", "维修", "质保"],
-            "品牌口碑": ["品牌", "口碑", "形象", "知名度"],
-            "其他": []
+        step = ROLLUP_GRANULARITIES.get(granularity)
+        if step is None:
+            raise ValueError(f"不支持的时间粒度: {granularity}，可选: {', '.join(ROLLUP_GRANULARITIES)}")
+
+        start = bucket_start(to_utc(start), granularity)
+        end = to_utc(end)
+        if end <= start:
+            raise ValueError("结束时间必须晚于起始时间")
+
+        point_count = -(-(end - start) // step)
+        if point_count > MAX_TIMESERIES_POINTS:
+            raise ValueError(
+                f"数据点过多({point_count})，单次最多{MAX_TIMESERIES_POINTS}个，请缩小时间范围或使用更粗的粒度"
+            )
+
+        in_range = (
+            StatisticRollup.granularity == granularity,
+            StatisticRollup.bucket_start >= start,
+            StatisticRollup.bucket_start < end
+        )
+        rollups = {
+            rollup.bucket_start: rollup
+            for rollup in (await db.scalars(select(StatisticRollup).where(*in_range))).all()
+        }
+
+        tag_in_range = (
+            TagRollup.granularity == granularity,
+            TagRollup.bucket_start >= start,
+            TagRollup.bucket_start < end
+        )
+        tag_occurrences: Dict[datetime, int] = {}
+        if tag:
+            tag_occurrences = dict((await db.execute(
+                select(TagRollup.bucket_start, TagRollup.occurrence_count)
+                .where(*tag_in_range, TagRollup.tag_name == tag)
+            )).all())
+
+        # 时间范围内的热门标签
+        total_comments = sum(rollup.comment_count for rollup in rollups.values())
+        tag_total = func.sum(TagRollup.occurrence_count)
+        top_rows = (await db.execute(
+            select(TagRollup.tag_name, tag_total)
+            .where(*tag_in_range)
+            .group_by(TagRollup.tag_name)
+            .order_by(tag_total.desc())
+            .limit(10)
+        )).all()
+        top_tags = [
+            {
+                "tag": name,
+                "count": count,
+                "percentage": round((count / total_comments) * 100, 2) if total_comments > 0 else 0.0
+            }
+            for name, count in top_rows
+        ]
+
+        # 逐个时间桶输出，无数据的时间桶计为0
+        points = []
+        bucket = start
+        while bucket < end:
+            rollup = rollups.get(bucket)
+            point = {
+                "bucket_start": bucket.isoformat(),
+                "comment_count": rollup.comment_count if rollup else 0,
+                "tag_count": rollup.tag_count if rollup else 0,
+                "avg_confidence": round(
+                    rollup.confidence_sum / rollup.confidence_count, 4
+                ) if rollup and rollup.confidence_count else 0.0,
+                "avg_processing_time": round(
+                    rollup.processing_time_sum / rollup.processing_time_count, 4
+                ) if rollup and rollup.processing_time_count else 0.0
+            }
+            if tag:
+                point["tag_occurrences"] = tag_occurrences.get(bucket, 0)
+            points.append(point)
+            bucket += step
+
+        return {
+            "granularity": granularity,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "tag": tag,
+            "points": points,
+            "top_tags": top_tags
         }
 
-        # 统计每个分类的标签数量
-        category_counts = {category: 0 for category in categories.keys()}
+    @staticmethod
+    async def get_dimension_distribution(
+        db: AsyncSession,
+        task_id: int = None
+    ) -> List[Dict[str, Any]]:
+        """
+        获取维度-值分布（基于record_tags的SQL分组统计）
 
-        for tag in tags:
-            matched = False
-            for category, keywords in categories.items():
-                if category == "其他":
-                    continue
-                if any(keyword in tag for keyword in keywords):
-                    category_counts[category] += 1
-                    matched = True
-                    break
+        Args:
+            db: 异步数据库会话
+            task_id: 任务ID，如果指定则只统计该任务
 
-            # 如果没有匹配到任何分类，归入"其他"
-            if not matched:
-                category_counts["其他"] += 1
+        Returns:
+            维度分布列表，按维度出现次数降序
+        """
+        query = (
+            select(RecordTag.dimension, RecordTag.value, func.count(RecordTag.id))
+            .where(RecordTag.dimension.isnot(None))
+        )
+        if task_id:
+            query = query.where(RecordTag.task_id == task_id)
+        rows = (await db.execute(query.group_by(RecordTag.dimension, RecordTag.value))).all()
+
+        dimensions: Dict[str, Dict[str, Any]] = {}
+        for dimension, value, count in rows:
+            item = dimensions.setdefault(dimension, {"dimension": dimension, "count": 0, "values": []})
+            item["count"] += count
+            item["values"].append({"value": value, "count": count})
+
+        result = list(dimensions.values())
+        for item in result:
+            item["values"].sort(key=lambda x: x["count"], reverse=True)
+            for value_item in item["values"]:
+                value_item["percentage"] = round((value_item["count"] / item["count"]) * 100, 2)
+        result.sort(key=lambda x: x["count"], reverse=True)
+
+        return result
+
+    @staticmethod
+    def rebuild_aggregates(db: Session):
+        """
+        根据test_records和record_tags重建汇总表（全部在SQL中分组计算）
+
+        Args:
+            db: 数据库会话
+        """
+        db.execute(delete(TaskTagStatistic))
+        db.execute(delete(TaskStatistic))
+        db.execute(delete(TagStatistic))
+
+        # 每个任务及全局的标签总数
+        tag_totals = {
+            task_id: count
+            for task_id, count in db.query(RecordTag.task_id, func.count(RecordTag.id)).group_by(RecordTag.task_id)
+        }
+
+        record_totals = (
+            db.query(
+                TestRecord.task_id,
+                func.count(TestRecord.id),
+                func.coalesce(func.sum(TestRecord.confidence), 0.0),
+                func.count(TestRecord.confidence),
+                func.coalesce(func.sum(TestRecord.processing_time), 0.0),
+                func.count(TestRecord.processing_time)
+            )
+            .group_by(TestRecord.task_id)
+            .all()
+        )
+
+        global_totals = [0, 0, 0.0, 0, 0.0, 0]
+        summary_rows = []
+        for task_id, comments, conf_sum, conf_count, time_sum, time_count in record_totals:
+            values = [comments, tag_totals.get(task_id, 0), conf_sum, conf_count, time_sum, time_count]
+            global_totals = [g + v for g, v in zip(global_totals, values)]
+            summary_rows.append([task_id] + values)
+        if summary_rows:
+            summary_rows.append([GLOBAL_SCOPE] + global_totals)
+
+        columns = [
+            "task_id", "comment_count", "tag_count", "confidence_sum",
+            "confidence_count", "processing_time_sum", "processing_time_count"
+        ]
+        if summary_rows:
+            db.execute(insert(TaskStatistic), [dict(zip(columns, row)) for row in summary_rows])
+
+        task_tag_rows = [
+            {"task_id": task_id, "tag_name": tag, "occurrence_count": count}
+            for task_id, tag, count in (
+                db.query(RecordTag.task_id, RecordTag.tag, func.count(RecordTag.id))
+                .group_by(RecordTag.task_id, RecordTag.tag)
+            )
+        ]
+        if task_tag_rows:
+            db.execute(insert(TaskTagStatistic), task_tag_rows)
+
+        tag_rows = [
+            {
+                "tag_name": tag,
+                "tag_category": StatisticsService._categorize_tag(tag),
+                "occurrence_count": count
+            }
+            for tag, count in db.query(RecordTag.tag, func.count(RecordTag.id)).group_by(RecordTag.tag)
+        ]
+        if tag_rows:
+            db.execute(insert(TagStatistic), tag_rows)
+
+        stats_cache.mark_dirty(db)
+        db.commit()
+        logger.info("统计汇总表重建完成")
+
+    @staticmethod
+    def backfill_record_tags(db: Session, chunk_size: int = 1000):
+        """
+        为尚未拆分标签的历史记录写入record_tags
+
+        Args:
+            db: 数据库会话
+            chunk_size: 每次处理的记录数
+        """
+        last_id = db.query(func.max(RecordTag.record_id)).scalar() or 0
+        total = 0
+        while True:
+            records = (
+                db.query(TestRecord.id, TestRecord.task_id, TestRecord.tags_json)
+                .filter(TestRecord.id > last_id)
+                .order_by(TestRecord.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not records:
+                break
+
+            tag_rows = []
+            for record in records:
+                for tag in parse_tags(record.tags_json):
+                    dimension, value = split_tag(tag)
+                    tag_rows.append({
+                        "record_id": record.id,
+                        "task_id": record.task_id,
+                        "tag": tag,
+                        "dimension": dimension,
+                        "value": value
+                    })
+            if tag_rows:
+                db.execute(insert(RecordTag), tag_rows)
+            stats_cache.mark_dirty(db)
+            db.commit()
+
+            total += len(records)
+            last_id = records[-1].id
+
+        if total:
+            logger.info(f"已为{total}条历史记录回填record_tags")
+
+    @staticmethod
+    def rebuild_rollups(db: Session, chunk_size: int = 1000):
+        """
+        根据test_records重建时间分桶汇总
+
+        Args:
+            db: 数据库会话
+            chunk_size: 每次处理的记录数
+        """
+        db.execute(delete(TagRollup))
+        db.execute(delete(StatisticRollup))
+
+        last_id = 0
+        total = 0
+        while True:
+            records = (
+                db.query(
+                    TestRecord.id, TestRecord.created_at, TestRecord.tags_json,
+                    TestRecord.confidence, TestRecord.processing_time
+                )
+                .filter(TestRecord.id > last_id)
+                .order_by(TestRecord.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not records:
+                break
+
+            rows = [
+                {
+                    "created_at": record.created_at,
+                    "confidence": record.confidence,
+                    "processing_time": record.processing_time
+                }
+                for record in records
+            ]
+            StatisticsService.apply_rollups(db, rows, [parse_tags(record.tags_json) for record in records])
+            db.commit()
+
+            total += len(records)
+            last_id = records[-1].id
+
+        db.commit()
+        logger.info(f"时间分桶汇总重建完成，共{total}条记录")
+
+    @staticmethod
+    def ensure_aggregates(db: Session):
+        """
+        回填升级前数据库中的record_tags和统计汇总表
+
+        Args:
+            db: 数据库会话
+        """
+        if db.query(TestRecord.id).first() is None:
+            return
+
+        if db.query(RecordTag.id).first() is None:
+            logger.info("检测到未拆分标签的历史记录，开始回填record_tags")
+            StatisticsService.backfill_record_tags(db)
+            StatisticsService.rebuild_aggregates(db)
+            return
+
+        has_summary = db.query(TaskStatistic.id).filter(TaskStatistic.task_id == GLOBAL_SCOPE).first()
+        if has_summary is None:
+            logger.info("检测到未汇总的历史记录，开始回填统计汇总表")
+            StatisticsService.rebuild_aggregates(db)
+
+    @staticmethod
+    def get_category_classifier() -> CategoryClassifier:
+        """
+        获取标签分类器（首次调用时根据分类词典构建）
+
+        配置了CATEGORY_RULES_FILE时从该文件加载分类词典，否则使用内置的CATEGORY_RULES。
+
+        Returns:
+            分类器
+        """
+        if StatisticsService._classifier is None:
+            rules = (
+                load_category_rules(settings.CATEGORY_RULES_FILE)
+                if settings.CATEGORY_RULES_FILE
+                else StatisticsService.CATEGORY_RULES
+            )
+            StatisticsService._classifier = CategoryClassifier(rules)
+        return StatisticsService._classifier
+
+    @staticmethod
+    def _categorize_tag(tag: str) -> str:
+        """
+        判断单个标签所属分类
+
+        Args:
+            tag: 标签
+
+        Returns:
+            分类名称，未匹配时为"其他"
+        """
+        return StatisticsService.get_category_classifier().categorize(tag)
+
+    @staticmethod
+    def _analyze_categories(tag_counts: Dict[str, int]) -> List[Dict[str, Any]]:
+        """
+        分析标签分类
+
+        Args:
+            tag_counts: 标签到出现次数的映射
+
+        Returns:
+            分类分布列表
+        """
+        # 统计每个分类的标签数量，每个不同标签只分类一次
+        category_counts = StatisticsService.get_category_classifier().count(tag_counts)
 
         # 计算百分比并构建结果
-        total_tags = len(tags)
+        total_tags = sum(tag_counts.values())
         result = [
             {
                 "category": category,
@@ -0,0 +1,296 @@
+"""
+Dify标签结果缓存
+内存LRU + SQLite持久化两级缓存，按归一化评论文本和工作流标识寻址
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_comment(comment: str) -> str:
+    """
+    归一化评论文本（全角转半角、合并空白、转小写）
+
+    Args:
+        comment: 原始评论文本
+
+    Returns:
+        归一化后的文本
+    """
+    text = unicodedata.normalize("NFKC", comment)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip().lower()
+
+
+class TagCache:
+    """
+    标签结果缓存
+
+    第一级为进程内LRU，第二级为SQLite持久化表，两级都按TTL过期；
+    持久化表超过最大条目数时按最近访问时间淘汰。
+    持久化表的读写在线程池中执行，不阻塞事件循环；最近访问时间只在距上次更新
+    超过TTL的1/10时才写回，命中不会每次都提交事务。
+    """
+
+    # 每写入多少条检查一次持久化表容量
+    EVICT_CHECK_INTERVAL = 100
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        memory_size: Optional[int] = None,
+        ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        enabled: Optional[bool] = None
+    ):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite文件路径，为空则只使用内存缓存
+            memory_size: 内存LRU容量
+            ttl: 缓存有效期（秒）
+            max_entries: 持久化表最大条目数
+            enabled: 是否启用缓存
+        """
+        self.enabled = settings.TAG_CACHE_ENABLED if enabled is None else enabled
+        self.db_path = settings.TAG_CACHE_DB_PATH if db_path is None else db_path
+        self.memory_size = settings.TAG_CACHE_MEMORY_SIZE if memory_size is None else memory_size
+        self.ttl = settings.TAG_CACHE_TTL if ttl is None else ttl
+        self.max_entries = settings.TAG_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # SQLite连接在线程池中使用，同一时刻只允许一个线程访问
+        self._db_lock = threading.Lock()
+        self._writes_since_check = 0
+
+        self._counters = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0
+        }
+
+    @staticmethod
+    def make_key(comment: str, namespace: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            comment: 评论文本
+            namespace: 工作流标识（区分不同API Key/Base URL）
+
+        Returns:
+            sha256十六进制摘要
+        """
+        raw = f"{namespace}\0{normalize_comment(comment)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的结果字典，未命中返回None
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        value = None
+        if self.db_path:
+            value = await asyncio.to_thread(self._get_persistent, key, now)
+
+        with self._lock:
+            if value is not None:
+                self._counters["persistent_hits"] += 1
+                self._set_memory(key, value, now)
+                return value
+
+            self._counters["misses"] += 1
+            return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 可JSON序列化的结果字典
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._set_memory(key, value, now)
+            self._counters["writes"] += 1
+
+        if self.db_path:
+            await asyncio.to_thread(self._set_persistent, key, value, now)
+
+    def clear(self):
+        """
+        清空两级缓存
+        """
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            conn = self._get_conn()
+            if conn is not None:
+                conn.execute("DELETE FROM tag_cache")
+                conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存命中统计
+
+        Returns:
+            计数器字典
+        """
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["persistent_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                "enabled": self.enabled,
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+    def close(self):
+        """
+        关闭持久化连接
+        """
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _set_memory(self, key: str, value: Dict[str, Any], now: float):
+        """写入内存LRU并淘汰最久未使用的条目"""
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = (now + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """按需打开SQLite连接并建表"""
+        if not self.db_path:
+            return None
+        if self._conn is None:
+            try:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS tag_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_tag_cache_last_access ON tag_cache (last_access)"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"标签缓存数据库打开失败，仅使用内存缓存: {str(e)}")
+                self.db_path = None
+                self._conn = None
+        return self._conn
+
+    def _get_persistent(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        """从SQLite读取未过期的条目（在线程池中执行）"""
+        with self._db_lock:
+            conn = self._get_conn()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT value, created_at, last_access FROM tag_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] + self.ttl <= now:
+                    conn.execute("DELETE FROM tag_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                # 最近访问时间只用于容量淘汰，精度到TTL的1/10即可
+                if now - row[2] >= self.ttl / 10:
+                    conn.execute("UPDATE tag_cache SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+                return json.loads(row[0])
+            except (sqlite3.Error, json.JSONDecodeError) as e:
+                logger.warning(f"读取标签缓存失败: {str(e)}")
+                return None
+
+    def _set_persistent(self, key: str, value: Dict[str, Any], now: float):
+        """写入SQLite并按需淘汰过期和超量条目（在线程池中执行）"""
+        with self._db_lock:
+            self._write_persistent(key, value, now)
+
+    def _write_persistent(self, key: str, value: Dict[str, Any], now: float):
+        """写入SQLite，调用方需持有_db_lock"""
+        conn = self._get_conn()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO tag_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._writes_since_check += 1
+            if self._writes_since_check >= self.EVICT_CHECK_INTERVAL:
+                self._writes_since_check = 0
+                self._evict(conn, now)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"写入标签缓存失败: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，并按最近访问时间裁剪到最大条目数"""
+        expired = conn.execute(
+            "DELETE FROM tag_cache WHERE created_at <= ?", (now - self.ttl,)
+        ).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM tag_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM tag_cache WHERE key IN ("
+                "SELECT key FROM tag_cache ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+        evicted = expired + max(overflow, 0)
+        if evicted:
+            with self._lock:
+                self._counters["evictions"] += evicted
+            logger.info(f"标签缓存淘汰{evicted}条")
+
+
+# 创建全局实例
+tag_cache = TagCache()
@@ -1,12 +1,15 @@
 """
 测试业务逻辑服务
 """
+import asyncio
 import json
 from datetime import datetime
-from typing import Dict, Any
-from sqlalchemy.orm import Session
+from typing import AsyncIterator, Dict, Any, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.task import TestTask
 from app.models.record import TestRecord
+from app.services.record_writer import RecordWriter
 from app.services.dify_client import dify_client, DifyClientError
 import logging
 
@@ -18,14 +21,14 @@ class TestService:
 
     @staticmethod
     async def create_single_test(
-        db: Session,
+        db: AsyncSession,
         comment: str
     ) -> Dict[str, Any]:
         """
         创建并执行单条评论测试
 
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             comment: 用户评论文本
 
         Returns:
@@ -42,29 +45,16 @@ class TestService:
             processed_count=0
         )
         db.add(task)
-        db.flush()  # 获取task_id
+        # 先提交任务，调用Dify期间不持有写事务
+        await db.commit()
 
         try:
             # 2. 调用Dify API获取标签
             logger.info(f"开始处理单条测试，task_id={task.id}")
             dify_result = await dify_client.get_comment_tags(comment)
 
-            # 3. 创建测试记录
-            record = TestRecord(
-                task_id=task.id,
-                comment_text=comment,
-                tags_json=json.dumps(dify_result['tags'], ensure_ascii=False),
-                confidence=dify_result.get('confidence', 0.0),
-                processing_time=dify_result.get('processing_time', 0.0)
-            )
-            db.add(record)
-
-            # 4. 更新任务状态
-            task.status = "completed"
-            task.processed_count = 1
-            task.completed_at = datetime.now()
-
-            db.commit()
+            # 3. 在单独的短事务中保存测试记录并更新任务状态
+            await TestService._save_single_result(db, task, comment, dify_result)
 
             logger.info(f"单条测试完成，task_id={task.id}, tags={dify_result['tags']}")
 
@@ -76,66 +66,282 @@ class TestService:
 
         except DifyClientError as e:
             # 标记任务失败
-            task.status = "failed"
-            task.error_message = str(e)
-            db.commit()
+            await TestService._mark_failed(db, task, str(e))
 
             logger.error(f"单条测试失败，task_id={task.id}, error={str(e)}")
             raise
 
+        except asyncio.CancelledError:
+            await TestService._mark_failed(db, task, "请求已取消")
+            logger.warning(f"单条测试被取消，task_id={task.id}")
+            raise
+
         except Exception as e:
             # 回滚并标记任务失败
-            db.rollback()
-
-            # 重新查询task对象
-            task = db.query(TestTask).filter(TestTask.id == task.id).first()
-            if task:
-                task.status = "failed"
-                task.error_message = f"系统错误: {str(e)}"
-                db.commit()
+            await TestService._mark_failed(db, task, f"系统错误: {str(e)}")
 
             logger.error(f"单条测试系统错误，task_id={task.id}, error={str(e)}")
             raise
 
     @staticmethod
-    def get_task(db: Session, task_id: int) -> Dict[str, Any]:
+    async def create_single_test_stream(
+        comment: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        以流式模式执行单条评论测试，逐个产出事件
+
+        事件顺序: task -> Dify工作流事件(workflow_started/node_*/text_chunk/workflow_finished)
+        -> result 或 error。落库的TestRecord与阻塞模式完全一致。
+        生成器在响应发送期间运行，因此自行管理数据库会话。
+
+        Args:
+            comment: 用户评论文本
+
+        Yields:
+            事件字典，包含"event"字段
+        """
+        from app.database import AsyncSessionLocal
+
+        db = AsyncSessionLocal()
+        task = None
+        try:
+            task = TestTask(
+                task_type="single",
+                status="processing",
+                total_count=1,
+                processed_count=0
+            )
+            db.add(task)
+            await db.commit()
+
+            try:
+                yield {"event": "task", "task_id": task.id, "status": "processing"}
+
+                logger.info(f"开始处理单条流式测试，task_id={task.id}")
+                dify_result = None
+                async for event in dify_client.stream_comment_tags(comment):
+                    if event.get("event") == "result":
+                        dify_result = event["result"]
+                    else:
+                        yield event
+
+                await TestService._save_single_result(db, task, comment, dify_result)
+
+                logger.info(f"单条流式测试完成，task_id={task.id}, tags={dify_result['tags']}")
+
+                yield {
+                    "event": "result",
+                    "task_id": task.id,
+                    "status": "completed",
+                    "result": dify_result
+                }
+
+            except DifyClientError as e:
+                await TestService._mark_failed(db, task, str(e))
+
+                logger.error(f"单条流式测试失败，task_id={task.id}, error={str(e)}")
+                yield {"event": "error", "task_id": task.id, "status": "failed", "detail": str(e)}
+
+            except (asyncio.CancelledError, GeneratorExit):
+                # 客户端断开连接，任务不能停留在处理中
+                await TestService._mark_failed(db, task, "客户端已断开连接，处理已取消")
+                logger.warning(f"单条流式测试被客户端中断，task_id={task.id}")
+                raise
+
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"单条流式测试系统错误: {str(e)}", exc_info=True)
+            if task is not None and task.id is not None:
+                await TestService._mark_failed(db, task, f"服务器内部错误: {str(e)}")
+            yield {"event": "error", "status": "failed", "detail": f"服务器内部错误: {str(e)}"}
+
+        finally:
+            await db.close()
+
+    @staticmethod
+    async def _mark_failed(db: AsyncSession, task: TestTask, error_message: str):
+        """
+        回滚未提交的写入并将任务标记为失败
+
+        Args:
+            db: 异步数据库会话
+            task: 测试任务
+            error_message: 失败原因
+        """
+        try:
+            await db.rollback()
+            await db.refresh(task)
+            if task.status != "processing":
+                return
+            task.status = "failed"
+            task.error_message = error_message
+            await db.commit()
+        except Exception as e:
+            logger.error(f"标记任务失败时出错，task_id={task.id}, error={str(e)}")
+
+    @staticmethod
+    async def _save_single_result(
+        db: AsyncSession,
+        task: TestTask,
+        comment: str,
+        dify_result: Dict[str, Any]
+    ):
+        """
+        保存单条测试结果并将任务标记为完成
+
+        Args:
+            db: 异步数据库会话
+            task: 测试任务
+            comment: 用户评论文本
+            dify_result: Dify返回的解析结果
+        """
+        await db.run_sync(RecordWriter.insert_records, task.id, [{
+            "comment_text": comment,
+            "tags_json": json.dumps(dify_result['tags'], ensure_ascii=False),
+            "confidence": dify_result.get('confidence', 0.0),
+            "processing_time": dify_result.get('processing_time', 0.0)
+        }])
+
+        task.status = "completed"
+        task.processed_count = 1
+        task.completed_at = datetime.now()
+
+        await db.commit()
+
+    @staticmethod
+    async def get_task(
+        db: AsyncSession,
+        task_id: int,
+        include_records: bool = False
+    ) -> Dict[str, Any]:
         """
         获取任务详情
 
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             task_id: 任务ID
+            include_records: 是否附带全部记录，大批量任务应改用分页或流式接口
 
         Returns:
             任务详情字典
         """
-        task = db.query(TestTask).filter(TestTask.id == task_id).first()
+        task = await db.scalar(select(TestTask).where(TestTask.id == task_id))
         if not task:
             raise ValueError(f"任务不存在: {task_id}")
 
-        # 获取关联的测试记录
-        records = db.query(TestRecord).filter(TestRecord.task_id == task_id).all()
+        result = {"task": TestService._task_to_dict(task)}
+        if include_records:
+            # 获取关联的测试记录
+            records = (await db.scalars(
+                select(TestRecord).where(TestRecord.task_id == task_id).order_by(TestRecord.id)
+            )).all()
+            result["records"] = [TestService._record_to_dict(record) for record in records]
+
+        return result
+
+    @staticmethod
+    async def get_task_records_page(
+        db: AsyncSession,
+        task_id: int,
+        cursor: Optional[int] = None,
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        按记录ID游标分页获取任务记录
+
+        Args:
+            db: 异步数据库会话
+            task_id: 任务ID
+            cursor: 上一页最后一条记录的ID，为空时从第一条开始
+            limit: 每页条数
+
+        Returns:
+            分页结果字典，包含records、next_cursor和has_more
+
+        Raises:
+            ValueError: 任务不存在时抛出
+        """
+        exists = await db.scalar(select(TestTask.id).where(TestTask.id == task_id))
+        if not exists:
+            raise ValueError(f"任务不存在: {task_id}")
+
+        # 多取一条用于判断是否还有下一页
+        records = (await db.scalars(
+            TestService._records_after(task_id, cursor).limit(limit + 1)
+        )).all()
+        has_more = len(records) > limit
+        records = records[:limit]
 
         return {
-            "task": {
-                "id": task.id,
-                "task_type": task.task_type,
-                "status": task.status,
-                "total_count": task.total_count,
-                "processed_count": task.processed_count,
-                "created_at": task.created_at.isoformat() if task.created_at else None,
-                "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-                "error_message": task.error_message
-            },
-            "records": [
-                {
-                    "id": record.id,
-                    "comment_text": record.comment_text,
-                    "tags": json.loads(record.tags_json),
-                    "confidence": record.confidence,
-                    "processing_time": record.processing_time,
-                    "created_at": record.created_at.isoformat() if record.created_at else None
-                }
-                for record in records
-            ]
+            "task_id": task_id,
+            "records": [TestService._record_to_dict(record) for record in records],
+            "next_cursor": records[-1].id if has_more else None,
+            "has_more": has_more
+        }
+
+    @staticmethod
+    async def iter_task_records(
+        task_id: int,
+        page_size: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        按记录ID顺序逐条产出任务记录，内存占用只与page_size有关
+
+        生成器在响应发送期间运行，因此自行管理只读数据库会话。
+
+        Args:
+            task_id: 任务ID
+            page_size: 每次读取的记录数
+
+        Yields:
+            记录字典
+        """
+        from app.database import AsyncReadSessionLocal
+
+        cursor = None
+        async with AsyncReadSessionLocal() as db:
+            while True:
+                records = (await db.scalars(
+                    TestService._records_after(task_id, cursor).limit(page_size)
+                )).all()
+                if not records:
+                    return
+                for record in records:
+                    yield TestService._record_to_dict(record)
+                cursor = records[-1].id
+                # 已产出的记录不再需要保留在会话中
+                db.expunge_all()
+
+    @staticmethod
+    def _records_after(task_id: int, cursor: Optional[int]):
+        """任务记录的游标查询（按记录ID升序）"""
+        query = select(TestRecord).where(TestRecord.task_id == task_id)
+        if cursor is not None:
+            query = query.where(TestRecord.id > cursor)
+        return query.order_by(TestRecord.id)
+
+    @staticmethod
+    def _task_to_dict(task: TestTask) -> Dict[str, Any]:
+        """任务元数据"""
+        return {
+            "id": task.id,
+            "task_type": task.task_type,
+            "status": task.status,
+            "total_count": task.total_count,
+            "processed_count": task.processed_count,
+            "created_at": task.created_at.isoformat() if task.created_at else None,
+            "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+            "error_message": task.error_message
+        }
+
+    @staticmethod
+    def _record_to_dict(record: TestRecord) -> Dict[str, Any]:
+        """测试记录"""
+        return {
+            "id": record.id,
+            "comment_text": record.comment_text,
+            "tags": json.loads(record.tags_json),
+            "confidence": record.confidence,
+            "processing_time": record.processing_time,
+            "created_at": record.created_at.isoformat() if record.created_at else None
         }
@@ -0,0 +1,363 @@
+"""
+分块上传会话服务
+大文件按偏移量分块上传，每块校验SHA-256后写入暂存文件，断线后查询已接收偏移量继续上传
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional
+import aiofiles
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.upload import UploadSession
+from app.services.batch_ingest_service import BatchIngestService
+from app.services.batch_test_service import BatchTestService
+from app.utils.batch_readers import match_extension
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSessionNotFoundError(ValueError):
+    """上传会话不存在或已过期"""
+
+
+class UploadOffsetMismatchError(ValueError):
+    """分块偏移量与已接收字节数不一致"""
+    def __init__(self, expected_offset: int):
+        self.expected_offset = expected_offset
+        super().__init__(f"分块偏移量不一致，应从{expected_offset}字节处继续上传")
+
+
+class UploadSessionService:
+    """
+    分块上传会话服务
+
+    - 创建会话时登记文件名、总大小和可选的整文件SHA-256，暂存文件保留原扩展名
+    - 每个分块按偏移量追加到暂存文件，边接收边计算SHA-256，校验失败时截断回原偏移量；
+      已校验的字节数记录在数据库中，进程中断后未校验的尾部在下次写入时丢弃
+    - 完成上传后校验大小和整文件SHA-256，把暂存文件交给批量导入流程；整文件校验失败时
+      清空暂存文件并把已接收字节数归零，客户端从0字节重新上传
+    - 过期会话及其暂存文件在启动时及之后每隔UPLOAD_SESSION_CLEANUP_INTERVAL秒清理
+    """
+
+    # 每个上传会话的写入锁，同一会话的分块串行写入；没有请求持有时自动释放
+    _locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    # 定期清理过期会话的后台协程
+    _cleanup_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    async def create_session(
+        db: AsyncSession,
+        filename: str,
+        total_size: int,
+        sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        创建上传会话
+
+        Args:
+            db: 异步数据库会话
+            filename: 原始文件名
+            total_size: 文件总字节数
+            sha256: 整个文件的SHA-256（十六进制），为空则不校验整文件
+
+        Returns:
+            会话信息字典
+
+        Raises:
+            ValueError: 文件格式不支持或超过大小限制时抛出
+        """
+        extension = match_extension(filename)
+        if total_size <= 0:
+            raise ValueError("文件大小必须大于0")
+        if total_size > settings.MAX_RESUMABLE_UPLOAD_SIZE:
+            raise ValueError(
+                f"文件大小超过限制（{settings.MAX_RESUMABLE_UPLOAD_SIZE / 1024 / 1024:.0f}MB）"
+            )
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(settings.UPLOAD_DIR, f"{upload_id}{extension}")
+        # 先创建空文件，之后的分块都以追加方式写入
+        async with aiofiles.open(path, "wb"):
+            pass
+
+        session = UploadSession(
+            id=upload_id,
+            filename=filename,
+            total_size=total_size,
+            sha256=sha256.lower() if sha256 else None,
+            received_size=0,
+            path=path,
+            status="uploading",
+            expires_at=datetime.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        )
+        db.add(session)
+        await db.commit()
+
+        logger.info(f"上传会话已创建，upload_id={upload_id}, filename={filename}, 大小={total_size}")
+        return UploadSessionService._to_dict(session)
+
+    @staticmethod
+    async def get_session(db: AsyncSession, upload_id: str) -> Dict[str, Any]:
+        """
+        查询上传会话，offset为下一个分块应从的偏移量
+
+        Args:
+            db: 异步数据库会话
+            upload_id: 上传ID
+
+        Returns:
+            会话信息字典
+
+        Raises:
+            UploadSessionNotFoundError: 会话不存在或已过期时抛出
+        """
+        return UploadSessionService._to_dict(await UploadSessionService._load(db, upload_id))
+
+    @staticmethod
+    async def write_chunk(
+        db: AsyncSession,
+        upload_id: str,
+        offset: int,
+        sha256: str,
+        body: AsyncIterator[bytes]
+    ) -> Dict[str, Any]:
+        """
+        写入一个分块
+
+        Args:
+            db: 异步数据库会话
+            upload_id: 上传ID
+            offset: 分块在文件中的起始偏移量，必须等于已接收字节数
+            sha256: 分块内容的SHA-256（十六进制）
+            body: 分块内容的字节流
+
+        Returns:
+            写入后的会话信息字典
+
+        Raises:
+            UploadSessionNotFoundError: 会话不存在或已过期时抛出
+            UploadOffsetMismatchError: 偏移量与已接收字节数不一致时抛出
+            ValueError: 会话已完成、分块过大、超出文件总大小或校验失败时抛出
+        """
+        lock = UploadSessionService._lock(upload_id)
+        async with lock:
+            session = await UploadSessionService._load(db, upload_id)
+            if session.status != "uploading":
+                raise ValueError("上传已完成，不能继续写入分块")
+            if offset != session.received_size:
+                raise UploadOffsetMismatchError(session.received_size)
+
+            # 丢弃上次中断留下的未校验数据
+            await asyncio.to_thread(os.truncate, session.path, offset)
+
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                async with aiofiles.open(session.path, "ab") as f:
+                    async for data in body:
+                        size += len(data)
+                        if size > settings.UPLOAD_CHUNK_MAX_SIZE:
+                            raise ValueError(
+                                f"分块大小超过限制（{settings.UPLOAD_CHUNK_MAX_SIZE / 1024 / 1024:.0f}MB）"
+                            )
+                        if offset + size > session.total_size:
+                            raise ValueError("分块超出文件总大小")
+                        digest.update(data)
+                        await f.write(data)
+                    await f.flush()
+                    await asyncio.to_thread(os.fsync, f.fileno())
+
+                if size == 0:
+                    raise ValueError("分块内容为空")
+                if digest.hexdigest() != sha256.lower():
+                    raise ValueError("分块SHA-256校验失败，请重新上传该分块")
+            except BaseException:
+                await asyncio.to_thread(os.truncate, session.path, offset)
+                raise
+
+            session.received_size = offset + size
+            session.expires_at = datetime.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+            await db.commit()
+
+            logger.debug(f"分块写入成功，upload_id={upload_id}, 偏移量={offset}, 大小={size}")
+            return UploadSessionService._to_dict(session)
+
+    @staticmethod
+    async def complete(db: AsyncSession, upload_id: str) -> Dict[str, Any]:
+        """
+        完成上传，校验文件后创建批量任务
+
+        重复调用时返回已创建的任务，便于客户端在响应丢失后重试。
+
+        Args:
+            db: 异步数据库会话
+            upload_id: 上传ID
+
+        Returns:
+            任务信息字典（task_id, total_count, ingesting）
+
+        Raises:
+            UploadSessionNotFoundError: 会话不存在或已过期时抛出
+            ValueError: 文件未上传完整、校验失败、格式错误或没有有效评论时抛出；
+                整文件校验失败时已接收字节数归零
+        """
+        lock = UploadSessionService._lock(upload_id)
+        async with lock:
+            session = await UploadSessionService._load(db, upload_id)
+            if session.status == "completed":
+                progress = await BatchTestService.get_batch_progress(db, session.task_id)
+                return {
+                    "task_id": session.task_id,
+                    "total_count": progress["total_count"],
+                    "ingesting": progress["ingesting"]
+                }
+
+            if session.received_size != session.total_size:
+                raise ValueError(
+                    f"文件未上传完整，已接收{session.received_size}/{session.total_size}字节"
+                )
+            if session.sha256:
+                actual = await asyncio.to_thread(UploadSessionService._file_sha256, session.path)
+                if actual != session.sha256:
+                    # 无法定位损坏的分块，清空已上传内容，会话保留供从头重传
+                    await asyncio.to_thread(os.truncate, session.path, 0)
+                    session.received_size = 0
+                    session.expires_at = datetime.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+                    await db.commit()
+                    raise ValueError("文件SHA-256校验失败，已清空已上传内容，请从0字节重新上传")
+
+            # 暂存文件交给导入流程，之后由导入流程负责删除
+            try:
+                result = await BatchIngestService.start_ingest(db, session.path)
+            except ValueError:
+                await UploadSessionService._remove(db, session)
+                raise
+
+            session.status = "completed"
+            session.task_id = result["task_id"]
+            session.expires_at = datetime.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+            await db.commit()
+
+        logger.info(f"分块上传完成，upload_id={upload_id}, task_id={result['task_id']}")
+        return result
+
+    @staticmethod
+    async def start():
+        """
+        清理过期会话并启动定期清理（应用启动时调用）
+        """
+        await UploadSessionService.cleanup_expired()
+        if UploadSessionService._cleanup_task is None:
+            UploadSessionService._cleanup_task = asyncio.ensure_future(
+                UploadSessionService._cleanup_periodically()
+            )
+
+    @staticmethod
+    async def stop():
+        """
+        停止定期清理（应用关闭时调用）
+        """
+        task = UploadSessionService._cleanup_task
+        UploadSessionService._cleanup_task = None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    @staticmethod
+    async def cleanup_expired() -> int:
+        """
+        删除过期的上传会话及未完成的暂存文件
+
+        Returns:
+            删除的会话数
+        """
+        from app.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            sessions = [
+                session for session in (await db.execute(
+                    select(UploadSession).where(UploadSession.expires_at < datetime.now())
+                )).scalars().all()
+                # 正在写入分块或完成上传的会话留到下次清理
+                if not UploadSessionService._is_busy(session.id)
+            ]
+            for session in sessions:
+                if session.status == "uploading":
+                    BatchIngestService._remove_file(session.path)
+            if sessions:
+                await db.execute(
+                    delete(UploadSession).where(UploadSession.id.in_([s.id for s in sessions]))
+                )
+                await db.commit()
+                logger.info(f"清理{len(sessions)}个过期的上传会话")
+            return len(sessions)
+
+    @staticmethod
+    async def _cleanup_periodically():
+        """按间隔清理过期会话，单次失败不影响后续清理"""
+        while True:
+            await asyncio.sleep(settings.UPLOAD_SESSION_CLEANUP_INTERVAL)
+            try:
+                await UploadSessionService.cleanup_expired()
+            except Exception as e:
+                logger.error(f"清理过期上传会话失败: {str(e)}", exc_info=True)
+
+    @staticmethod
+    def _lock(upload_id: str) -> asyncio.Lock:
+        """获取上传会话的写入锁"""
+        lock = UploadSessionService._locks.get(upload_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            UploadSessionService._locks[upload_id] = lock
+        return lock
+
+    @staticmethod
+    def _is_busy(upload_id: str) -> bool:
+        """上传会话是否有请求正在处理"""
+        lock = UploadSessionService._locks.get(upload_id)
+        return lock is not None and lock.locked()
+
+    @staticmethod
+    async def _load(db: AsyncSession, upload_id: str) -> UploadSession:
+        """读取未过期的上传会话"""
+        session = await db.get(UploadSession, upload_id)
+        if session is None or (session.status == "uploading" and session.expires_at < datetime.now()):
+            raise UploadSessionNotFoundError(f"上传会话不存在或已过期: {upload_id}")
+        return session
+
+    @staticmethod
+    async def _remove(db: AsyncSession, session: UploadSession):
+        """删除上传会话（暂存文件已由导入流程删除）"""
+        await db.delete(session)
+        await db.commit()
+        UploadSessionService._locks.pop(session.id, None)
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        """按块计算文件的SHA-256"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(BatchIngestService.SPOOL_CHUNK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _to_dict(session: UploadSession) -> Dict[str, Any]:
+        """会话信息"""
+        return {
+            "upload_id": session.id,
+            "filename": session.filename,
+            "total_size": session.total_size,
+            "offset": session.received_size,
+            "status": session.status,
+            "chunk_size": settings.UPLOAD_CHUNK_MAX_SIZE,
+            "task_id": session.task_id
+        }
@@ -0,0 +1,411 @@
+"""
+批量上传文件读取工具
+按扩展名选择读取器，支持CSV、JSONL、Excel、Parquet及其gzip/zip压缩文件
+
+所有读取器遵循同一约定：
+- open_comment_column()只读取表头（或首条记录、文件元数据）并识别评论列
+- iter_comment_chunks()按块流式读取评论列，产出(本块数据行数, 本块有效评论列表)，
+  skip_rows按数据行跳过开头部分，用于中断后继续读取
+- 文件损坏、格式错误或缺少可选依赖时统一抛出ValueError
+"""
+import gzip
+import inspect
+import io
+import json
+import logging
+import os
+import zipfile
+from abc import ABC, abstractmethod
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Type
+from app.utils.csv_parser import CSVParser
+
+logger = logging.getLogger(__name__)
+
+
+class BatchFileReader(ABC):
+    """
+    批量文件读取器基类
+
+    子类声明EXTENSIONS，实现_read_columns()和_iter_values()；
+    跳过已读取行、清洗空评论等公共逻辑由基类完成。
+    """
+
+    # 支持的扩展名（小写，含点）
+    EXTENSIONS: Tuple[str, ...] = ()
+
+    # 格式名称，用于错误提示
+    FORMAT_NAME = ""
+
+    def __init__(self, opener: Callable[[], BinaryIO], name: str):
+        """
+        初始化读取器
+
+        Args:
+            opener: 每次调用返回一个新的二进制文件对象
+            name: 文件名（压缩包内为成员文件名），用于日志
+        """
+        self._open = opener
+        self.name = name
+
+    def open_comment_column(self) -> str:
+        """
+        识别评论列
+
+        Returns:
+            评论列名
+
+        Raises:
+            ValueError: 文件为空、格式错误或未找到评论列时抛出
+        """
+        try:
+            columns = [str(col) for col in self._read_columns() if col is not None]
+        except (OSError, EOFError, zipfile.BadZipFile) as e:
+            raise ValueError(f"{self.FORMAT_NAME}文件读取失败: {str(e)}")
+
+        logger.info(f"{self.FORMAT_NAME}文件列名: {columns}, 文件: {self.name}")
+
+        comment_col = CSVParser._identify_comment_column(columns)
+        if not comment_col:
+            raise ValueError(
+                f"{self.FORMAT_NAME}文件中未找到评论列。支持的列名: {', '.join(CSVParser.COMMENT_COLUMNS)}"
+            )
+        return comment_col
+
+    def iter_comment_chunks(
+        self,
+        comment_col: str,
+        chunk_rows: int = 5000,
+        skip_rows: int = 0
+    ) -> Iterator[Tuple[int, List[str]]]:
+        """
+        分块读取评论列，内存占用只与chunk_rows有关
+
+        Args:
+            comment_col: 评论列名
+            chunk_rows: 每块的数据行数
+            skip_rows: 跳过开头的数据行数
+
+        Yields:
+            (本块数据行数, 本块有效评论列表)
+
+        Raises:
+            ValueError: 文件格式错误时抛出
+        """
+        try:
+            for values in self._iter_values(comment_col, max(1, chunk_rows)):
+                if skip_rows >= len(values):
+                    skip_rows -= len(values)
+                    continue
+                values = values[skip_rows:]
+                skip_rows = 0
+                yield len(values), CSVParser._clean_comments(values)
+        except (OSError, EOFError, zipfile.BadZipFile) as e:
+            raise ValueError(f"{self.FORMAT_NAME}文件读取失败: {str(e)}")
+
+    @abstractmethod
+    def _read_columns(self) -> List[Any]:
+        """读取列名"""
+
+    @abstractmethod
+    def _iter_values(self, comment_col: str, chunk_rows: int) -> Iterator[List[Any]]:
+        """按块产出评论列的原始值，每块最多chunk_rows个"""
+
+    @staticmethod
+    def _rechunk(batches: Iterator[List[Any]], chunk_rows: int) -> Iterator[List[Any]]:
+        """把任意大小的值列表重新切分为chunk_rows一块"""
+        buffer: List[Any] = []
+        for batch in batches:
+            buffer.extend(batch)
+            while len(buffer) >= chunk_rows:
+                yield buffer[:chunk_rows]
+                buffer = buffer[chunk_rows:]
+        if buffer:
+            yield buffer
+
+    @staticmethod
+    def _to_text(value: Any) -> Optional[str]:
+        """非字符串的评论值（数字、日期等）按文本处理"""
+        if value is None or isinstance(value, str):
+            return value
+        return str(value)
+
+
+# 扩展名到读取器的注册表
+_READERS: Dict[str, Type[BatchFileReader]] = {}
+
+# 支持的压缩格式
+COMPRESSION_EXTENSIONS = (".gz", ".zip")
+
+
+def register_reader(reader_cls: Type[BatchFileReader]) -> Type[BatchFileReader]:
+    """
+    注册读取器（可用作类装饰器）
+
+    Args:
+        reader_cls: 读取器类
+
+    Returns:
+        读取器类
+
+    Raises:
+        TypeError: 读取器未实现全部抽象方法时抛出
+    """
+    if inspect.isabstract(reader_cls):
+        missing = ", ".join(sorted(reader_cls.__abstractmethods__))
+        raise TypeError(f"读取器{reader_cls.__name__}未实现: {missing}")
+    for extension in reader_cls.EXTENSIONS:
+        _READERS[extension] = reader_cls
+    return reader_cls
+
+
+@register_reader
+class CSVReader(BatchFileReader):
+    """CSV读取器，解析委托给CSVParser（编码识别、只解析评论列）"""
+
+    EXTENSIONS = (".csv",)
+    FORMAT_NAME = "CSV"
+
+    def __init__(self, opener: Callable[[], BinaryIO], name: str):
+        super().__init__(opener, name)
+        self.encoding: Optional[str] = None
+
+    def _read_columns(self) -> List[Any]:
+        with self._open() as f:
+            self.encoding = CSVParser.detect_encoding(f.read(CSVParser.ENCODING_SAMPLE_SIZE))
+        with self._open() as f:
+            return CSVParser.read_columns(f, self.encoding)
+
+    def _iter_values(self, comment_col: str, chunk_rows: int) -> Iterator[List[Any]]:
+        if self.encoding is None:
+            with self._open() as f:
+                self.encoding = CSVParser.detect_encoding(f.read(CSVParser.ENCODING_SAMPLE_SIZE))
+        with self._open() as f:
+            yield from CSVParser.iter_comment_values(f, comment_col, chunk_rows, self.encoding)
+
+
+@register_reader
+class JSONLReader(BatchFileReader):
+    """JSON Lines读取器，每行一个JSON对象，空行忽略"""
+
+    EXTENSIONS = (".jsonl", ".ndjson")
+    FORMAT_NAME = "JSONL"
+
+    def _read_columns(self) -> List[Any]:
+        for _, record in self._iter_records():
+            return list(record.keys())
+        raise ValueError("JSONL文件为空")
+
+    def _iter_values(self, comment_col: str, chunk_rows: int) -> Iterator[List[Any]]:
+        values: List[Any] = []
+        for _, record in self._iter_records():
+            values.append(self._to_text(record.get(comment_col)))
+            if len(values) >= chunk_rows:
+                yield values
+                values = []
+        if values:
+            yield values
+
+    def _iter_records(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """逐行解析JSON对象"""
+        with self._open() as f:
+            encoding = CSVParser.detect_encoding(f.read(CSVParser.ENCODING_SAMPLE_SIZE))
+        with self._open() as f:
+            text = io.TextIOWrapper(f, encoding=encoding)
+            for line_no, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"JSONL文件第{line_no}行格式错误: {str(e)}")
+                if not isinstance(record, dict):
+                    raise ValueError(f"JSONL文件第{line_no}行不是JSON对象")
+                yield line_no, record
+
+
+@register_reader
+class ExcelReader(BatchFileReader):
+    """Excel读取器，只读模式逐行读取第一个工作表，首行为表头"""
+
+    EXTENSIONS = (".xlsx",)
+    FORMAT_NAME = "Excel"
+
+    def _read_columns(self) -> List[Any]:
+        with self._open() as f:
+            workbook = self._load_workbook(f)
+            try:
+                for row in workbook.active.iter_rows(max_row=1, values_only=True):
+                    return list(row)
+            finally:
+                workbook.close()
+        raise ValueError("Excel文件为空")
+
+    def _iter_values(self, comment_col: str, chunk_rows: int) -> Iterator[List[Any]]:
+        with self._open() as f:
+            workbook = self._load_workbook(f)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = [str(col) if col is not None else None for col in next(rows, ())]
+                index = header.index(comment_col)
+
+                values: List[Any] = []
+                for row in rows:
+                    values.append(self._to_text(row[index]) if index < len(row) else None)
+                    if len(values) >= chunk_rows:
+                        yield values
+                        values = []
+                if values:
+                    yield values
+            finally:
+                workbook.close()
+
+    @staticmethod
+    def _load_workbook(f: BinaryIO):
+        """
+        以只读模式打开工作簿
+
+        Raises:
+            ValueError: 未安装openpyxl或文件不是有效的xlsx时抛出
+        """
+        try:
+            import openpyxl
+            from openpyxl.utils.exceptions import InvalidFileException
+        except ImportError:
+            raise ValueError("读取Excel文件需要安装openpyxl: pip install openpyxl")
+        try:
+            return openpyxl.load_workbook(f, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, KeyError, InvalidFileException) as e:
+            raise ValueError(f"Excel文件格式错误: {str(e)}")
+
+
+@register_reader
+class ParquetReader(BatchFileReader):
+    """Parquet读取器，只读取评论列，按row group分批解码"""
+
+    EXTENSIONS = (".parquet",)
+    FORMAT_NAME = "Parquet"
+
+    def _read_columns(self) -> List[Any]:
+        with self._open() as f:
+            return list(self._parquet_file(f).schema_arrow.names)
+
+    def _iter_values(self, comment_col: str, chunk_rows: int) -> Iterator[List[Any]]:
+        with self._open() as f:
+            parquet_file = self._parquet_file(f)
+            batches = (
+                [self._to_text(value) for value in batch.column(0).to_pylist()]
+                for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=[comment_col])
+            )
+            yield from self._rechunk(batches, chunk_rows)
+
+    @staticmethod
+    def _parquet_file(f: BinaryIO):
+        """
+        打开Parquet文件（只读取元数据）
+
+        Raises:
+            ValueError: 未安装pyarrow或文件不是有效的Parquet时抛出
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("读取Parquet文件需要安装pyarrow: pip install pyarrow")
+        try:
+            return pyarrow.parquet.ParquetFile(f)
+        except pyarrow.ArrowException as e:
+            raise ValueError(f"Parquet文件格式错误: {str(e)}")
+
+
+def supported_extensions() -> List[str]:
+    """
+    支持上传的扩展名
+
+    Returns:
+        扩展名列表，包含压缩格式
+    """
+    return sorted(_READERS) + list(COMPRESSION_EXTENSIONS)
+
+
+def match_extension(filename: str) -> str:
+    """
+    识别文件扩展名，压缩文件保留内层扩展名（如.jsonl.gz）
+
+    Args:
+        filename: 文件名
+
+    Returns:
+        小写扩展名
+
+    Raises:
+        ValueError: 扩展名不支持时抛出
+    """
+    name = (filename or "").lower()
+    base, extension = os.path.splitext(name)
+    if extension == ".gz":
+        inner = os.path.splitext(base)[1]
+        if inner in _READERS:
+            return inner + extension
+    elif extension == ".zip" or extension in _READERS:
+        return extension
+    raise ValueError(f"不支持的文件格式，支持: {', '.join(supported_extensions())}")
+
+
+def open_reader(path: str, filename: Optional[str] = None) -> BatchFileReader:
+    """
+    按扩展名创建读取器
+
+    Args:
+        path: 文件路径
+        filename: 原始文件名，缺省使用path
+
+    Returns:
+        读取器
+
+    Raises:
+        ValueError: 扩展名不支持或压缩包内容不符合要求时抛出
+    """
+    name = filename or os.path.basename(path)
+    extension = match_extension(name)
+
+    if extension.endswith(".gz"):
+        inner = extension[:-len(".gz")]
+        return _READERS[inner](lambda: gzip.open(path, "rb"), name)
+
+    if extension == ".zip":
+        member = _zip_member(path)
+        return _READERS[match_extension(member)](lambda: _open_zip_member(path, member), member)
+
+    return _READERS[extension](lambda: open(path, "rb"), name)
+
+
+def _zip_member(path: str) -> str:
+    """
+    找出zip包中唯一的数据文件
+
+    Raises:
+        ValueError: zip包损坏、没有或有多个数据文件时抛出
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = [
+                info.filename for info in archive.infolist()
+                if not info.is_dir()
+                and not os.path.basename(info.filename).startswith(".")
+                and not info.filename.startswith("__MACOSX/")
+            ]
+    except (OSError, zipfile.BadZipFile) as e:
+        raise ValueError(f"zip文件读取失败: {str(e)}")
+
+    members = [name for name in names if os.path.splitext(name.lower())[1] in _READERS]
+    if not members:
+        raise ValueError(f"zip文件中没有支持的数据文件，支持: {', '.join(sorted(_READERS))}")
+    if len(members) > 1:
+        raise ValueError(f"zip文件中只能包含一个数据文件，实际包含: {', '.join(members)}")
+    return members[0]
+
+
+def _open_zip_member(path: str, member: str) -> BinaryIO:
+    """打开zip包中的成员文件，返回的文件对象关闭时释放zip包"""
+    with zipfile.ZipFile(path) as archive:
+        return archive.open(member)
@@ -0,0 +1,111 @@
+"""
+标签分类工具
+根据分类词典把标签归入分类，词典可通过配置文件加载
+"""
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, List
+from app.utils.keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+# 未命中任何关键词时的兜底分类
+FALLBACK_CATEGORY = "其他"
+
+
+def load_category_rules(path: str) -> Dict[str, List[str]]:
+    """
+    从JSON文件加载分类词典
+
+    文件内容为 {"分类": ["关键词", ...], ...}，分类按书写顺序匹配。
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        分类到关键词列表的有序映射
+
+    Raises:
+        ValueError: 文件不存在或格式错误时抛出
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"加载分类词典失败: {path}, {str(e)}")
+
+    if not isinstance(rules, dict) or not rules:
+        raise ValueError(f"分类词典格式错误，应为非空对象: {path}")
+    for category, keywords in rules.items():
+        if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+            raise ValueError(f"分类词典格式错误，分类\"{category}\"的关键词应为字符串列表: {path}")
+
+    logger.info(f"已加载分类词典: {path}, 分类数={len(rules)}")
+    return rules
+
+
+class CategoryClassifier:
+    """
+    标签分类器
+
+    分类词典在构建时编译为一个关键词自动机，每个标签只扫描一次；
+    命中多个分类时取词典中靠前的分类，与逐个分类做子串判断的结果一致。
+    同一标签的分类结果会被缓存，重复标签不再扫描。
+    """
+
+    def __init__(
+        self,
+        rules: Dict[str, List[str]],
+        fallback: str = FALLBACK_CATEGORY,
+        memo_size: int = 100000
+    ):
+        """
+        构建分类器
+
+        Args:
+            rules: 分类到关键词列表的有序映射
+            fallback: 兜底分类
+            memo_size: 分类结果缓存的最大标签数
+        """
+        self.fallback = fallback
+        self.categories: List[str] = list(rules.keys())
+        if fallback not in rules:
+            self.categories.append(fallback)
+
+        # 关键词关联分类的顺序号，命中时取最小值即为最靠前的分类
+        self._matcher = KeywordMatcher(
+            (keyword, index)
+            for index, (category, keywords) in enumerate(rules.items())
+            if category != fallback
+            for keyword in keywords
+        )
+        self.categorize = lru_cache(maxsize=memo_size)(self._categorize)
+
+    def _categorize(self, tag: str) -> str:
+        """
+        判断单个标签所属分类
+
+        Args:
+            tag: 标签
+
+        Returns:
+            分类名称，未匹配时为兜底分类
+        """
+        best = min(self._matcher.iter_matches(tag), default=None)
+        return self.fallback if best is None else self.categories[best]
+
+    def count(self, tag_counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        按分类累加标签出现次数
+
+        Args:
+            tag_counts: 标签到出现次数的映射
+
+        Returns:
+            分类到出现次数的映射，包含全部分类
+        """
+        category_counts = {category: 0 for category in self.categories}
+        for tag, count in tag_counts.items():
+            category_counts[self.categorize(tag)] += count
+        return category_counts
@@ -0,0 +1,165 @@
+"""
+熔断器工具
+"""
+import logging
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    - closed: 正常放行，连续失败达到阈值后转为open
+    - open: 直接拒绝请求，等待恢复时间后转为half_open
+    - half_open: 放行少量试探请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        recovery_timeout: float,
+        half_open_max_calls: int = 1,
+        name: str = "circuit"
+    ):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断，小于等于0表示禁用
+            recovery_timeout: 熔断后多久进入半开状态（秒）
+            half_open_max_calls: 半开状态下允许的试探请求数
+            name: 名称，用于日志
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.name = name
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_started = 0.0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._counters = {
+            "opened": 0,
+            "rejected": 0
+        }
+
+    @property
+    def state(self) -> str:
+        """当前状态（open状态到期时自动视为half_open）"""
+        if self._state == self.OPEN and self._open_remaining() <= 0:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        判断是否放行请求
+
+        Returns:
+            是否放行
+        """
+        if self.failure_threshold <= 0:
+            return True
+
+        now = time.monotonic()
+
+        if self._state == self.OPEN:
+            if self._open_remaining(now) > 0:
+                self._counters["rejected"] += 1
+                return False
+            self._transition(self.HALF_OPEN, now)
+
+        if self._state == self.HALF_OPEN:
+            # 试探请求未返回结果（如被取消）时，超过恢复时间重新开放试探名额
+            if now - self._half_open_started >= self.recovery_timeout:
+                self._half_open_started = now
+                self._half_open_calls = 0
+            if self._half_open_calls >= self.half_open_max_calls:
+                self._counters["rejected"] += 1
+                return False
+            self._half_open_calls += 1
+
+        return True
+
+    def record_success(self):
+        """
+        记录一次成功调用
+        """
+        self._consecutive_failures = 0
+        if self._state == self.HALF_OPEN:
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.half_open_max_calls:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        """
+        记录一次失败调用
+        """
+        if self.failure_threshold <= 0:
+            return
+
+        self._consecutive_failures += 1
+        if self._state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+        elif self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+            self._transition(self.OPEN)
+
+    def retry_after(self) -> float:
+        """
+        距离可以再次尝试的秒数
+
+        Returns:
+            秒数，非open状态返回0
+        """
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self._open_remaining())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取熔断器状态
+
+        Returns:
+            状态字典
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "retry_after": round(self.retry_after(), 2),
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout": self.recovery_timeout,
+            **self._counters
+        }
+
+    def _open_remaining(self, now: Optional[float] = None) -> float:
+        """open状态剩余时间"""
+        now = time.monotonic() if now is None else now
+        return self._opened_at + self.recovery_timeout - now
+
+    def _transition(self, state: str, now: Optional[float] = None):
+        """切换状态"""
+        now = time.monotonic() if now is None else now
+        previous = self._state
+        self._state = state
+
+        if state == self.OPEN:
+            self._opened_at = now
+            self._counters["opened"] += 1
+            logger.error(f"{self.name}熔断器打开，{self.recovery_timeout}秒内快速失败")
+        elif state == self.HALF_OPEN:
+            self._half_open_started = now
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+            logger.warning(f"{self.name}熔断器进入半开状态，开始试探")
+        elif state == self.CLOSED:
+            self._consecutive_failures = 0
+            logger.info(f"{self.name}熔断器关闭（{previous} -> closed）")
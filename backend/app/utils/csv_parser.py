@@ -2,8 +2,8 @@
 CSV文件解析工具
 """
 import pandas as pd
-import io
-from typing import List, Tuple, Optional
+import codecs
+from typing import Any, BinaryIO, Iterator, List, Tuple, Optional, Union
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,111 +15,258 @@ class CSVParser:
     # 支持的评论列名
     COMMENT_COLUMNS = ['评论', 'comment', 'content', 'text', 'pinglun', '评论内容', '用户评论']
 
-    # 最大文件大小（10MB）
-    MAX_FILE_SIZE = 10 * 1024 * 1024
+    # 识别编码时读取的文件开头字节数
+    ENCODING_SAMPLE_SIZE = 64 * 1024
 
-    # 最大评论数量
-    MAX_COMMENTS = 1000
+    # 无BOM时依次尝试的编码，GB18030兼容GBK/GB2312
+    CANDIDATE_ENCODINGS = ["utf-8", "gb18030"]
 
     @staticmethod
-    def parse_csv_file(
-        file_content: bytes,
-        filename: str
-    ) -> Tuple[List[str], dict]:
+    def detect_encoding(sample: bytes) -> str:
         """
-        解析CSV文件，提取评论内容
+        根据文件开头的字节样本识别编码
+
+        依次判断BOM、UTF-8、GB18030（兼容GBK/GB2312）；样本末尾被截断的多字节字符不影响判断。
 
         Args:
-            file_content: CSV文件内容（bytes）
-            filename: 文件名
+            sample: 文件开头的字节
 
         Returns:
-            (评论列表, 文件信息字典)
+            编码名称
 
         Raises:
-            ValueError: 文件格式或内容不符合要求时抛出
+            ValueError: 无法识别编码时抛出
         """
-        # 检查文件大小
-        file_size = len(file_content)
-        if file_size > CSVParser.MAX_FILE_SIZE:
-            raise ValueError(f"文件大小超过限制（{CSVParser.MAX_FILE_SIZE / 1024 / 1024}MB）")
+        if sample.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return "utf-16"
 
-        # 检查文件扩展名
-        if not filename.lower().endswith('.csv'):
-            raise ValueError("只支持CSV文件格式")
+        for encoding in CSVParser.CANDIDATE_ENCODINGS:
+            try:
+                codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+                return encoding
+            except UnicodeDecodeError:
+                continue
 
-        try:
-            # 读取CSV文件
-            df = pd.read_csv(io.BytesIO(file_content))
+        raise ValueError(f"无法识别文件编码，请使用{'或'.join(CSVParser.CANDIDATE_ENCODINGS)}编码保存")
 
-            logger.info(f"CSV文件读取成功，列名: {df.columns.tolist()}")
+    @staticmethod
+    def iter_comment_chunks(
+        source: Union[str, BinaryIO],
+        comment_col: str,
+        chunk_rows: int = 5000,
+        skip_rows: int = 0,
+        encoding: str = "utf-8"
+    ) -> Iterator[Tuple[int, List[str]]]:
+        """
+        分块读取CSV文件的评论列，内存占用只与chunk_rows有关
 
-            # 自动识别评论列
-            comment_col = CSVParser._identify_comment_column(df)
+        安装了pyarrow时使用其多线程的列式解析器，只转换评论列；否则使用pandas按块读取。
 
-            if not comment_col:
-                raise ValueError(
-                    f"CSV文件中未找到评论列。支持的列名: {', '.join(CSVParser.COMMENT_COLUMNS)}"
-                )
+        Args:
+            source: 文件路径或二进制文件对象
+            comment_col: 评论列名
+            chunk_rows: 每块的文件数据行数
+            skip_rows: 跳过开头的文件数据行数（按解析后的行计算，含换行的引号字段算一行）
+            encoding: 文件编码
+
+        Yields:
+            (本块文件数据行数, 本块有效评论列表)
+
+        Raises:
+            ValueError: 文件格式错误时抛出
+        """
+        values = CSVParser.iter_comment_values(source, comment_col, chunk_rows, encoding)
+        for chunk in values:
+            if skip_rows >= len(chunk):
+                skip_rows -= len(chunk)
+                continue
+            chunk = chunk[skip_rows:]
+            skip_rows = 0
+            yield len(chunk), CSVParser._clean_comments(chunk)
+
+    @staticmethod
+    def iter_comment_values(
+        source: Union[str, BinaryIO],
+        comment_col: str,
+        chunk_rows: int,
+        encoding: str
+    ) -> Iterator[List[Any]]:
+        """
+        分块读取评论列的原始值（未清洗空评论）
 
-            # 提取评论
-            comments = df[comment_col].dropna().tolist()
+        安装了pyarrow时使用其多线程的列式解析器，只转换评论列；否则使用pandas按块读取。
 
-            # 过滤空字符串
-            comments = [c.strip() for c in comments if c and c.strip()]
+        Args:
+            source: 文件路径或二进制文件对象
+            comment_col: 评论列名
+            chunk_rows: 每块的文件数据行数
+            encoding: 文件编码
 
-            # 检查评论数量
-            if len(comments) == 0:
-                raise ValueError("CSV文件中没有有效的评论数据")
+        Yields:
+            本块评论列的原始值列表
 
-            if len(comments) > CSVParser.MAX_COMMENTS:
-                raise ValueError(f"评论数量超过限制（最多{CSVParser.MAX_COMMENTS}条）")
+        Raises:
+            ValueError: 文件格式错误时抛出
+        """
+        chunk_rows = max(1, chunk_rows)
+        pyarrow = CSVParser._import_pyarrow_csv()
+        if pyarrow is not None:
+            return CSVParser._iter_arrow_values(pyarrow, source, comment_col, chunk_rows, encoding)
+        return CSVParser._iter_pandas_values(source, comment_col, chunk_rows, encoding)
 
-            file_info = {
-                'filename': filename,
-                'size': file_size,
-                'total_rows': len(df),
-                'valid_comments': len(comments),
-                'comment_column': comment_col
-            }
+    @staticmethod
+    def _iter_arrow_values(
+        pyarrow: Any,
+        source: Union[str, BinaryIO],
+        comment_col: str,
+        chunk_rows: int,
+        encoding: str
+    ) -> Iterator[List[Any]]:
+        """使用pyarrow流式解析评论列，按chunk_rows重新分块"""
+        pa, pacsv = pyarrow
+        try:
+            reader = pacsv.open_csv(
+                source,
+                # pyarrow原生解析UTF-8（自动跳过BOM），其他编码在读取时转码
+                read_options=pacsv.ReadOptions(
+                    encoding="utf8" if encoding in ("utf-8", "utf-8-sig") else encoding
+                ),
+                parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=[comment_col],
+                    column_types={comment_col: pa.string()},
+                    strings_can_be_null=True
+                )
+            )
+            buffer: List[Any] = []
+            for batch in reader:
+                buffer.extend(batch.column(0).to_pylist())
+                while len(buffer) >= chunk_rows:
+                    yield buffer[:chunk_rows]
+                    buffer = buffer[chunk_rows:]
+            if buffer:
+                yield buffer
+        except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+            raise ValueError(f"CSV文件格式错误: {str(e)}")
+
+    @staticmethod
+    def _iter_pandas_values(
+        source: Union[str, BinaryIO],
+        comment_col: str,
+        chunk_rows: int,
+        encoding: str
+    ) -> Iterator[List[Any]]:
+        """使用pandas按块解析评论列"""
+        try:
+            reader = pd.read_csv(
+                source,
+                usecols=[comment_col],
+                dtype={comment_col: str},
+                encoding=encoding,
+                chunksize=chunk_rows
+            )
+            with reader:
+                for chunk in reader:
+                    yield chunk[comment_col].tolist()
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            raise ValueError(f"CSV文件格式错误: {str(e)}")
+
+    @staticmethod
+    def read_columns(source: Union[str, BinaryIO], encoding: str) -> List[str]:
+        """
+        只读取表头
 
-            logger.info(f"CSV解析成功: {file_info}")
+        Args:
+            source: 文件路径或二进制文件对象
+            encoding: 文件编码
 
-            return comments, file_info
+        Returns:
+            列名列表
 
+        Raises:
+            ValueError: 文件为空或格式错误时抛出
+        """
+        try:
+            header = pd.read_csv(source, nrows=0, encoding=encoding)
         except pd.errors.EmptyDataError:
             raise ValueError("CSV文件为空")
-        except pd.errors.ParserError as e:
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
             raise ValueError(f"CSV文件格式错误: {str(e)}")
-        except Exception as e:
-            logger.error(f"CSV解析失败: {str(e)}")
-            raise ValueError(f"CSV解析失败: {str(e)}")
+
+        columns = [str(col) for col in header.columns]
+        logger.info(f"CSV表头读取成功，编码: {encoding}，列名: {columns}")
+        return columns
+
+    @staticmethod
+    def read_comment_column(source: Union[str, BinaryIO], encoding: str) -> str:
+        """
+        只读取表头并识别评论列
+
+        Args:
+            source: 文件路径或二进制文件对象
+            encoding: 文件编码
+
+        Returns:
+            评论列名
+
+        Raises:
+            ValueError: 文件为空、格式错误或未找到评论列时抛出
+        """
+        columns = CSVParser.read_columns(source, encoding)
+        comment_col = CSVParser._identify_comment_column(columns)
+        if not comment_col:
+            raise ValueError(
+                f"CSV文件中未找到评论列。支持的列名: {', '.join(CSVParser.COMMENT_COLUMNS)}"
+            )
+        return comment_col
+
+    @staticmethod
+    def _clean_comments(values: List[Any]) -> List[str]:
+        """去除空值和空白评论"""
+        return [c.strip() for c in values if isinstance(c, str) and c.strip()]
+
+    @staticmethod
+    def _import_pyarrow_csv():
+        """
+        导入pyarrow的CSV解析器（可选依赖）
+
+        Returns:
+            (pyarrow, pyarrow.csv)，未安装时返回None
+        """
+        try:
+            import pyarrow
+            import pyarrow.csv
+        except ImportError:
+            return None
+        return pyarrow, pyarrow.csv
 
     @staticmethod
-    def _identify_comment_column(df: pd.DataFrame) -> Optional[str]:
+    def _identify_comment_column(columns: List[str]) -> Optional[str]:
         """
-        识别评论列
+        根据表头识别评论列
 
         Args:
-            df: DataFrame对象
+            columns: 列名列表
 
         Returns:
             列名，如果未找到返回None
         """
         # 首先尝试精确匹配
-        for col in df.columns:
+        for col in columns:
             if col.lower() in [c.lower() for c in CSVParser.COMMENT_COLUMNS]:
                 return col
 
         # 如果没有精确匹配，尝试模糊匹配
-        for col in df.columns:
+        for col in columns:
             for valid_col in CSVParser.COMMENT_COLUMNS:
                 if valid_col.lower() in col.lower() or col.lower() in valid_col.lower():
                     return col
 
         # 如果还是没找到，使用第一列
-        if len(df.columns) > 0:
-            logger.warning(f"未找到标准评论列，使用第一列: {df.columns[0]}")
-            return df.columns[0]
+        if len(columns) > 0:
+            logger.warning(f"未找到标准评论列，使用第一列: {columns[0]}")
+            return columns[0]
 
         return None
@@ -0,0 +1,169 @@
+"""
+评论去重工具
+归一化文本精确去重 + SimHash近似去重，把重复评论归入同一个簇
+"""
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+
+def normalize_for_dedup(comment: str) -> str:
+    """
+    去重用的归一化文本（全角转半角、转小写、去除空白和标点）
+
+    Args:
+        comment: 原始评论文本
+
+    Returns:
+        归一化后的文本
+    """
+    text = unicodedata.normalize("NFKC", comment).lower()
+    return "".join(
+        ch for ch in re.sub(r"\s+", "", text)
+        if not unicodedata.category(ch).startswith("P")
+    )
+
+
+def simhash(text: str, bits: int = 64) -> int:
+    """
+    计算文本的SimHash指纹，特征为相邻两个字符
+
+    Args:
+        text: 归一化后的文本
+        bits: 指纹位数
+
+    Returns:
+        指纹
+    """
+    features = [text[i:i + 2] for i in range(len(text) - 1)] or [text]
+    weights = [0] * bits
+    for feature in features:
+        value = int.from_bytes(
+            hashlib.blake2b(feature.encode("utf-8"), digest_size=bits // 8).digest(),
+            "big"
+        )
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class CommentDeduplicator:
+    """
+    评论去重器
+
+    归一化后完全相同的评论直接归入同一簇；足够长的评论再按SimHash查找
+    汉明距离不超过max_distance的簇代表。指纹按max_distance+1段分桶，
+    距离不超过阈值的两个指纹至少有一段完全相同，只需比较同桶的候选。
+    簇数达到max_clusters后不再登记新簇，新评论不参与去重。
+    """
+
+    # SimHash指纹位数
+    BITS = 64
+
+    def __init__(self, max_distance: int = 3, min_length: int = 10, max_clusters: int = 100000):
+        """
+        初始化去重器
+
+        Args:
+            max_distance: 近似重复的最大汉明距离，0表示只做精确去重
+            min_length: 归一化后达到该长度的评论才做近似匹配
+            max_clusters: 最多登记的簇数
+        """
+        self.max_distance = max(0, min(max_distance, self.BITS // 2 - 1))
+        self.min_length = min_length
+        self.max_clusters = max_clusters
+
+        # 归一化文本摘要 -> 簇ID
+        self._exact: Dict[bytes, int] = {}
+        # 簇代表的指纹，下标为簇ID（未做近似匹配的簇为None）
+        self._fingerprints: List[Optional[int]] = []
+        # 每段的桶：段值 -> 簇ID列表
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(self.max_distance + 1)]
+        self._band_width = self.BITS // (self.max_distance + 1)
+
+        self._counters = {
+            "clusters": 0,
+            "exact_duplicates": 0,
+            "near_duplicates": 0,
+            "unclustered": 0
+        }
+
+    def assign(self, comment: str) -> Optional[int]:
+        """
+        为评论分配簇
+
+        Args:
+            comment: 原始评论文本
+
+        Returns:
+            簇ID，簇数已满且没有匹配的簇时返回None
+        """
+        text = normalize_for_dedup(comment) or comment
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+        cluster = self._exact.get(digest)
+        if cluster is not None:
+            self._counters["exact_duplicates"] += 1
+            return cluster
+
+        fingerprint = None
+        if self.max_distance > 0 and len(text) >= self.min_length:
+            fingerprint = simhash(text, self.BITS)
+            cluster = self._find_near(fingerprint)
+            if cluster is not None:
+                self._counters["near_duplicates"] += 1
+                if len(self._exact) < self.max_clusters:
+                    self._exact[digest] = cluster
+                return cluster
+
+        if len(self._fingerprints) >= self.max_clusters:
+            self._counters["unclustered"] += 1
+            return None
+
+        cluster = len(self._fingerprints)
+        self._fingerprints.append(fingerprint)
+        self._exact[digest] = cluster
+        if fingerprint is not None:
+            for band, key in enumerate(self._band_keys(fingerprint)):
+                self._bands[band].setdefault(key, []).append(cluster)
+        self._counters["clusters"] += 1
+        return cluster
+
+    def _find_near(self, fingerprint: int) -> Optional[int]:
+        """在同桶的簇代表中查找汉明距离最小且不超过阈值的簇"""
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for cluster in self._bands[band].get(key, ()):
+                if cluster in seen:
+                    continue
+                seen.add(cluster)
+                distance = bin(fingerprint ^ self._fingerprints[cluster]).count("1")
+                if distance < best_distance:
+                    best, best_distance = cluster, distance
+        return best
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        """把指纹切分为max_distance+1段，最后一段包含剩余的位"""
+        bands = len(self._bands)
+        keys = []
+        for band in range(bands):
+            shift = band * self._band_width
+            width = self._band_width if band < bands - 1 else self.BITS - shift
+            keys.append(fingerprint >> shift & ((1 << width) - 1))
+        return keys
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取去重统计
+
+        Returns:
+            计数器字典
+        """
+        return dict(self._counters)
@@ -0,0 +1,79 @@
+"""
+多关键词匹配工具
+基于Aho-Corasick自动机，一次扫描找出文本中出现的全部关键词
+"""
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick多模式匹配器
+
+    构建后只读，匹配耗时与文本长度和命中数成正比，与关键词数量无关。
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        """
+        构建自动机
+
+        Args:
+            patterns: (关键词, 关联值)序列，同一关键词可关联多个值，空关键词忽略
+        """
+        # 节点以下标表示：转移表、失败指针、命中时输出的关联值
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Any]] = [[]]
+        self.pattern_count = 0
+
+        for keyword, value in patterns:
+            if keyword:
+                self._add(keyword, value)
+                self.pattern_count += 1
+        self._build()
+
+    def _add(self, keyword: str, value: Any):
+        """插入关键词"""
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(value)
+
+    def _build(self):
+        """按层序计算失败指针，并合并后缀节点的输出"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Any]:
+        """
+        扫描文本
+
+        Args:
+            text: 待匹配文本
+
+        Yields:
+            每次命中关键词的关联值（同一关键词出现多次时重复产出）
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                yield from output[node]
@@ -0,0 +1,102 @@
+"""
+令牌桶限流工具
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    异步令牌桶限流器
+
+    按固定速率补充令牌，桶容量决定允许的突发请求数。
+    收到上游限流信号时可整体暂停，所有共享该限流器的调用方一起等待。
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        初始化限流器
+
+        Args:
+            rate: 每秒补充的令牌数，小于等于0表示不限流
+            capacity: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._counters = {
+            "acquired": 0,
+            "throttled": 0,
+            "pauses": 0
+        }
+
+    async def acquire(self):
+        """
+        获取一个令牌，令牌不足时等待
+        """
+        if self.rate <= 0:
+            self._counters["acquired"] += 1
+            return
+
+        async with self._lock:
+            throttled = False
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    wait = (1 - self._tokens) / self.rate
+
+                throttled = True
+                await asyncio.sleep(wait)
+
+            self._counters["acquired"] += 1
+            if throttled:
+                self._counters["throttled"] += 1
+
+    def pause(self, seconds: float):
+        """
+        暂停发放令牌（如上游返回429 Retry-After）
+
+        Args:
+            seconds: 暂停秒数
+        """
+        if seconds <= 0:
+            return
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self._tokens = 0.0
+            self._updated_at = until
+            self._counters["pauses"] += 1
+            logger.warning(f"限流器暂停{seconds:.2f}秒")
+
+    def _refill(self, now: float):
+        """按流逝时间补充令牌"""
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取限流统计
+
+        Returns:
+            计数器字典
+        """
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            **self._counters
+        }
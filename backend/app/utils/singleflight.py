@@ -0,0 +1,70 @@
+"""
+请求合并工具（single-flight）
+相同键的并发调用只执行一次，所有调用方共享结果或异常
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    进程内请求合并器
+
+    首个调用方启动实际请求，后续相同键的调用方等待同一个请求完成。
+    请求在独立的asyncio任务中执行，单个调用方被取消不会影响其他等待者。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._counters = {
+            "executed": 0,
+            "shared": 0
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入一个进行中的调用
+
+        Args:
+            key: 合并键
+            fn: 无参异步函数，仅在没有进行中的相同调用时执行
+
+        Returns:
+            fn的返回值
+
+        Raises:
+            fn抛出的异常会传递给所有等待者
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._counters["executed"] += 1
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self._counters["shared"] += 1
+            logger.debug(f"合并进行中的请求: {key}")
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """请求完成后移除登记，并消费异常避免未读取告警"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取合并统计
+
+        Returns:
+            计数器字典
+        """
+        return {
+            **self._counters,
+            "in_flight": len(self._calls)
+        }
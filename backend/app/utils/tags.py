@@ -0,0 +1,50 @@
+"""
+标签解析工具
+"""
+import json
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Dify返回的组合标签中维度与值的分隔符，如"动力性能:正面"
+TAG_SEPARATOR = ":"
+
+
+def parse_tags(tags_json: Any) -> List[str]:
+    """
+    解析记录中的标签JSON
+
+    Args:
+        tags_json: JSON字符串或已解析的列表
+
+    Returns:
+        标签字符串列表，无法解析时返回空列表
+    """
+    try:
+        tags = json.loads(tags_json) if isinstance(tags_json, str) else tags_json
+    except (TypeError, ValueError) as e:
+        logger.error(f"解析标签失败: {e}")
+        return []
+    if not isinstance(tags, list):
+        return []
+    return [str(tag) for tag in tags]
+
+
+def split_tag(tag: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    拆分"维度:值"形式的组合标签
+
+    Args:
+        tag: 标签
+
+    Returns:
+        (维度, 值)，非组合标签返回(None, None)
+    """
+    if TAG_SEPARATOR not in tag:
+        return None, None
+    dimension, value = tag.split(TAG_SEPARATOR, 1)
+    dimension, value = dimension.strip(), value.strip()
+    if not dimension or not value:
+        return None, None
+    return dimension, value
@@ -12,6 +12,7 @@ from app.database import init_db, SessionLocal
 from app.models.task import TestTask
 from app.models.record import TestRecord
 from app.models.statistic import TagStatistic
+from app.services.record_writer import RecordWriter
 
 
 def create_test_data():
@@ -31,29 +32,17 @@ def create_test_data():
         db.add(test_task)
         db.flush()  # 获取task_id
 
-        # 创建测试记录
-        test_record = TestRecord(
-            task_id=test_task.id,
-            comment_text="这是一条测试评论",
-            tags_json='["测试标签", "正面评价"]',
-            confidence=0.95,
-            processing_time=1234
-        )
-        db.add(test_record)
-
-        # 创建测试统计
-        test_stat = TagStatistic(
-            tag_name="测试标签",
-            tag_category="测试",
-            occurrence_count=1
-        )
-        db.add(test_stat)
+        # 创建测试记录（同时累加标签统计）
+        RecordWriter.insert_records(db, test_task.id, [{
+            "comment_text": "这是一条测试评论",
+            "tags_json": '["测试标签", "正面评价"]',
+            "confidence": 0.95,
+            "processing_time": 1234
+        }])
 
         db.commit()
         print(f"✅ 测试数据创建成功！")
         print(f"   - 任务ID: {test_task.id}")
-        print(f"   - 记录ID: {test_record.id}")
-        print(f"   - 统计ID: {test_stat.id}")
 
         return test_task.id
 
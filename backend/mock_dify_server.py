@@ -0,0 +1,263 @@
+"""
+本地Dify模拟服务
+模拟/workflows/run接口，用于离线压测批量吞吐、重试和缓存效果
+
+用法:
+    python mock_dify_server.py --port 8001 --latency-dist lognormal --latency-mean 800 --error-rate 0.02
+    然后在.env中设置 DIFY_BASE_URL=http://127.0.0.1:8001/v1
+
+所有参数也可以通过同名环境变量设置，如 MOCK_DIFY_LATENCY_MEAN=800
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+# 维度关键词，按顺序匹配
+DIMENSION_KEYWORDS = [
+    ("动力性能", ["动力", "加速", "马力", "提速"]),
+    ("燃油经济性", ["油耗", "省油", "费油", "续航"]),
+    ("操控", ["操控", "转向", "底盘", "刹车"]),
+    ("乘坐舒适性", ["舒适", "座椅", "噪音", "隔音"]),
+    ("空间", ["空间", "后排", "后备箱", "储物"]),
+    ("外观设计", ["外观", "颜值", "造型", "内饰"]),
+    ("价格", ["价格", "性价比", "便宜", "贵"]),
+    ("售后服务", ["售后", "服务", "保养", "维修"]),
+]
+
+# 负面情感关键词
+NEGATIVE_KEYWORDS = ["差", "不好", "不行", "慢", "贵", "失望", "问题", "太吵", "费油", "垃圾"]
+
+
+class MockConfig:
+    """模拟服务配置"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency_dist = args.latency_dist
+        self.latency_mean = args.latency_mean / 1000
+        self.latency_stddev = args.latency_stddev / 1000
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.retry_after = args.retry_after
+        self.timeout_rate = args.timeout_rate
+        self.timeout_seconds = args.timeout_seconds
+        self.workflow_fail_rate = args.workflow_fail_rate
+        self.max_rps = args.max_rps
+        self.random = random.Random(args.seed)
+
+
+class MockDifyState:
+    """模拟服务运行状态"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.counters: Counter = Counter()
+        self.started_at = time.time()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def sample_latency(self) -> float:
+        """按配置的分布采样延迟（秒）"""
+        cfg = self.config
+        rng = cfg.random
+        if cfg.latency_dist == "fixed":
+            value = cfg.latency_mean
+        elif cfg.latency_dist == "uniform":
+            value = rng.uniform(cfg.latency_mean - cfg.latency_stddev, cfg.latency_mean + cfg.latency_stddev)
+        elif cfg.latency_dist == "normal":
+            value = rng.gauss(cfg.latency_mean, cfg.latency_stddev)
+        else:
+            # lognormal: 用均值和标准差反推底层正态分布参数
+            mean = max(cfg.latency_mean, 1e-6)
+            variance = cfg.latency_stddev ** 2
+            sigma = math.sqrt(math.log(1 + variance / (mean ** 2)))
+            mu = math.log(mean) - sigma ** 2 / 2
+            value = rng.lognormvariate(mu, sigma)
+        return max(0.0, value)
+
+    def over_rps_limit(self) -> bool:
+        """检查是否超过每秒请求上限"""
+        if self.config.max_rps <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count > self.config.max_rps
+
+    def pick_outcome(self) -> str:
+        """随机决定本次请求的结果"""
+        cfg = self.config
+        roll = cfg.random.random()
+        for outcome, rate in (
+            ("rate_limited", cfg.rate_limit_rate),
+            ("error", cfg.error_rate),
+            ("timeout", cfg.timeout_rate),
+            ("workflow_failed", cfg.workflow_fail_rate),
+        ):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return "succeeded"
+
+
+def build_outputs(comment: str) -> Dict[str, Any]:
+    """根据评论关键词生成确定性的工作流输出"""
+    dimension = "综合评价"
+    for name, keywords in DIMENSION_KEYWORDS:
+        if any(keyword in comment for keyword in keywords):
+            dimension = name
+            break
+    value = "负面" if any(keyword in comment for keyword in NEGATIVE_KEYWORDS) else "正面"
+    return {"text": json.dumps({"维度": dimension, "值": value}, ensure_ascii=False)}
+
+
+def build_workflow_data(comment: str, status: str, elapsed: float) -> Dict[str, Any]:
+    """构造与Dify一致的workflow data结构"""
+    data = {
+        "id": str(uuid.uuid4()),
+        "workflow_id": "mock-workflow",
+        "status": status,
+        "outputs": build_outputs(comment) if status == "succeeded" else {},
+        "error": None if status == "succeeded" else "mock workflow failure",
+        "elapsed_time": elapsed,
+        "total_tokens": len(comment),
+        "total_steps": 3,
+        "created_at": int(time.time()),
+        "finished_at": int(time.time())
+    }
+    return data
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    """创建模拟服务应用"""
+    app = FastAPI(title="Mock Dify", description="本地Dify工作流模拟服务")
+    state = MockDifyState(config)
+
+    @app.post("/v1/workflows/run")
+    async def run_workflow(request: Request, authorization: Optional[str] = Header(None)):
+        state.counters["requests"] += 1
+
+        if not authorization or not authorization.startswith("Bearer "):
+            state.counters["unauthorized"] += 1
+            return JSONResponse(status_code=401, content={"code": "unauthorized", "message": "缺少API Key"})
+
+        try:
+            body = await request.json()
+            comment = str(body["inputs"]["pinglun"])
+            response_mode = body.get("response_mode", "blocking")
+        except (ValueError, KeyError, TypeError):
+            state.counters["bad_request"] += 1
+            return JSONResponse(status_code=400, content={"code": "invalid_param", "message": "请求参数错误"})
+
+        if state.over_rps_limit():
+            state.counters["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"code": "too_many_requests", "message": "超过每秒请求上限"},
+                headers={"Retry-After": str(config.retry_after)}
+            )
+
+        outcome = state.pick_outcome()
+        state.counters[outcome] += 1
+
+        if outcome == "rate_limited":
+            return JSONResponse(
+                status_code=429,
+                content={"code": "too_many_requests", "message": "mock rate limit"},
+                headers={"Retry-After": str(config.retry_after)}
+            )
+        if outcome == "error":
+            await asyncio.sleep(state.sample_latency())
+            return JSONResponse(status_code=500, content={"code": "internal_error", "message": "mock error"})
+        if outcome == "timeout":
+            await asyncio.sleep(config.timeout_seconds)
+            return JSONResponse(status_code=504, content={"code": "timeout", "message": "mock timeout"})
+
+        latency = state.sample_latency()
+        status = "failed" if outcome == "workflow_failed" else "succeeded"
+        task_id = str(uuid.uuid4())
+        workflow_run_id = str(uuid.uuid4())
+
+        if response_mode == "streaming":
+            return StreamingResponse(
+                _stream_events(comment, status, latency, task_id, workflow_run_id),
+                media_type="text/event-stream"
+            )
+
+        await asyncio.sleep(latency)
+        return {
+            "task_id": task_id,
+            "workflow_run_id": workflow_run_id,
+            "data": build_workflow_data(comment, status, latency)
+        }
+
+    @app.get("/stats")
+    async def stats():
+        uptime = time.time() - state.started_at
+        return {
+            "uptime": round(uptime, 2),
+            "counters": dict(state.counters),
+            "rps": round(state.counters["requests"] / uptime, 2) if uptime > 0 else 0.0
+        }
+
+    return app
+
+
+async def _stream_events(comment: str, status: str, latency: float, task_id: str, workflow_run_id: str):
+    """按Dify流式格式逐步输出事件"""
+    def sse(event: Dict[str, Any]) -> str:
+        return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    base = {"task_id": task_id, "workflow_run_id": workflow_run_id}
+    yield sse({**base, "event": "workflow_started", "data": {"id": workflow_run_id, "workflow_id": "mock-workflow"}})
+    yield "event: ping\n\n"
+
+    for title in ("开始", "LLM", "结束"):
+        await asyncio.sleep(latency / 3)
+        yield sse({**base, "event": "node_finished", "data": {"title": title, "status": "succeeded"}})
+
+    yield sse({**base, "event": "workflow_finished", "data": build_workflow_data(comment, status, latency)})
+
+
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数，环境变量作为默认值"""
+    def env(name: str, default: Any) -> Any:
+        value = os.environ.get(f"MOCK_DIFY_{name.upper()}")
+        return type(default)(value) if value is not None else default
+
+    parser = argparse.ArgumentParser(description="本地Dify工作流模拟服务")
+    parser.add_argument("--host", default=env("host", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=env("port", 8001))
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"],
+                        default=env("latency_dist", "lognormal"), help="延迟分布")
+    parser.add_argument("--latency-mean", type=float, default=env("latency_mean", 800.0), help="平均延迟（毫秒）")
+    parser.add_argument("--latency-stddev", type=float, default=env("latency_stddev", 300.0), help="延迟标准差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=env("error_rate", 0.0), help="返回500的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=env("rate_limit_rate", 0.0), help="随机返回429的比例")
+    parser.add_argument("--retry-after", type=int, default=env("retry_after", 1), help="429响应的Retry-After（秒）")
+    parser.add_argument("--timeout-rate", type=float, default=env("timeout_rate", 0.0), help="挂起直到超时的比例")
+    parser.add_argument("--timeout-seconds", type=float, default=env("timeout_seconds", 60.0), help="模拟超时的挂起时间（秒）")
+    parser.add_argument("--workflow-fail-rate", type=float, default=env("workflow_fail_rate", 0.0),
+                        help="返回200但工作流状态为failed的比例")
+    parser.add_argument("--max-rps", type=int, default=env("max_rps", 0), help="每秒请求上限，超过返回429，0表示不限")
+    parser.add_argument("--seed", type=int, default=env("seed", 0), help="随机种子，便于复现")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"Mock Dify启动: http://{args.host}:{args.port}/v1  (DIFY_BASE_URL=http://{args.host}:{args.port}/v1)")
+    uvicorn.run(create_app(MockConfig(args)), host=args.host, port=args.port, log_level="warning")
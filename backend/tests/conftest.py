@@ -0,0 +1,21 @@
+"""
+测试公共fixture
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.database import Base
+from app.models import task, record, statistic, job, upload  # noqa: F401
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """在临时SQLite文件上建表，返回异步会话工厂"""
+    db_path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    yield async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    async_engine.sync_engine.dispose()
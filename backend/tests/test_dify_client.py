@@ -0,0 +1,51 @@
+"""
+Dify客户端请求合并测试
+"""
+import asyncio
+from app.services.dify_client import DifyClient
+from app.services.tag_cache import TagCache
+
+
+def _client(monkeypatch, calls):
+    client = DifyClient(base_url="http://dify.invalid", cache=TagCache(db_path="", enabled=False))
+
+    async def fake_request(comment, user):
+        calls.append(user)
+        await asyncio.sleep(0.01)
+        return {"tags": [f"{user}:正面"], "confidence": 0.9, "raw_response": {}, "processing_time": 10.0}
+
+    monkeypatch.setattr(client, "_request_comment_tags", fake_request)
+    return client
+
+
+def test_concurrent_calls_share_request_for_same_user(monkeypatch):
+    calls = []
+    client = _client(monkeypatch, calls)
+
+    async def scenario():
+        return await asyncio.gather(
+            client.get_comment_tags("动力很好", user="alice"),
+            client.get_comment_tags("动力很好", user="alice")
+        )
+
+    first, second = asyncio.run(scenario())
+
+    assert calls == ["alice"]
+    assert first["tags"] == second["tags"] == ["alice:正面"]
+
+
+def test_concurrent_calls_not_shared_across_users(monkeypatch):
+    calls = []
+    client = _client(monkeypatch, calls)
+
+    async def scenario():
+        return await asyncio.gather(
+            client.get_comment_tags("动力很好", user="alice"),
+            client.get_comment_tags("动力很好", user="bob")
+        )
+
+    alice, bob = asyncio.run(scenario())
+
+    assert sorted(calls) == ["alice", "bob"]
+    assert alice["tags"] == ["alice:正面"]
+    assert bob["tags"] == ["bob:正面"]
@@ -0,0 +1,55 @@
+"""
+延迟统计测试
+缓存命中和去重复用的结果不记录耗时，不计入平均处理时间
+"""
+import asyncio
+from app.models.task import TestTask
+from app.services.dify_client import DifyClient
+from app.services.record_writer import RecordWriter
+from app.services.stats_service import StatisticsService
+from app.services.tag_cache import TagCache
+
+
+def test_cache_hit_has_no_processing_time(monkeypatch):
+    client = DifyClient(base_url="http://dify.invalid", cache=TagCache(db_path="", enabled=True))
+
+    async def fake_request(comment, user):
+        return {"tags": ["动力性能:正面"], "confidence": 0.9, "raw_response": {}, "processing_time": 1200.0}
+
+    monkeypatch.setattr(client, "_request_comment_tags", fake_request)
+
+    async def scenario():
+        return await client.get_comment_tags("动力很好"), await client.get_comment_tags("动力很好")
+
+    first, second = asyncio.run(scenario())
+
+    assert first["processing_time"] == 1200.0
+    assert "cached" not in first
+    assert second["processing_time"] is None
+    assert second["cached"] is True
+    assert second["tags"] == first["tags"]
+
+
+def test_average_processing_time_skips_untimed_records(session_factory):
+    async def scenario():
+        async with session_factory() as db:
+            task = TestTask(task_type="batch", status="processing", total_count=3, processed_count=0)
+            db.add(task)
+            await db.commit()
+
+            rows = [
+                {"comment_text": "动力很好", "tags_json": '["动力性能:正面"]',
+                 "confidence": 0.9, "processing_time": 1200.0},
+                {"comment_text": "动力很好！", "tags_json": '["动力性能:正面"]',
+                 "confidence": 0.9, "processing_time": None},
+                {"comment_text": "动力 很好", "tags_json": '["动力性能:正面"]',
+                 "confidence": 0.9, "processing_time": None},
+            ]
+            await db.run_sync(RecordWriter.insert_records, task.id, rows)
+            await db.commit()
+            return await StatisticsService.get_statistics_overview(db, task.id)
+
+    overview = asyncio.run(scenario())
+
+    assert overview["total_comments"] == 3
+    assert overview["avg_processing_time"] == 1200.0
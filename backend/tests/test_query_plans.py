@@ -0,0 +1,78 @@
+"""
+查询计划回归测试
+在升级前的基线库（test_records没有迁移添加的索引）上执行所有迁移，
+再检查按任务过滤的查询都命中索引
+"""
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+from app.database import Base
+from app.migrations import MIGRATIONS, PER_TASK_QUERIES, check_query_plans, get_schema_version, run_migrations
+from app.models import task, record, statistic, job, upload  # noqa: F401
+from app.models.record import TestRecord
+
+# 迁移v1添加的索引
+MIGRATION_INDEXES = {
+    "ix_test_records_task_id",
+    "ix_test_records_created_at",
+    "ix_test_records_task_id_created_at",
+}
+
+
+def _create_baseline_schema(engine):
+    """建表，test_records只建表不建索引，模拟迁移前的数据库"""
+    records = TestRecord.__table__
+    Base.metadata.create_all(
+        bind=engine,
+        tables=[table for table in Base.metadata.sorted_tables if table is not records]
+    )
+    with engine.begin() as conn:
+        conn.execute(CreateTable(records))
+
+
+def _test_record_indexes(engine) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes("test_records")}
+
+
+@pytest.fixture(scope="module")
+def migrated_engine(tmp_path_factory):
+    """在基线库上执行迁移，返回引擎和迁移前后的状态"""
+    db_path = tmp_path_factory.mktemp("db") / "query_plans.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        _create_baseline_schema(engine)
+        baseline_indexes = _test_record_indexes(engine)
+        applied = run_migrations(engine)
+        with Session(bind=engine) as db:
+            version = get_schema_version(db)
+        yield {
+            "engine": engine,
+            "baseline_indexes": baseline_indexes,
+            "applied": applied,
+            "version": version
+        }
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def query_plans(migrated_engine):
+    return check_query_plans(migrated_engine["engine"])
+
+
+def test_baseline_has_no_migration_indexes(migrated_engine):
+    assert not migrated_engine["baseline_indexes"] & MIGRATION_INDEXES
+
+
+def test_migrations_advance_schema_version(migrated_engine):
+    versions = sorted(migration.version for migration in MIGRATIONS)
+    assert migrated_engine["applied"] == versions
+    assert migrated_engine["version"] == versions[-1]
+    assert MIGRATION_INDEXES <= _test_record_indexes(migrated_engine["engine"])
+
+
+@pytest.mark.parametrize("name", list(PER_TASK_QUERIES))
+def test_per_task_query_uses_index(query_plans, name):
+    result = query_plans[name]
+    assert result["uses_index"], f"{name}未命中索引: {' | '.join(result['plan'])}"
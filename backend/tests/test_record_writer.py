@@ -0,0 +1,78 @@
+"""
+批量记录写缓冲测试
+"""
+import asyncio
+import sqlite3
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from app.config import settings
+from app.models.record import TestRecord
+from app.models.task import TestTask
+from app.services.record_writer import BufferedRecordWriter, RecordWriter
+
+
+def _row(index: int) -> dict:
+    return {
+        "comment_text": f"评论{index}",
+        "tags_json": '["动力性能:正面"]',
+        "confidence": 0.9,
+        "processing_time": 100.0
+    }
+
+
+def _lock_database(monkeypatch, times: int):
+    """让前times次写入抛出database is locked"""
+    insert_records = RecordWriter.insert_records
+    calls = {"count": 0}
+
+    def flaky_insert(db, task_id, rows):
+        calls["count"] += 1
+        if calls["count"] <= times:
+            raise OperationalError("INSERT", {}, sqlite3.OperationalError("database is locked"))
+        insert_records(db, task_id, rows)
+
+    monkeypatch.setattr(RecordWriter, "insert_records", staticmethod(flaky_insert))
+    monkeypatch.setattr(settings, "BATCH_FLUSH_RETRY_BASE_DELAY", 0.01)
+    return calls
+
+
+async def _write_rows(session_factory, count: int):
+    """创建任务并通过写缓冲写入count条记录，返回(任务ID, 写缓冲)"""
+    async with session_factory() as db:
+        task = TestTask(task_type="batch", status="processing", total_count=count, processed_count=0)
+        db.add(task)
+        await db.commit()
+
+        writer = BufferedRecordWriter(db, task.id, flush_rows=count, flush_interval_ms=60000)
+        try:
+            for index in range(count):
+                await writer.add(_row(index))
+        finally:
+            writer._active.discard(writer)
+        return task.id, writer
+
+
+async def _count_records(session_factory, task_id: int) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count(TestRecord.id)).where(TestRecord.task_id == task_id))
+
+
+def test_flush_retries_when_database_is_locked(session_factory, monkeypatch):
+    calls = _lock_database(monkeypatch, times=1)
+
+    task_id, writer = asyncio.run(_write_rows(session_factory, 3))
+
+    assert calls["count"] == 2
+    assert writer.flushed_count == 3
+    assert asyncio.run(_count_records(session_factory, task_id)) == 3
+
+
+def test_flush_keeps_rows_buffered_after_retries_run_out(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_FLUSH_MAX_RETRIES", 2)
+    calls = _lock_database(monkeypatch, times=10)
+
+    with pytest.raises(OperationalError):
+        asyncio.run(_write_rows(session_factory, 3))
+
+    assert calls["count"] == 3
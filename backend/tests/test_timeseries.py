@@ -0,0 +1,40 @@
+"""
+时间序列接口测试
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import statistics
+from app.database import get_read_db
+
+PARAMS = {"granularity": "hour", "start": "2026-01-01T00:00:00", "end": "2026-01-01T03:00:00"}
+
+
+@pytest.fixture
+def client(session_factory):
+    app = FastAPI()
+    app.include_router(statistics.router, prefix="/api/v1/statistics")
+
+    async def override_read_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = override_read_db
+    return TestClient(app)
+
+
+def test_points_omit_tag_occurrences_without_tag(client):
+    response = client.get("/api/v1/statistics/timeseries", params=PARAMS)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["tag"] is None
+    assert len(body["points"]) == 3
+    assert all("tag_occurrences" not in point for point in body["points"])
+
+
+def test_points_include_tag_occurrences_with_tag(client):
+    response = client.get("/api/v1/statistics/timeseries", params={**PARAMS, "tag": "动力性能:正面"})
+
+    assert response.status_code == 200
+    assert [point["tag_occurrences"] for point in response.json()["points"]] == [0, 0, 0]
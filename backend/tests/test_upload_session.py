@@ -0,0 +1,60 @@
+"""
+分块上传会话测试
+"""
+import asyncio
+import hashlib
+import os
+import pytest
+from app.config import settings
+from app.services.batch_ingest_service import BatchIngestService
+from app.services.upload_session_service import UploadSessionService
+
+
+async def _body(data: bytes):
+    yield data
+
+
+async def _write(db, upload_id: str, offset: int, data: bytes):
+    return await UploadSessionService.write_chunk(
+        db, upload_id, offset, hashlib.sha256(data).hexdigest(), _body(data)
+    )
+
+
+def test_complete_after_sha256_mismatch_restarts_from_zero(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    ingested = []
+
+    async def fake_start_ingest(db, path):
+        with open(path, "rb") as f:
+            ingested.append(f.read())
+        return {"task_id": None, "total_count": 1, "ingesting": False}
+
+    monkeypatch.setattr(BatchIngestService, "start_ingest", staticmethod(fake_start_ingest))
+
+    expected = "评论\n动力很好\n".encode("utf-8")
+    corrupted = "评论\n动力很差\n".encode("utf-8")
+
+    async def scenario():
+        async with session_factory() as db:
+            session = await UploadSessionService.create_session(
+                db, "comments.csv", len(expected), hashlib.sha256(expected).hexdigest()
+            )
+            upload_id = session["upload_id"]
+            await _write(db, upload_id, 0, corrupted)
+
+            with pytest.raises(ValueError, match="从0字节重新上传"):
+                await UploadSessionService.complete(db, upload_id)
+
+            session = await UploadSessionService.get_session(db, upload_id)
+            assert session["offset"] == 0
+            assert session["status"] == "uploading"
+            assert os.path.getsize(os.path.join(settings.UPLOAD_DIR, f"{upload_id}.csv")) == 0
+
+            session = await _write(db, upload_id, 0, expected)
+            assert session["offset"] == len(expected)
+            return await UploadSessionService.complete(db, upload_id)
+
+    result = asyncio.run(scenario())
+
+    assert result["total_count"] == 1
+    assert ingested == [expected]
@@ -9,7 +9,8 @@ export interface SingleTestRequest {
 export interface TagResult {
   tags: string[]
   confidence: number
-  processing_time: number
+  processing_time: number | null
+  cached?: boolean
 }
 
 export interface SingleTestResponse {
@@ -29,7 +30,8 @@ export interface TaskDetail {
     completed_at: string | null
     error_message?: string
   }
-  records: Array<{
+  // 仅在include_records=true时返回，记录请使用/test/task/{id}/records分页接口
+  records?: Array<{
     id: number
     task_id: number
     comment_text: string
@@ -71,7 +73,8 @@ export const uploadBatchTest = async (file: File): Promise<BatchUploadResponse>
     {
       headers: {
         'Content-Type': 'multipart/form-data'
-      }
+      },
+      timeout: 0 // 大文件上传不设超时
     }
   )
   return response
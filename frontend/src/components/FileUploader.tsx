@@ -6,6 +6,9 @@ import type { UploadProps } from 'antd'
 const { Text } = Typography
 const { Dragger } = Upload
 
+// 支持上传的文件扩展名
+const ACCEPTED_EXTENSIONS = ['.csv', '.jsonl', '.ndjson', '.xlsx', '.parquet', '.gz', '.zip']
+
 interface FileUploaderProps {
   onFileSelect: (file: File) => void
   loading?: boolean
@@ -21,19 +24,20 @@ const FileUploader: React.FC<FileUploaderProps> = ({
     name: 'file',
     multiple: false,
     fileList: fileList,
-    accept: '.csv',
+    accept: ACCEPTED_EXTENSIONS.join(','),
     beforeUpload: (file) => {
       // 验证文件类型
-      const isCSV = file.name.toLowerCase().endsWith('.csv')
-      if (!isCSV) {
-        message.error('只支持CSV文件格式！')
+      const name = file.name.toLowerCase()
+      const isSupported = ACCEPTED_EXTENSIONS.some((ext) => name.endsWith(ext))
+      if (!isSupported) {
+        message.error('只支持CSV、JSONL、Excel（.xlsx）、Parquet文件及其.gz/.zip压缩文件！')
         return false
       }
 
-      // 验证文件大小（10MB）
-      const isLt10M = file.size / 1024 / 1024 < 10
-      if (!isLt10M) {
-        message.error('文件大小不能超过10MB！')
+      // 验证文件大小（1GB）
+      const isLt1G = file.size / 1024 / 1024 / 1024 < 1
+      if (!isLt1G) {
+        message.error('文件大小不能超过1GB！')
         return false
       }
 
@@ -51,11 +55,11 @@ const FileUploader: React.FC<FileUploaderProps> = ({
   }
 
   return (
-    <Card title="上传CSV文件">
+    <Card title="上传批量文件">
       <Space direction="vertical" style={{ width: '100%' }}>
         <Alert
           message="文件格式要求"
-          description="CSV文件，需包含评论列（支持的列名：评论、comment、content、text、pinglun等），最多1000条评论"
+          description="CSV、JSONL、Excel（.xlsx）或Parquet文件，可用gzip/zip压缩，需包含评论列（支持的列名：评论、comment、content、text、pinglun等），评论数不限"
           type="info"
           showIcon
           style={{ marginBottom: 16 }}
@@ -67,7 +71,7 @@ const FileUploader: React.FC<FileUploaderProps> = ({
           </p>
           <p className="ant-upload-text">点击或拖拽文件到此区域上传</p>
           <p className="ant-upload-hint">
-            支持单次上传，文件大小不超过10MB
+            支持单次上传，文件大小不超过1GB
           </p>
         </Dragger>
 
@@ -4,7 +4,8 @@ import { ClockCircleOutlined, TagsOutlined } from '@ant-design/icons'
 
 interface TagDisplayProps {
   tags: string[]
-  processingTime?: number
+  processingTime?: number | null
+  cached?: boolean
   confidence?: number
   loading?: boolean
 }
@@ -12,6 +13,7 @@ interface TagDisplayProps {
 const TagDisplay: React.FC<TagDisplayProps> = ({
   tags,
   processingTime = 0,
+  cached = false,
   confidence = 0,
   loading = false
 }) => {
@@ -57,8 +59,8 @@ const TagDisplay: React.FC<TagDisplayProps> = ({
           <Col span={12}>
             <Statistic
               title="处理时间"
-              value={processingTime}
-              suffix="ms"
+              value={cached ? '缓存命中' : processingTime ?? 0}
+              suffix={cached ? undefined : 'ms'}
               prefix={<ClockCircleOutlined />}
               precision={0}
             />
@@ -91,6 +91,7 @@ const SingleTestPage: React.FC = () => {
               <TagDisplay
                 tags={result.tags}
                 processingTime={result.processing_time}
+                cached={result.cached}
                 confidence={result.confidence}
               />
             )}
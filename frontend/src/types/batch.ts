@@ -3,6 +3,7 @@ export interface BatchUploadResponse {
   task_id: number
   status: string
   total_count: number
+  ingesting?: boolean
   message: string
 }
 
@@ -12,6 +13,7 @@ export interface BatchProgressResponse {
   total_count: number
   processed_count: number
   progress: number
+  ingesting?: boolean
   error_message?: string
 }
 
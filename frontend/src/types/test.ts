@@ -9,7 +9,8 @@ export interface ApiResponse<T> {
 export interface TagResult {
   tags: string[]
   confidence: number
-  processing_time: number
+  processing_time: number | null
+  cached?: boolean
 }
 
 export interface SingleTestResponse {
@@ -41,5 +42,6 @@ export interface TaskInfo {
 
 export interface TaskDetail {
   task: TaskInfo
-  records: TaskRecord[]
+  // 仅在include_records=true时返回，记录请使用/test/task/{id}/records分页接口
+  records?: TaskRecord[]
 }